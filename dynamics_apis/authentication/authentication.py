@@ -67,3 +67,25 @@ class KairnialTokenAuthentication(JWTAuthentication):
         except Exception as e:
             logger.error("Unable to parse authentication", e)
             return None
+
+
+def token_subject(token: str, client_id: str):
+    """
+    UUID of the user of an access token, None if the token is not valid for the client
+    """
+    try:
+        payload = jwt.decode(token, KAIRNIAL_AUTH_PUBLIC_KEY, algorithms=ALGORITHMS, audience=client_id)
+    except Exception:
+        return None
+    return payload.get('sub')
+
+
+def token_expiry(token: str):
+    """
+    Expiration timestamp of an access token already authenticated, None if it has none
+    """
+    try:
+        payload = jwt.decode(token, options={'verify_signature': False})
+    except Exception:
+        return None
+    return payload.get('exp')
@@ -2,9 +2,14 @@
 Kairnial authorization models
 """
 from dynamics_apis.authorization.services import KairnialACL, KairnialModule
+from dynamics_apis.common.filters import FilterEngine, Contains, Exact
 
 
 class ACL:
+    filter_engine = FilterEngine(
+        domain=Exact('acl_type', transform=lambda acl_type: (acl_type or '').split(':')[0]),
+        search=Contains('description', 'acl_type'),
+    )
 
     @classmethod
     def list(cls, client_id: str, token: str, project_id: str, domain: str = None, search: str = None):
@@ -13,13 +18,13 @@ class ACL:
         """
         ka = KairnialACL(client_id=client_id, token=token, project_id=project_id)
         acl_list = ka.list().get('acls')
-        if domain:
-            acl_list = [l for l in acl_list if l['acl_type'].split(':')[0] == domain]
-        if search:
-            acl_list = [l for l in acl_list if search in f"{l['description']}|{l['acl_type']}"]
-        return acl_list
+        return cls.filter_engine.filter(acl_list, {'domain': domain or None, 'search': search or None})
+
 
 class Module:
+    filter_engine = FilterEngine(
+        search=Contains('title', 'subtitle'),
+    )
 
     @classmethod
     def list(cls, client_id: str, token: str, project_id: str, search: str = None):
@@ -28,6 +33,4 @@ class Module:
         """
         km = KairnialModule(client_id=client_id, token=token, project_id=project_id)
         module_list = km.list().get('modules')
-        if search:
-            module_list = [l for l in module_list if search in f"{l['title']}|{l['subtitle']}"]
-        return module_list
\ No newline at end of file
+        return cls.filter_engine.filter(module_list, {'search': search or None})
\ No newline at end of file
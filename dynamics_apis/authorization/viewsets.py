@@ -12,7 +12,7 @@ from rest_framework.viewsets import ViewSet
 
 from dynamics_apis.common.serializers import ErrorSerializer
 from dynamics_apis.common.services import KairnialWSServiceError
-from dynamics_apis.common.viewsets import project_parameters
+from dynamics_apis.common.viewsets import project_parameters, not_modified, upstream_etag, with_validators
 from .models import ACL, Module
 from .serializers import ACLSerializer, ACLQuerySerializer, ModuleSerializer
 
@@ -47,8 +47,12 @@ class ACLViewSet(ViewSet):
                 project_id=project_id,
                 **filters
             )
+            etag = upstream_etag(request)
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
             serializer = ACLSerializer(acl_list, many=True)
-            return Response(serializer.data, content_type="application/json")
+            return with_validators(request, Response(serializer.data, content_type="application/json"), etag)
         except (KairnialWSServiceError, KeyError) as e:
             error = ErrorSerializer({
                 'status': 400,
@@ -107,8 +111,12 @@ class ModuleViewSet(ViewSet):
                 token=request.token,
                 project_id=project_id
             )
+            etag = upstream_etag(request)
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
             serializer = ModuleSerializer(module_list, many=True)
-            return Response(serializer.data, content_type="application/json")
+            return with_validators(request, Response(serializer.data, content_type="application/json"), etag)
         except (KairnialWSServiceError, KeyError) as e:
             error = ErrorSerializer({
                 'status': 400,
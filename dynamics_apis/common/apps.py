@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class CommonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dynamics_apis.common'
+
+    def ready(self):
+        # register background job tasks of each application
+        autodiscover_modules('tasks')
@@ -0,0 +1,121 @@
+"""
+Concurrent calls to Kairnial Web Services
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+def get_max_workers(max_workers: int = None) -> int:
+    """
+    Number of threads to use for concurrent calls
+    """
+    return max_workers or getattr(settings, 'KAIRNIAL_WS_MAX_WORKERS', 8)
+
+
+def concurrent_map(func, items, max_workers: int = None) -> []:
+    """
+    Apply func to each item using a bounded pool of threads
+    Results are returned in the order of items, the first exception is raised.
+    :param func: callable taking one item
+    :param items: iterable of items
+    :param max_workers: size of the pool, defaults to KAIRNIAL_WS_MAX_WORKERS
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    # threads see the context variables of the caller, such as the request memo
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=min(get_max_workers(max_workers), len(items))) as executor:
+        return list(executor.map(lambda item: context.copy().run(func, item), items))
+
+
+def concurrent_outcomes(func, items, max_workers: int = None, callback=None) -> [tuple]:
+    """
+    Apply func to each item using a bounded pool of threads, keeping errors per item
+    :param func: callable taking one item
+    :param items: iterable of items
+    :param max_workers: size of the pool, defaults to KAIRNIAL_WS_MAX_WORKERS
+    :param callback: optional callable(item, result, exception) called as soon as an item is done,
+        an exception raised by the callback skips the remaining items and is raised once running items are done
+    :return: list of (item, result, exception or None) in the order of items
+    """
+    aborted = []
+
+    def run(item):
+        if aborted:
+            return item, None, aborted[0]
+        try:
+            outcome = item, func(item), None
+        except Exception as e:
+            outcome = item, None, e
+        if callback:
+            try:
+                callback(*outcome)
+            except Exception as e:
+                aborted.append(e)
+        return outcome
+
+    outcomes = concurrent_map(run, items, max_workers=max_workers)
+    if aborted:
+        raise aborted[0]
+    return outcomes
+
+
+def error_message(error: Exception) -> str:
+    """
+    Readable message of an exception captured by concurrent_outcomes
+    """
+    message = getattr(error, 'message', None) or str(error)
+    if isinstance(message, bytes):
+        message = message.decode('utf8', errors='replace')
+    return str(message)
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the number of calls per minute, shared between threads
+    """
+
+    def __init__(self, per_minute: int, burst: int = None):
+        """
+        :param per_minute: number of calls allowed per minute
+        :param burst: number of calls allowed at once, defaults to per_minute
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, burst or per_minute)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> bool:
+        """
+        Take a token if one is available
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        """
+        Wait for a token
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate if self.rate else 1
+            time.sleep(wait)
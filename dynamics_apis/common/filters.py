@@ -0,0 +1,171 @@
+"""
+Filter engine for lists returned by Kairnial Web Services
+
+Query serializers validate the filters, a FilterEngine compiles the validated data
+into a single predicate which is then evaluated once per item.
+"""
+
+
+class Lookup:
+    """
+    Base lookup on one or several properties of a Kairnial item
+    """
+
+    def __init__(self, *properties: str, transform=None):
+        """
+        :param properties: keys of the item to compare, values are joined with '|' if many
+        :param transform: optional callable applied to the item value before comparison
+        """
+        self.properties = properties
+        self.transform = transform
+
+    def get_value(self, item):
+        """
+        Extract the compared value from an item
+        """
+        if len(self.properties) == 1:
+            value = item.get(self.properties[0])
+        else:
+            value = '|'.join(str(item.get(p) or '') for p in self.properties)
+        if self.transform:
+            value = self.transform(value)
+        return value
+
+    def compile(self, value):
+        """
+        Return a predicate for the filter value
+        :param value: validated filter value
+        """
+        raise NotImplementedError
+
+
+class Contains(Lookup):
+    """
+    Case insensitive content filter
+    """
+
+    def compile(self, value):
+        needle = str(value).casefold()
+        get_value = self.get_value
+
+        def predicate(item):
+            return needle in str(get_value(item) or '').casefold()
+
+        return predicate
+
+
+class Exact(Lookup):
+    """
+    Equality filter
+    """
+
+    def compile(self, value):
+        get_value = self.get_value
+
+        def predicate(item):
+            return get_value(item) == value
+
+        return predicate
+
+
+class In(Lookup):
+    """
+    Filter on a list of accepted values
+    """
+
+    def compile(self, value):
+        accepted = frozenset(value)
+        get_value = self.get_value
+
+        def predicate(item):
+            try:
+                return get_value(item) in accepted
+            except TypeError:
+                return False
+
+        return predicate
+
+
+class Min(Lookup):
+    """
+    Lower bound of a range, inclusive
+    """
+
+    def compile(self, value):
+        get_value = self.get_value
+
+        def predicate(item):
+            try:
+                return get_value(item) >= value
+            except TypeError:
+                return False
+
+        return predicate
+
+
+class Max(Lookup):
+    """
+    Upper bound of a range, inclusive
+    """
+
+    def compile(self, value):
+        get_value = self.get_value
+
+        def predicate(item):
+            try:
+                return get_value(item) <= value
+            except TypeError:
+                return False
+
+        return predicate
+
+
+class FilterEngine:
+    """
+    Compile validated query serializer data into one predicate
+    Filters that have no lookup declared are ignored, as are None values.
+    """
+
+    def __init__(self, **lookups: Lookup):
+        """
+        :param lookups: Lookup for each filter name, as found in validated_data
+        """
+        self.lookups = lookups
+
+    def compile(self, filters: dict = None):
+        """
+        Build a predicate from filters
+        :param filters: validated data of a query serializer
+        :return: predicate or None if nothing to filter
+        """
+        filters = filters or {}
+        predicates = tuple(
+            lookup.compile(filters.get(name))
+            for name, lookup in self.lookups.items()
+            if name in filters and filters.get(name) is not None
+        )
+        if not predicates:
+            return None
+        if len(predicates) == 1:
+            return predicates[0]
+
+        def predicate(item):
+            for p in predicates:
+                if not p(item):
+                    return False
+            return True
+
+        return predicate
+
+    def filter(self, items, filters: dict = None) -> []:
+        """
+        Filter a list of items in a single pass
+        :param items: list of items from Kairnial Web Services
+        :param filters: validated data of a query serializer
+        """
+        if items is None:
+            return items
+        predicate = self.compile(filters)
+        if predicate is None:
+            return list(items)
+        return [item for item in items if predicate(item)]
@@ -0,0 +1,293 @@
+"""
+Background jobs for long running operations on Kairnial Web Services
+
+A job is a registered task run outside of the HTTP request. Its status, progress
+and results are stored in cache so that clients can poll them.
+Jobs are queued either in a thread pool of the web process (local queue) or in
+Redis, where they are run by the run_jobs management command.
+"""
+import functools
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+
+from dynamics_apis.common.concurrency import error_message
+from dynamics_apis.common.services import KairnialWSServiceError
+
+try:
+    import redis
+except ImportError:  # only required by the redis queue
+    redis = None
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+TASKS = {}
+RETRYABLE_TASKS = set()
+
+
+def task(name: str, retry: bool = True):
+    """
+    Register a function as a job task
+    The function is called with the job as first argument and the job parameters as keyword arguments,
+    client and project are found on the job.
+    :param name: unique name of the task
+    :param retry: the task is idempotent and can run again after a transient failure
+    """
+
+    def register(func):
+        TASKS[name] = func
+        if retry:
+            RETRYABLE_TASKS.add(name)
+        else:
+            RETRYABLE_TASKS.discard(name)
+        return func
+
+    return register
+
+
+class JobCancelled(Exception):
+    """
+    Raised in a running task when its job has been cancelled
+    """
+    pass
+
+
+class Job:
+    """
+    Status, progress and results of a background task
+    """
+    attributes = ('id', 'name', 'client_id', 'project_id', 'owner', 'status', 'total', 'done',
+                  'results', 'error', 'attempts', 'created_at', 'updated_at')
+
+    def __init__(self, name: str, client_id: str, project_id: str = None, owner: str = None,
+                 total: int = 0, **kwargs):
+        """
+        :param name: name of the registered task
+        :param client_id: ID of the client
+        :param project_id: RGOC Code of the project
+        :param owner: unique ID of the user who started the job
+        :param total: number of items to process
+        """
+        self.id = kwargs.get('id') or uuid.uuid4().hex
+        self.name = name
+        self.client_id = client_id
+        self.project_id = project_id
+        self.owner = owner
+        self.status = kwargs.get('status', QUEUED)
+        self.total = total
+        self.done = kwargs.get('done', 0)
+        self.results = kwargs.get('results') or []
+        self.error = kwargs.get('error')
+        self.attempts = kwargs.get('attempts', 0)
+        self.created_at = kwargs.get('created_at') or time.time()
+        self.updated_at = kwargs.get('updated_at') or self.created_at
+        self.lock = threading.Lock()
+        self.saved_at = 0
+        self.checked_at = 0
+
+    @staticmethod
+    def cache_key(job_id: str) -> str:
+        return f'job:{job_id}'
+
+    @staticmethod
+    def cancel_key(job_id: str) -> str:
+        return f'job:{job_id}:cancel'
+
+    @classmethod
+    def get(cls, job_id: str):
+        """
+        Load a job, None if unknown or expired
+        """
+        data = cache.get(cls.cache_key(job_id))
+        return cls(**data) if data else None
+
+    def to_dict(self) -> dict:
+        return {attribute: getattr(self, attribute) for attribute in self.attributes}
+
+    def save(self):
+        self.updated_at = self.saved_at = time.time()
+        cache.set(self.cache_key(self.id), self.to_dict(), timeout=getattr(settings, 'KAIRNIAL_JOB_TIMEOUT', 86400))
+
+    def is_visible_to(self, client_id: str, project_id: str, owner: str) -> bool:
+        return (self.client_id, self.project_id, self.owner) == (client_id, project_id, owner)
+
+    @property
+    def progress(self) -> float:
+        if not self.total:
+            return 1.0 if self.status == SUCCEEDED else 0.0
+        return min(1.0, self.done / self.total)
+
+    def cancel(self) -> bool:
+        """
+        Ask for the job to stop
+        A queued job is cancelled at once, a running job stops before its next item.
+        :return: False if the job is already finished
+        """
+        if self.status in FINISHED:
+            return False
+        cache.set(self.cancel_key(self.id), True, timeout=getattr(settings, 'KAIRNIAL_JOB_TIMEOUT', 86400))
+        if self.status == QUEUED:
+            self.status = CANCELLED
+            self.save()
+        return True
+
+    def check(self):
+        """
+        Raise JobCancelled if the job has been cancelled, the cache is read at most once per second
+        """
+        if time.time() - self.checked_at < 1:
+            return
+        self.checked_at = time.time()
+        if cache.get(self.cancel_key(self.id)):
+            raise JobCancelled(self.id)
+
+    def advance(self, result=None):
+        """
+        Record one processed item, thread safe
+        The job is saved at most once per second while running.
+        :param result: outcome of the item, kept in results
+        :raise JobCancelled: if the job has been cancelled in the meantime
+        """
+        with self.lock:
+            self.done += 1
+            if result is not None:
+                self.results.append(result)
+            if time.time() - self.saved_at >= 1:
+                self.save()
+            self.check()
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether a task failed on a transient error: network failure, throttling or server error
+    """
+    if isinstance(error, requests.RequestException):
+        return True
+    if isinstance(error, KairnialWSServiceError):
+        return not error.status or error.status == 429 or error.status >= 500
+    return False
+
+
+def run(job: Job, parameters: dict):
+    """
+    Run the task of a job and record its outcome
+    Transient failures of retryable tasks are retried up to KAIRNIAL_JOB_MAX_ATTEMPTS times
+    with an exponential delay. A retry runs the whole task again.
+    """
+    max_attempts = max(1, getattr(settings, 'KAIRNIAL_JOB_MAX_ATTEMPTS', 3))
+    delay = getattr(settings, 'KAIRNIAL_JOB_RETRY_DELAY', 5)
+    job.status = RUNNING
+    while True:
+        job.attempts += 1
+        job.save()
+        try:
+            job.check()
+            TASKS[job.name](job, **parameters)
+            job.status = SUCCEEDED
+            job.error = None
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = error_message(e)
+            if job.attempts < max_attempts and job.name in RETRYABLE_TASKS and is_retryable(e):
+                job.done, job.results = 0, []
+                time.sleep(delay * 2 ** (job.attempts - 1))
+                continue
+            job.status = FAILED
+        break
+    job.save()
+    return job
+
+
+def execute(job_id: str, parameters: dict):
+    """
+    Run a queued job, skipped if it expired or was cancelled while queued
+    """
+    job = Job.get(job_id)
+    if not job or job.status != QUEUED:
+        return job
+    return run(job, parameters)
+
+
+class LocalQueue:
+    """
+    Run jobs in a thread pool of the current process
+    """
+
+    def __init__(self, workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def push(self, job_id: str, parameters: dict):
+        self.executor.submit(execute, job_id, parameters)
+
+
+class RedisQueue:
+    """
+    Queue jobs in a Redis list, they are run by the run_jobs management command
+    """
+
+    def __init__(self, url: str, key: str = 'kairnial:jobs'):
+        if redis is None:
+            raise ImproperlyConfigured('The redis package is required by the redis job queue')
+        self.connection = redis.Redis.from_url(url)
+        self.key = key
+
+    def push(self, job_id: str, parameters: dict):
+        self.connection.lpush(self.key, json.dumps({'job': job_id, 'parameters': parameters}, cls=DjangoJSONEncoder))
+
+    def pop(self, timeout: int = 5):
+        """
+        Wait for the next job
+        :return: (job ID, parameters) or None after timeout
+        """
+        item = self.connection.brpop(self.key, timeout=timeout)
+        if not item:
+            return None
+        message = json.loads(item[1])
+        return message['job'], message['parameters']
+
+
+@functools.lru_cache(maxsize=None)
+def get_queue():
+    """
+    Job queue configured by KAIRNIAL_JOB_QUEUE
+    """
+    backend = getattr(settings, 'KAIRNIAL_JOB_QUEUE', 'local')
+    if backend == 'local':
+        return LocalQueue(workers=getattr(settings, 'KAIRNIAL_JOB_WORKERS', 2))
+    if backend == 'redis':
+        return RedisQueue(url=getattr(settings, 'KAIRNIAL_JOB_REDIS_URL', 'redis://localhost:6379/0'))
+    raise ImproperlyConfigured(f'Unknown job queue {backend}')
+
+
+def enqueue(name: str, client_id: str, project_id: str = None, owner: str = None, total: int = 0,
+            **parameters) -> Job:
+    """
+    Start a task in background
+    :param name: name of the registered task
+    :param client_id: ID of the client
+    :param project_id: RGOC Code of the project
+    :param owner: unique ID of the user who started the job
+    :param total: number of items to process
+    :param parameters: keyword arguments of the task
+    :return: queued job
+    """
+    if name not in TASKS:
+        raise KeyError(f'Unknown task {name}')
+    job = Job(name=name, client_id=client_id, project_id=project_id, owner=owner, total=total)
+    job.save()
+    get_queue().push(job.id, parameters)
+    return job
@@ -0,0 +1,129 @@
+"""
+Cache keys of Kairnial Web Services calls
+
+A key is made of readable components, so that it can be inspected and matched for
+invalidation, followed by a hash of the call itself, its URL and serialized body:
+
+    kws:<version>:<client>:<project>:<service>.<action>:<principal>:<parameters hash>
+
+The principal is a hash of the access token, responses depend on the rights of the user.
+Bumping KAIRNIAL_WS_CACHE_VERSION drops every cached response, e.g. when their format changes.
+"""
+import fnmatch
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+try:
+    import xxhash
+except ImportError:  # keys are hashed with sha256 without it
+    xxhash = None
+
+NAMESPACE = 'kws'
+NO_PROJECT = '-'
+
+
+def fast_hash(*parts: bytes) -> str:
+    """
+    128 bits hex digest of bytes, with xxh3 if installed
+    Otherwise sha256, hardware accelerated by OpenSSL on most CPUs, is faster than blake2.
+    """
+    hasher = xxhash.xxh3_128() if xxhash is not None else hashlib.sha256()
+    for part in parts:
+        hasher.update(part)
+        hasher.update(b'\x00')
+    return hasher.hexdigest()[:32]
+
+
+class CacheKey:
+    """
+    Components of the cache key of a call
+    """
+    __slots__ = ('version', 'client_id', 'project_id', 'service', 'action', 'principal', 'digest')
+
+    def __init__(self, client_id: str, project_id: str, service: str, action: str, principal: str,
+                 digest: str, version: str = None):
+        """
+        :param client_id: ID of the client
+        :param project_id: ID of the project, None for calls outside of a project
+        :param service: Kairnial service (user, dms...)
+        :param action: Kairnial action (getUsers...)
+        :param principal: hash of the access token
+        :param digest: hash of the URL, body and format of the call
+        :param version: KAIRNIAL_WS_CACHE_VERSION by default
+        """
+        self.version = str(version if version is not None else getattr(settings, 'KAIRNIAL_WS_CACHE_VERSION', 1))
+        self.client_id = client_id
+        self.project_id = project_id or NO_PROJECT
+        self.service = service
+        self.action = action
+        self.principal = principal
+        self.digest = digest
+
+    @classmethod
+    def build(cls, client_id: str, project_id: str, service: str, action: str, token: str,
+              url: str, body: str, format: str = 'json'):
+        """
+        Key of a call
+        :param token: access token, only its hash is part of the key
+        :param url: URL of the Web Service
+        :param body: JSON body sent, with parameters and body headers
+        :param format: expected output format
+        """
+        return cls(
+            client_id=client_id,
+            project_id=project_id,
+            service=service,
+            action=action,
+            principal=fast_hash((token or '').encode('utf8'))[:16],
+            digest=fast_hash(url.encode('utf8'), body.encode('utf8'), format.encode('utf8'))
+        )
+
+    @classmethod
+    def parse(cls, key: str):
+        """
+        Components of a key, None if it is not a Web Services cache key
+        """
+        parts = key.split(':')
+        if len(parts) != 7 or parts[0] != NAMESPACE or '.' not in parts[4]:
+            return None
+        version, client_id, project_id, call, principal, digest = parts[1:]
+        service, action = call.rsplit('.', 1)
+        return cls(client_id=client_id, project_id=project_id, service=service, action=action,
+                   principal=principal, digest=digest, version=version)
+
+    @classmethod
+    def pattern(cls, client_id: str, project_id: str = None, action: str = None) -> str:
+        """
+        Glob pattern of the keys of a client, optionally restricted to a project and an action
+        """
+        return ':'.join([
+            NAMESPACE, str(getattr(settings, 'KAIRNIAL_WS_CACHE_VERSION', 1)), client_id,
+            project_id or '*', f'*.{action}' if action else '*', '*', '*'
+        ])
+
+    def __str__(self):
+        return ':'.join([
+            NAMESPACE, self.version, self.client_id, self.project_id, f'{self.service}.{self.action}',
+            self.principal, self.digest
+        ])
+
+    def __repr__(self):
+        return f'CacheKey({self})'
+
+
+def invalidate(client_id: str, project_id: str = None, action: str = None, keys: [str] = None) -> int:
+    """
+    Delete cached responses of a client, optionally restricted to a project and an action
+    Backends supporting delete_pattern (django-redis) delete all matching keys,
+    other backends delete the matching keys among the given ones.
+    :param keys: known keys, such as the hot calls index, for backends without delete_pattern
+    :return: number of deleted keys, when known
+    """
+    pattern = CacheKey.pattern(client_id=client_id, project_id=project_id, action=action)
+    if hasattr(cache, 'delete_pattern'):
+        return cache.delete_pattern(pattern) or 0
+    matching = [key for key in keys or [] if fnmatch.fnmatchcase(key, pattern)]
+    cache.delete_many(matching)
+    return len(matching)
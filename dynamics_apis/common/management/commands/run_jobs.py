@@ -0,0 +1,35 @@
+"""
+Run background jobs queued in Redis
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dynamics_apis.common import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs queued in Redis, requires KAIRNIAL_JOB_QUEUE = "redis"'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'KAIRNIAL_JOB_WORKERS', 2),
+                            help='Number of jobs run at the same time')
+
+    def handle(self, *args, **options):
+        queue = jobs.get_queue()
+        if not isinstance(queue, jobs.RedisQueue):
+            raise CommandError('Jobs are run by the web process with the local queue')
+        workers = max(1, options['workers'])
+        slots = threading.Semaphore(workers)
+        self.stdout.write(f'Running jobs with {workers} workers')
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                slots.acquire()
+                message = queue.pop()
+                if not message:
+                    slots.release()
+                    continue
+                future = executor.submit(jobs.execute, *message)
+                future.add_done_callback(lambda f: slots.release())
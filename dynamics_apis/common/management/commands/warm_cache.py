@@ -0,0 +1,111 @@
+"""
+Refresh the most requested Kairnial Web Services calls before their cached response expires
+"""
+import logging
+import time
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from dynamics_apis.common.concurrency import RateLimiter, concurrent_map
+from dynamics_apis.common.payloads import cache_set, payload_digest
+from dynamics_apis.common.records import compact
+from dynamics_apis.common.services import KairnialService, KairnialWSServiceError
+from dynamics_apis.common.warming import hot_calls
+
+
+class CacheWarmer:
+    """
+    Refresh hot calls within a budget of upstream calls per minute
+    """
+
+    def __init__(self, budget: int, top: int, margin: int = 5):
+        """
+        :param budget: maximum number of upstream calls per minute
+        :param top: number of hottest calls to keep warm
+        :param margin: refresh calls this many seconds before they expire
+        """
+        self.limiter = RateLimiter(per_minute=budget)
+        self.top = top
+        self.margin = margin
+        self.logger = logging.getLogger('services')
+
+    def due(self) -> [tuple]:
+        """
+        Hot calls whose cached response expires soon, hottest first
+        """
+        timeout = getattr(settings, 'KAIRNIAL_WS_CACHE_TIMEOUT', 30)
+        expires_before = time.time() + self.margin
+        return [
+            (cache_key, entry) for cache_key, entry in hot_calls.hottest(self.top)
+            if entry['cached_at'] + timeout <= expires_before
+        ]
+
+    def refresh(self, item: tuple):
+        """
+        Refresh a hot call
+        :return: cache key, True if refreshed, True if the call must be forgotten
+        """
+        cache_key, entry = item
+        call = entry['call']
+        try:
+            response = KairnialService.post(url=call['url'], headers=call['headers'], data=call['data'])
+            output = compact(call['action'], KairnialService.decode(response, format=call['format']))
+        except KairnialWSServiceError as e:
+            self.logger.debug(f"Cache warming failed for {call['action']} on {call['project_id']}: {e.status}")
+            # The access token expired or was revoked, the call will be recorded again by live traffic
+            return cache_key, False, e.status in (401, 403)
+        except requests.RequestException as e:
+            self.logger.debug(f"Cache warming failed for {call['action']} on {call['project_id']}: {e}")
+            return cache_key, False, False
+        cache_set(
+            cache_key,
+            output,
+            raw=response.content if call['format'] == 'json' else None,
+            digest=payload_digest(response.content)
+        )
+        return cache_key, True, False
+
+    def run_once(self) -> (int, int):
+        """
+        Refresh due calls within the remaining budget
+        :return: number of refreshed calls, number of failed calls
+        """
+        hot_calls.flush()
+        batch = []
+        for item in self.due():
+            if not self.limiter.try_acquire():
+                break
+            batch.append(item)
+        results = concurrent_map(self.refresh, batch)
+        refreshed = [cache_key for cache_key, ok, forget in results if ok]
+        # transient failures are kept and retried on the next pass
+        forgotten = [cache_key for cache_key, ok, forget in results if forget]
+        if results:
+            hot_calls.refreshed(cache_keys=refreshed, forgotten=forgotten)
+        return len(refreshed), len(results) - len(refreshed)
+
+
+class Command(BaseCommand):
+    help = 'Refresh the most requested Kairnial Web Services calls before their cached response expires'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Run as a background worker instead of a single pass')
+        parser.add_argument('--interval', type=int, default=5,
+                            help='Seconds between two passes in loop mode')
+        parser.add_argument('--budget', type=int, default=getattr(settings, 'KAIRNIAL_WARMING_BUDGET', 120),
+                            help='Maximum number of upstream calls per minute')
+        parser.add_argument('--top', type=int, default=getattr(settings, 'KAIRNIAL_WARMING_TOP', 50),
+                            help='Number of hottest calls to keep warm')
+
+    def handle(self, *args, **options):
+        warmer = CacheWarmer(budget=options['budget'], top=options['top'])
+        while True:
+            refreshed, failed = warmer.run_once()
+            if refreshed or failed or not options['loop']:
+                self.stdout.write(f'{refreshed} calls refreshed, {failed} failed')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,100 @@
+"""
+Request scoped memoization of Kairnial Web Services calls
+
+While an API request is served, each distinct read call is sent upstream at most once,
+whatever its use_cache flag. Any other call clears the memo so that reads made after
+a change see its effect. The memo lives in a context variable: it is shared with the
+threads of concurrent_map and never outlives the request.
+"""
+import contextvars
+import threading
+from hashlib import sha1
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from django.conf import settings
+
+_memo = contextvars.ContextVar('kairnial_request_memo', default=None)
+
+
+class RequestMemo:
+    """
+    Responses of the read calls made while serving one API request
+    Identical calls made at the same time wait for the first one. Errors are not memoized.
+    Responses are shared between callers and must not be modified.
+    """
+
+    def __init__(self):
+        self.calls = {}  # cache key: Future
+        self.digests = {}  # cache key: digest of the response
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_read(action: str) -> bool:
+        prefixes = getattr(settings, 'KAIRNIAL_MEMO_READ_PREFIXES', ('get', 'list', 'search', 'count'))
+        return action.lower().startswith(tuple(prefixes))
+
+    def clear(self):
+        with self.lock:
+            self.calls.clear()
+
+    def record(self, cache_key: str, digest: str):
+        """
+        Remember the digest of a response received while serving the request
+        """
+        with self.lock:
+            self.digests[cache_key] = digest
+
+    def digest(self):
+        """
+        Digest of all the responses received so far, None if one of them is unknown
+        """
+        with self.lock:
+            digests = sorted(self.digests.items())
+        if not digests or any(digest is None for cache_key, digest in digests):
+            return None
+        return sha1(repr(digests).encode('utf8')).hexdigest()
+
+    def call(self, action: str, cache_key: str, func):
+        """
+        Run func once per cache key for read actions
+        :param action: name of the Kairnial action
+        :param cache_key: digest of the call, as KairnialService.cache_key
+        :param func: callable sending the call
+        """
+        if not self.is_read(action):
+            self.clear()
+            return func()
+        with self.lock:
+            future = self.calls.get(cache_key)
+            owner = future is None
+            if owner:
+                future = self.calls[cache_key] = Future()
+        if owner:
+            try:
+                future.set_result(func())
+            except Exception as e:
+                with self.lock:
+                    if self.calls.get(cache_key) is future:
+                        del self.calls[cache_key]
+                future.set_exception(e)
+        return future.result()
+
+
+def current():
+    """
+    Memo of the API request being served, None outside of a request
+    """
+    return _memo.get()
+
+
+@contextmanager
+def request_scope():
+    """
+    Memoize calls made within the block
+    """
+    token = _memo.set(RequestMemo())
+    try:
+        yield
+    finally:
+        _memo.reset(token)
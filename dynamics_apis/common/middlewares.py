@@ -4,6 +4,8 @@ Kairnial authentication middleware
 
 from django.contrib.auth import authenticate
 
+from dynamics_apis.common.memo import request_scope
+
 
 class KairnialAuthMiddleware(object):
     """
@@ -31,3 +33,16 @@ class KairnialAuthMiddleware(object):
         client_id = view_kwargs.get('client_id', None)
         if client_id:
             request.client_id = client_id
+
+
+class RequestMemoMiddleware:
+    """
+    Send each distinct Kairnial read call at most once per request
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_scope():
+            return self.get_response(request)
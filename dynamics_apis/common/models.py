@@ -2,9 +2,47 @@
 Common models for all Kairnial objects
 """
 import inspect
+from bisect import bisect_right
+from collections.abc import Sequence
+from itertools import accumulate
+
 from django.conf import settings
 
 
+class LazyList(Sequence):
+    """
+    Read only view over several lists, items are transformed when accessed
+    Only the items of a slice are transformed, so that a page costs its size and not the total.
+    """
+
+    def __init__(self, *lists, transform=None):
+        """
+        :param lists: lists of items, viewed as one list
+        :param transform: optional callable applied to each accessed item
+        """
+        self.lists = [items for items in lists if items]
+        self.ends = list(accumulate(len(items) for items in self.lists))
+        self.transform = transform
+
+    def __len__(self):
+        return self.ends[-1] if self.ends else 0
+
+    def item(self, index: int):
+        position = bisect_right(self.ends, index)
+        start = self.ends[position - 1] if position else 0
+        item = self.lists[position][index - start]
+        return self.transform(item) if self.transform else item
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.item(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.item(index)
+
+
 class PaginatedModel:
     page_size = getattr(settings, 'PAGE_SIZE', 100)
 
@@ -46,6 +84,5 @@ class PaginatedModel:
                 **kwargs
             )
             total = len(obj_list)
-            print(obj_list, page_offset, page_offset + page_limit)
             paginated_list = obj_list[page_offset: page_offset + page_limit]
             return total, paginated_list, page_offset, page_limit
\ No newline at end of file
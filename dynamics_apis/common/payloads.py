@@ -0,0 +1,244 @@
+"""
+Compression of cached Kairnial Web Services responses
+
+Responses larger than KAIRNIAL_CACHE_COMPRESS_THRESHOLD bytes are stored compressed, with
+the first available codec of KAIRNIAL_CACHE_CODECS. Smaller responses are stored as is,
+compressing them would cost more than it saves. JSON responses can be stored as the raw
+bytes received from Kairnial instead of the decoded response, to avoid encoding them again.
+Each response is cached with the digest of its bytes, used to build HTTP validators.
+"""
+import hashlib
+import json
+import logging
+import pickle
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from dynamics_apis.common.records import compact
+
+try:
+    import zstandard
+except ImportError:  # only required by the zstd codec
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:  # only required by the lz4 codec
+    lz4 = None
+
+logger = logging.getLogger('services')
+
+PICKLE = 'pickle'
+JSON = 'json'
+
+
+class Codec:
+    """
+    Compression algorithm of cached payloads
+    """
+    name = ''
+
+    @staticmethod
+    def available() -> bool:
+        return True
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+
+class ZstdCodec(Codec):
+    name = 'zstd'
+
+    @staticmethod
+    def available() -> bool:
+        return zstandard is not None
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+class Lz4Codec(Codec):
+    name = 'lz4'
+
+    @staticmethod
+    def available() -> bool:
+        return lz4 is not None
+
+    def compress(self, data: bytes) -> bytes:
+        return lz4.frame.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lz4.frame.decompress(data)
+
+
+class ZlibCodec(Codec):
+    name = 'zlib'
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, 1)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+CODECS = {codec.name: codec() for codec in (ZstdCodec, Lz4Codec, ZlibCodec)}
+
+
+def preferred_codec():
+    """
+    First available codec of KAIRNIAL_CACHE_CODECS, None if none is available
+    """
+    for name in getattr(settings, 'KAIRNIAL_CACHE_CODECS', ['zstd', 'lz4', 'zlib']):
+        codec = CODECS.get(name)
+        if codec is not None and codec.available():
+            return codec
+    return None
+
+
+class CompressedPayload:
+    """
+    Compressed cache value
+    """
+    __slots__ = ('codec', 'format', 'data')
+
+    def __init__(self, codec: str, format: str, data: bytes):
+        """
+        :param codec: name of the codec
+        :param format: pickle for decoded responses, json for raw Kairnial responses
+        :param data: compressed bytes
+        """
+        self.codec = codec
+        self.format = format
+        self.data = data
+
+    def __getstate__(self):
+        return self.codec, self.format, self.data
+
+    def __setstate__(self, state):
+        self.codec, self.format, self.data = state
+
+
+class CompressionStats:
+    """
+    Compression ratio and time of cached payloads in this process, per codec
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.codecs = {}
+
+    def record(self, codec: str, operation: str, raw_size: int, compressed_size: int, duration: float):
+        """
+        :param operation: compress or decompress
+        """
+        with self.lock:
+            stats = self.codecs.setdefault(codec, {
+                'compress': 0, 'decompress': 0, 'raw_bytes': 0, 'compressed_bytes': 0,
+                'compress_seconds': 0.0, 'decompress_seconds': 0.0,
+            })
+            stats[operation] += 1
+            stats[f'{operation}_seconds'] += duration
+            if operation == 'compress':
+                stats['raw_bytes'] += raw_size
+                stats['compressed_bytes'] += compressed_size
+        logger.debug(f'{codec} {operation}: {raw_size} bytes, {compressed_size} compressed, {duration * 1000:.1f} ms')
+
+    def snapshot(self) -> dict:
+        """
+        Counters per codec, with the ratio of raw to compressed bytes
+        """
+        with self.lock:
+            snapshot = {codec: dict(stats) for codec, stats in self.codecs.items()}
+        for stats in snapshot.values():
+            stats['ratio'] = stats['raw_bytes'] / stats['compressed_bytes'] if stats['compressed_bytes'] else None
+        return snapshot
+
+    def reset(self):
+        with self.lock:
+            self.codecs = {}
+
+
+compression_stats = CompressionStats()
+
+
+def pack(output, raw: bytes = None):
+    """
+    Cache value of a response, compressed if large
+    :param output: decoded response
+    :param raw: bytes received from Kairnial for JSON responses, stored instead of output
+    if KAIRNIAL_CACHE_STORE_RAW is set
+    """
+    threshold = getattr(settings, 'KAIRNIAL_CACHE_COMPRESS_THRESHOLD', 16 * 1024)
+    codec = preferred_codec()
+    if threshold is None or codec is None:
+        return output
+    if raw is not None and getattr(settings, 'KAIRNIAL_CACHE_STORE_RAW', False):
+        format, data = JSON, raw
+    else:
+        format, data = PICKLE, pickle.dumps(output, pickle.HIGHEST_PROTOCOL)
+    if len(data) < threshold:
+        return output
+    start = time.perf_counter()
+    compressed = codec.compress(data)
+    compression_stats.record(codec.name, 'compress', len(data), len(compressed), time.perf_counter() - start)
+    return CompressedPayload(codec=codec.name, format=format, data=compressed)
+
+
+def unpack(action: str, value):
+    """
+    Response of a cache value
+    :param action: action of the call, to compact raw responses
+    :return: decoded response, None if its codec is not available in this process
+    """
+    if not isinstance(value, CompressedPayload):
+        return value
+    codec = CODECS.get(value.codec)
+    if codec is None or not codec.available():
+        logger.warning(f'Cached response compressed with unavailable codec {value.codec}')
+        return None
+    start = time.perf_counter()
+    data = codec.decompress(value.data)
+    compression_stats.record(codec.name, 'decompress', len(data), len(value.data), time.perf_counter() - start)
+    if value.format == JSON:
+        return compact(action, json.loads(data))
+    return pickle.loads(data)
+
+
+def payload_digest(content: bytes) -> str:
+    """
+    Digest of the bytes of a Kairnial response
+    """
+    return hashlib.sha1(content).hexdigest()
+
+
+def cache_get(cache_key: str, action: str) -> tuple:
+    """
+    Cached response of a call
+    :return: digest of the response, response
+    """
+    value = cache.get(cache_key)
+    if not isinstance(value, tuple):
+        return None, value
+    digest, payload = value
+    return digest, unpack(action, payload)
+
+
+def cache_set(cache_key: str, output, raw: bytes = None, digest: str = None):
+    """
+    Cache the response of a call for KAIRNIAL_WS_CACHE_TIMEOUT seconds
+    """
+    cache.set(
+        cache_key,
+        (digest, pack(output, raw=raw)),
+        timeout=getattr(settings, 'KAIRNIAL_WS_CACHE_TIMEOUT', 30)
+    )
@@ -0,0 +1,153 @@
+"""
+Compact records for cached Kairnial Web Services listings
+
+Listings such as getUsers return lists of dicts sharing the same keys. They are cached
+as a schema, the interned tuple of keys shared by every entry of the same action, and
+one tuple of values per item. Items are read through Record, a read only mapping, so that
+filters and serializers use them as they use dicts, without rebuilding them on cache hits.
+"""
+import sys
+from collections.abc import Mapping, Sequence
+
+from django.conf import settings
+
+
+class _Missing:
+    """
+    Value of a key absent from an item
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        return 'MISSING'
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+# Short strings such as flags, dates and codes repeat across items, they are interned
+# so that items share them in memory and the cache stores each of them once
+INTERNED_LENGTH = 32
+
+
+def intern_value(value):
+    if isinstance(value, str) and len(value) <= INTERNED_LENGTH:
+        return sys.intern(value)
+    return value
+
+
+class Schema:
+    """
+    Keys of the items of an action, interned so that one instance is shared per process
+    """
+    __slots__ = ('action', 'keys', 'index')
+    registry = {}  # (action, keys): Schema
+
+    def __init__(self, action: str, keys: tuple):
+        self.action = action
+        self.keys = keys
+        self.index = {key: position for position, key in enumerate(keys)}
+
+    @classmethod
+    def get(cls, action: str, keys: tuple):
+        keys = tuple(sys.intern(key) for key in keys)
+        schema = cls.registry.get((action, keys))
+        if schema is None:
+            schema = cls.registry.setdefault((action, keys), cls(action, keys))
+        return schema
+
+    def __reduce__(self):
+        return Schema.get, (self.action, self.keys)
+
+
+class Record(Mapping):
+    """
+    Read only item of a compact list
+    """
+    __slots__ = ('schema', 'values')
+
+    def __init__(self, schema: Schema, values: tuple):
+        self.schema = schema
+        self.values = values
+
+    def __getitem__(self, key):
+        value = self.values[self.schema.index[key]]
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        position = self.schema.index.get(key)
+        if position is None:
+            return default
+        value = self.values[position]
+        return default if value is MISSING else value
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def __iter__(self):
+        return (key for key, value in zip(self.schema.keys, self.values) if value is not MISSING)
+
+    def __len__(self):
+        return sum(1 for value in self.values if value is not MISSING)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CompactList(Sequence):
+    """
+    List of items stored as one tuple of values per item
+    """
+    __slots__ = ('schema', 'rows')
+
+    def __init__(self, schema: Schema, rows: list):
+        self.schema = schema
+        self.rows = rows
+
+    @classmethod
+    def from_dicts(cls, action: str, items: [dict]):
+        keys = {}
+        for item in items:
+            keys.update(dict.fromkeys(item))
+        schema = Schema.get(action, tuple(keys))
+        return cls(schema, [tuple(intern_value(item.get(key, MISSING)) for key in schema.keys) for item in items])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Record(self.schema, row) for row in self.rows[index]]
+        return Record(self.schema, self.rows[index])
+
+    def __iter__(self):
+        schema = self.schema
+        return (Record(schema, row) for row in self.rows)
+
+    def __reduce__(self):
+        return CompactList, (self.schema, self.rows)
+
+
+def is_listing(value) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+
+def compact(action: str, output):
+    """
+    Store the listings of a response as compact lists, for actions of KAIRNIAL_COMPACT_ACTIONS
+    Listings are the response itself or its values.
+    """
+    if action not in getattr(settings, 'KAIRNIAL_COMPACT_ACTIONS', []):
+        return output
+    if is_listing(output):
+        return CompactList.from_dicts(action, output)
+    if isinstance(output, dict):
+        return {
+            key: CompactList.from_dicts(action, value) if is_listing(value) else value
+            for key, value in output.items()
+        }
+    return output
@@ -5,7 +5,50 @@ from django.utils.translation import gettext as _
 from rest_framework import serializers
 
 
+class ProjectionMixin:
+    """
+    Serializer rendering only the requested fields
+    Fields that are not requested are removed before rendering, so that their
+    values, including computed ones, are never evaluated.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """
+        :param fields: names of the fields to render, all if None, unknown names are ignored
+        """
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 class ErrorSerializer(serializers.Serializer):
     status = serializers.IntegerField(label=_("HTTP error code"))
     code = serializers.IntegerField(label=_("Application error code"), default=0)
-    description = serializers.CharField(label=_("Detailed description"))
\ No newline at end of file
+    description = serializers.CharField(label=_("Detailed description"))
+
+
+class JobSerializer(serializers.Serializer):
+    """
+    Serializer for background jobs
+    """
+    id = serializers.CharField(label=_("Job ID"), read_only=True)
+    name = serializers.CharField(label=_("Task name"), read_only=True)
+    status = serializers.ChoiceField(
+        label=_("Job status"),
+        choices=['queued', 'running', 'succeeded', 'failed', 'cancelled'],
+        read_only=True
+    )
+    total = serializers.IntegerField(label=_("Number of items to process"), read_only=True)
+    done = serializers.IntegerField(label=_("Number of items processed"), read_only=True)
+    progress = serializers.FloatField(label=_("Progress between 0 and 1"), read_only=True)
+    results = serializers.ListField(
+        label=_("Results"),
+        help_text=_("Outcome of each processed item"),
+        child=serializers.DictField(),
+        read_only=True
+    )
+    error = serializers.CharField(label=_("Error"), help_text=_("Why the job failed"), read_only=True)
+    attempts = serializers.IntegerField(label=_("Number of attempts"), read_only=True)
+    created_at = serializers.FloatField(label=_("Creation timestamp"), read_only=True)
+    updated_at = serializers.FloatField(label=_("Last update timestamp"), read_only=True)
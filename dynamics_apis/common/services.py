@@ -1,7 +1,6 @@
 import datetime
 import json
 import logging
-from hashlib import sha1
 from json import JSONDecodeError
 
 import requests
@@ -9,6 +8,13 @@ from django.conf import settings
 from django.core.cache import cache
 from django.utils.translation import gettext as _
 
+from dynamics_apis.authentication.authentication import token_expiry
+from dynamics_apis.common import memo as request_memo
+from dynamics_apis.common.keys import CacheKey
+from dynamics_apis.common.payloads import cache_get, cache_set, payload_digest
+from dynamics_apis.common.records import compact
+from dynamics_apis.common.warming import hot_calls
+
 
 class KairnialWSServiceError(Exception):
     message = _('Error fetching data from Kairnial WebServices')
@@ -20,6 +26,45 @@ class KairnialWSServiceError(Exception):
         self.message = message
 
 
+class CachedError:
+    """
+    Upstream error cached in place of a response, raised again until it expires
+    """
+    __slots__ = ('status', 'message')
+
+    def __init__(self, status: int, message):
+        self.status = status
+        self.message = message
+
+    def __getstate__(self):
+        return self.status, self.message
+
+    def __setstate__(self, state):
+        self.status, self.message = state
+
+    @staticmethod
+    def timeout(status: int):
+        """
+        Lifetime in seconds of a cached error, None if errors of this status are not cached
+        Not found errors are cached for KAIRNIAL_WS_NOT_FOUND_TIMEOUT seconds,
+        server errors and unreachable server for KAIRNIAL_WS_ERROR_TIMEOUT seconds.
+        """
+        if status in getattr(settings, 'KAIRNIAL_WS_NOT_FOUND_STATUSES', [400, 404]):
+            return getattr(settings, 'KAIRNIAL_WS_NOT_FOUND_TIMEOUT', 10) or None
+        if status >= 500:
+            return getattr(settings, 'KAIRNIAL_WS_ERROR_TIMEOUT', 2) or None
+        return None
+
+    @classmethod
+    def store(cls, cache_key: str, status: int, message):
+        timeout = cls.timeout(status)
+        if timeout:
+            cache.set(cache_key, cls(status=status, message=message), timeout=timeout)
+
+    def raise_error(self):
+        raise KairnialWSServiceError(message=self.message, status=self.status)
+
+
 def json_with_dates(obj):
     """
     handler for json date serializer
@@ -87,20 +132,106 @@ class KairnialService:
         :param format: expected output format from tre Kairnial Web Service
         :param cache: cache response
         """
+        logger = logging.getLogger('services')
+        url, headers, data = self.prepare(action=action, service=service, parameters=parameters)
+        logger.debug(url)
+        logger.debug(headers)
+        logger.debug(data)
+        cache_key = self.cache_key(action=action, service=service, url=url, data=data, format=format)
+        memo = request_memo.current()
+
+        def load():
+            if use_cache:
+                hot_call = {
+                    'client_id': self.client_id,
+                    'project_id': getattr(self, 'project_id', None),
+                    'action': action,
+                    'url': url,
+                    'headers': headers,
+                    'data': data,
+                    'format': format,
+                    'expires_at': token_expiry(self.token) if hot_calls.is_warmable(action) else None
+                }
+                hot_calls.record(cache_key, hot_call)
+                digest, output = cache_get(cache_key, action)
+                if isinstance(output, CachedError):
+                    output.raise_error()
+                if output:
+                    if memo is not None:
+                        memo.record(cache_key, digest)
+                    return output
+            try:
+                response = self.post(url=url, headers=headers, data=data)
+            except KairnialWSServiceError as e:
+                if use_cache:
+                    CachedError.store(cache_key, status=e.status, message=e.message)
+                raise
+            except requests.RequestException as e:
+                # same error as its cached replays, views report it instead of failing with a 500
+                message = _('Web Services unreachable')
+                if use_cache:
+                    CachedError.store(cache_key, status=503, message=message)
+                raise KairnialWSServiceError(message=message, status=503) from e
+            output = compact(action, self.decode(response, format=format))
+            digest = payload_digest(response.content)
+            if use_cache:
+                cache_set(cache_key, output, raw=response.content if format == 'json' else None, digest=digest)
+                hot_calls.record(cache_key, hot_call, cached=True)
+            if memo is not None:
+                memo.record(cache_key, digest)
+            return output
+
+        if memo is None:
+            return load()
+        return memo.call(action=action, cache_key=cache_key, func=load)
+
+    def prepare(self, action: str, service: str = '', parameters: [dict] = None) -> tuple:
+        """
+        Build the Webservice request
+        :return: url, headers, data
+        """
         parameters = parameters or [{}]
         service = service if service else self.service_domain
-        logger = logging.getLogger('services')
         url = self.get_url()
         headers = self.get_headers()
         data = self.get_body(service=service, action=action, parameters=parameters)
-        logger.debug(url)
-        logger.debug(headers)
-        logger.debug(data)
-        cache_key = sha1(f'{url}||{json.dumps(headers)}||{data}'.encode('latin1')).hexdigest()
-        if use_cache:
-            output = cache.get(cache_key)
-            if output:
-                return output
+        return url, headers, data
+
+    def cache_key(self, action: str, url: str, data: str, service: str = '', format: str = 'json') -> str:
+        """
+        Cache key of a call, see CacheKey
+        :param url: Webservice URL
+        :param data: JSON body
+        """
+        return str(CacheKey.build(
+            client_id=self.client_id,
+            project_id=getattr(self, 'project_id', None),
+            service=service if service else self.service_domain,
+            action=action,
+            token=self.token,
+            url=url,
+            body=data,
+            format=format
+        ))
+
+    @staticmethod
+    def fetch(url: str, headers: dict, data: str, format: str = 'json'):
+        """
+        Send the request to the Webservice and decode the response
+        :param url: Webservice URL
+        :param headers: HTTP headers
+        :param data: JSON body
+        :param format: expected output format from tre Kairnial Web Service
+        """
+        return KairnialService.decode(KairnialService.post(url=url, headers=headers, data=data), format=format)
+
+    @staticmethod
+    def post(url: str, headers: dict, data: str):
+        """
+        Send the request to the Webservice
+        :return: successful response
+        """
+        logger = logging.getLogger('services')
         response = requests.post(
             url=url,
             headers=headers,
@@ -115,33 +246,40 @@ class KairnialService:
                 message=response.content or 'General error',
                 status=response.status_code
             )
-        else:
-            if format == 'json':
-                try:
-                    output = response.json()
-                except JSONDecodeError as e:
-                    raise KairnialWSServiceError(
-                        message=_("Invalid response from Web Services: {}").format(str(e)),
-                        status=response.status_code
-                    ) from e
-            elif format == 'bool' or format == 'int':
-                try:
-                    val = int(response.content.decode('utf8').replace('"', ''))
-                    if format == 'int':
-                        output = val
-                    else:
-                        output = val != 0
-                except ValueError as e:
-                    logger.debug(e)
-                    raise KairnialWSServiceError(
-                        message=_("Invalid response from Web Services: {}").format(str(e)),
-                        status=response.status_code
-                    ) from e
-            else:  # Return content as string
-                output = response.content
-            if use_cache:
-                cache.set(cache_key, output, timeout=30)
-            return output
+        return response
+
+    @staticmethod
+    def decode(response, format: str = 'json'):
+        """
+        Decode a Webservice response
+        :param response: successful response
+        :param format: expected output format from tre Kairnial Web Service
+        """
+        logger = logging.getLogger('services')
+        if format == 'json':
+            try:
+                output = response.json()
+            except JSONDecodeError as e:
+                raise KairnialWSServiceError(
+                    message=_("Invalid response from Web Services: {}").format(str(e)),
+                    status=response.status_code
+                ) from e
+        elif format == 'bool' or format == 'int':
+            try:
+                val = int(response.content.decode('utf8').replace('"', ''))
+                if format == 'int':
+                    output = val
+                else:
+                    output = val != 0
+            except ValueError as e:
+                logger.debug(e)
+                raise KairnialWSServiceError(
+                    message=_("Invalid response from Web Services: {}").format(str(e)),
+                    status=response.status_code
+                ) from e
+        else:  # Return content as string
+            output = response.content
+        return output
 
 
 class KairnialCrossService(KairnialService):
@@ -0,0 +1,187 @@
+"""
+Delta synchronization of Kairnial lists
+
+A sync token is an opaque signed string holding the position of a client in a
+synchronization: the high-water mark of the last completed sync, the current
+phase and the offset in this phase.
+Kairnial Web Services filter changes by day, so each sync starts one day before
+the high-water mark. Changes are delivered at least once and clients must
+deduplicate them by ID.
+"""
+import datetime
+import time
+import uuid
+from contextlib import contextmanager
+from hashlib import sha1
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+
+class InvalidSyncToken(Exception):
+    """
+    Sync token is malformed, expired or issued for another scope
+    """
+
+
+class SyncSession:
+    """
+    Position of a client in a delta synchronization
+    """
+    salt = 'dynamics_apis.common.sync'
+
+    def __init__(
+            self,
+            scope: str,
+            since: str = None,
+            phase: int = 0,
+            offset: int = 0,
+            started: str = None
+    ):
+        """
+        :param scope: what is synchronized (client, project, object type, ...)
+        :param since: ISO date of the last completed sync, None for a full sync
+        :param phase: index of the current phase
+        :param offset: number of items already read in the current phase
+        :param started: ISO date at which the current sync started
+        """
+        self.scope = scope
+        self.since = since
+        self.phase = phase
+        self.offset = offset
+        self.started = started or datetime.date.today().isoformat()
+
+    @staticmethod
+    def make_scope(*parts) -> str:
+        return '|'.join(str(p) for p in parts)
+
+    def to_token(self) -> str:
+        return signing.dumps({
+            's': self.scope,
+            'h': self.since,
+            'p': self.phase,
+            'o': self.offset,
+            't': self.started
+        }, salt=self.salt, compress=True)
+
+    @classmethod
+    def from_token(cls, token: str, scope: str):
+        """
+        Read a sync token
+        :param token: token returned by a previous sync, None to start a full sync
+        :param scope: expected scope of the token
+        :raise InvalidSyncToken:
+        """
+        if not token:
+            return cls(scope=scope)
+        try:
+            state = signing.loads(
+                token,
+                salt=cls.salt,
+                max_age=getattr(settings, 'KAIRNIAL_SYNC_TOKEN_MAX_AGE', None)
+            )
+        except signing.BadSignature as e:
+            raise InvalidSyncToken(str(e)) from e
+        if state.get('s') != scope:
+            raise InvalidSyncToken('Sync token was issued for another scope')
+        return cls(
+            scope=scope,
+            since=state.get('h'),
+            phase=state.get('p', 0),
+            offset=state.get('o', 0),
+            started=state.get('t')
+        )
+
+    def window_start(self) -> datetime.date:
+        """
+        First day of the change window, None for a full sync
+        """
+        if not self.since:
+            return None
+        return datetime.date.fromisoformat(self.since) - datetime.timedelta(days=1)
+
+    def run(self, phases: [tuple], limit: int):
+        """
+        Read changes from the current position
+        :param phases: list of (change type, fetch) read one after the other,
+        fetch is a callable(offset, limit) returning a page of items
+        :param limit: maximum number of changes to return
+        :return: list of (change type, item), next session, more changes to read
+        """
+        changes = []
+        phase, offset = self.phase, self.offset
+        while phase < len(phases) and len(changes) < limit:
+            change, fetch = phases[phase]
+            take = limit - len(changes)
+            items = fetch(offset, take) or []
+            changes += [(change, item) for item in items]
+            if len(items) < take:
+                phase, offset = phase + 1, 0
+            else:
+                offset += len(items)
+        if phase < len(phases):
+            return changes, SyncSession(self.scope, self.since, phase, offset, self.started), True
+        # Sync is complete, next one starts from the date this one started
+        return changes, SyncSession(self.scope, since=self.started), False
+
+
+@contextmanager
+def cache_lock(key: str, timeout: int = 10):
+    """
+    Lock shared by all processes through the cache, released after timeout seconds at most
+    A lock left by a crashed process expires, the caller then goes on after waiting timeout seconds.
+    """
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + timeout
+    while not cache.add(key, owner, timeout=timeout) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        if cache.get(key) == owner:
+            cache.delete(key)
+
+
+class TombstoneJournal:
+    """
+    Journal of items archived through this API, for sources that do not list archived items
+    Entries are kept in cache as long as sync tokens are valid.
+    """
+
+    def __init__(self, scope: str):
+        """
+        :param scope: what is journaled (client, project, object type, ...)
+        """
+        self.scope = scope
+
+    @property
+    def cache_key(self) -> str:
+        return 'tombstones:' + sha1(self.scope.encode('utf8')).hexdigest()
+
+    @staticmethod
+    def max_age() -> int:
+        return getattr(settings, 'KAIRNIAL_SYNC_TOKEN_MAX_AGE', None)
+
+    def record(self, item_id):
+        """
+        Add an archived item to the journal
+        :param item_id: ID of the archived item
+        """
+        today = datetime.date.today()
+        # concurrent archives would overwrite each other's entries
+        with cache_lock(self.cache_key + ':lock'):
+            entries = cache.get(self.cache_key) or []
+            if self.max_age():
+                oldest = (today - datetime.timedelta(seconds=self.max_age())).isoformat()
+                entries = [e for e in entries if e[0] >= oldest]
+            entries.append((today.isoformat(), item_id))
+            cache.set(self.cache_key, entries, timeout=self.max_age())
+
+    def since(self, date: datetime.date = None) -> []:
+        """
+        IDs of items archived since a date, inclusive
+        :param date: first day, all journaled items if None
+        """
+        start = date.isoformat() if date else ''
+        return [item_id for day, item_id in cache.get(self.cache_key) or [] if day >= start]
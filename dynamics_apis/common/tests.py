@@ -2,14 +2,35 @@
 Common test cases
 """
 
+import datetime
+import json
 import os
+import pickle
+import time
+from unittest import mock
 
-from django.test import TestCase
+import requests
+from django.core.cache import cache
+from django.test import TestCase, SimpleTestCase, override_settings
 # Create your tests here.
 from dotenv import load_dotenv
-from rest_framework.test import APIClient
+from django.urls import resolve
+from rest_framework.test import APIClient, APIRequestFactory
 
 from dynamics_apis.authentication.serializers import AuthResponseSerializer
+from dynamics_apis.common import jobs
+from dynamics_apis.common import memo
+from dynamics_apis.common.memo import request_scope
+from dynamics_apis.common.concurrency import concurrent_outcomes, concurrent_map
+from dynamics_apis.common.filters import FilterEngine, Contains, Exact, In, Min, Max
+from dynamics_apis.common.management.commands.warm_cache import CacheWarmer
+from dynamics_apis.common.keys import CacheKey, invalidate
+from dynamics_apis.common.models import LazyList
+from dynamics_apis.common.payloads import CompressedPayload, cache_get, cache_set, compression_stats, pack
+from dynamics_apis.common.records import CompactList, Record, compact
+from dynamics_apis.common.services import CachedError, KairnialService, KairnialWSService, KairnialWSServiceError
+from dynamics_apis.common.sync import SyncSession, InvalidSyncToken, TombstoneJournal
+from dynamics_apis.common.warming import HotCallRegistry
 
 load_dotenv()
 
@@ -94,3 +115,382 @@ class CommonTest(TestCase):
         )
         access_token = AuthResponseSerializer(auth_response).data.get('access_token')
         return access_token
+
+
+class FilterEngineTest(SimpleTestCase):
+    """
+    Test filter compilation on Kairnial lists
+    """
+    items = [
+        {'name': 'Alpha', 'type': 'bim:pins', 'level': 1},
+        {'name': 'beta', 'type': 'dms:read', 'level': 2},
+        {'name': 'Gamma', 'type': 'bim:read', 'level': 3},
+    ]
+
+    def test_100_contains_is_case_insensitive(self):
+        engine = FilterEngine(search=Contains('name'))
+        self.assertEqual(engine.filter(self.items, {'search': 'ALP'}), self.items[:1])
+
+    def test_101_filters_are_combined(self):
+        engine = FilterEngine(
+            domain=Exact('type', transform=lambda t: t.split(':')[0]),
+            search=Contains('name', 'type'),
+            min_level=Min('level'),
+            max_level=Max('level'),
+        )
+        self.assertEqual(engine.filter(self.items, {'domain': 'bim', 'search': 'read'}), self.items[2:])
+        self.assertEqual(engine.filter(self.items, {'min_level': 2, 'max_level': 2}), self.items[1:2])
+
+    def test_102_in_list(self):
+        engine = FilterEngine(levels=In('level'))
+        self.assertEqual(engine.filter(self.items, {'levels': [1, 3]}), [self.items[0], self.items[2]])
+
+    def test_103_unknown_and_empty_filters_are_ignored(self):
+        engine = FilterEngine(search=Contains('name'))
+        self.assertEqual(engine.filter(self.items, {'other': 'x', 'search': None}), self.items)
+        self.assertIsNone(engine.compile({}))
+
+
+class SyncSessionTest(SimpleTestCase):
+    """
+    Test delta sync tokens and phases
+    """
+    items = list(range(5))
+
+    def fetch(self, offset, limit):
+        return self.items[offset:offset + limit]
+
+    def test_100_token_round_trip(self):
+        session = SyncSession(scope='c|p', since='2022-01-10', phase=1, offset=20)
+        restored = SyncSession.from_token(session.to_token(), scope='c|p')
+        self.assertEqual((restored.since, restored.phase, restored.offset), ('2022-01-10', 1, 20))
+        self.assertEqual(str(restored.window_start()), '2022-01-09')
+
+    def test_101_token_scope_is_checked(self):
+        token = SyncSession(scope='c|p1').to_token()
+        with self.assertRaises(InvalidSyncToken):
+            SyncSession.from_token(token, scope='c|p2')
+        with self.assertRaises(InvalidSyncToken):
+            SyncSession.from_token(token[:-2], scope='c|p1')
+
+    def test_102_phases_are_paginated(self):
+        session = SyncSession(scope='s', started='2022-01-10')
+        phases = [('created', self.fetch), ('archived', lambda offset, limit: [])]
+        changes, session, has_more = session.run(phases=phases, limit=3)
+        self.assertEqual(changes, [('created', 0), ('created', 1), ('created', 2)])
+        self.assertTrue(has_more)
+        changes, session, has_more = session.run(phases=phases, limit=3)
+        self.assertEqual(changes, [('created', 3), ('created', 4)])
+        self.assertFalse(has_more)
+        self.assertEqual((session.since, session.phase, session.offset), ('2022-01-10', 0, 0))
+
+    def test_103_tombstones_since(self):
+        journal = TombstoneJournal(scope='c|p|test_103')
+        journal.record(12)
+        journal.record(13)
+        self.assertEqual(journal.since(), [12, 13])
+        self.assertEqual(journal.since(datetime.date.today() + datetime.timedelta(days=1)), [])
+
+    def test_104_concurrent_tombstones_are_kept(self):
+        journal = TombstoneJournal(scope='c|p|test_104')
+        shared_cache = mock.Mock(wraps=cache)
+
+        def slow_get(*args, **kwargs):
+            value = cache.get(*args, **kwargs)
+            time.sleep(0.005)  # let other threads run between read and write
+            return value
+
+        shared_cache.get.side_effect = slow_get
+        with mock.patch('dynamics_apis.common.sync.cache', shared_cache):
+            concurrent_map(journal.record, range(20))
+        self.assertEqual(sorted(journal.since()), list(range(20)))
+
+
+class HotCallRegistryTest(SimpleTestCase):
+    """
+    Test tracking of hot calls for cache warming
+    """
+
+    def test_100_only_warmable_calls_are_counted(self):
+        registry = HotCallRegistry()
+        call = {'client_id': 'c', 'project_id': 'p', 'action': 'getUsers', 'expires_at': time.time() + 60}
+        registry.record('test_100_users', call)
+        registry.record('test_100_users', call)
+        registry.record('test_100_add', dict(call, action='addUser'))
+        registry.flush()
+        hottest = dict(registry.hottest(top=100))
+        self.assertEqual(hottest['test_100_users']['hits'], 2)
+        self.assertNotIn('test_100_add', hottest)
+
+    def test_101_counts_of_processes_add_up(self):
+        call = {'action': 'getUsers', 'data': '{"headers": {"BearerToken": "secret"}}', 'expires_at': time.time() + 60}
+        processes = [HotCallRegistry(), HotCallRegistry()]
+        for registry in processes:
+            registry.record('test_101_users', call)
+        for registry in processes:
+            registry.flush()
+        self.assertEqual(dict(processes[0].hottest(top=100))['test_101_users']['hits'], 2)
+        # tokens are only stored with the call, never in the shared index
+        self.assertNotIn('secret', repr(cache.get(HotCallRegistry.index_key)))
+
+    def test_102_calls_with_expired_token_are_not_kept(self):
+        registry = HotCallRegistry()
+        registry.record('test_102_users', {'action': 'getUsers', 'expires_at': time.time() - 1})
+        registry.record('test_102_groups', {'action': 'getGroups', 'expires_at': None})
+        registry.flush()
+        hottest = dict(registry.hottest(top=100))
+        self.assertNotIn('test_102_users', hottest)
+        self.assertNotIn('test_102_groups', hottest)
+
+    def test_103_only_unauthorized_calls_are_forgotten(self):
+        errors = {
+            'test_103_unauthorized': KairnialWSServiceError(message='Unauthorized', status=401),
+            'test_103_unavailable': KairnialWSServiceError(message='Unavailable', status=503),
+            'test_103_unreachable': requests.ConnectionError('Unreachable'),
+        }
+        due = [(key, {'call': {'url': key, 'headers': {}, 'data': '', 'action': 'getUsers', 'project_id': 'p'}})
+               for key in errors]
+
+        def post(url, **kwargs):
+            raise errors[url]
+
+        warmer = CacheWarmer(budget=10, top=10)
+        with mock.patch.object(warmer, 'due', return_value=due), \
+                mock.patch.object(KairnialService, 'post', side_effect=post), \
+                mock.patch('dynamics_apis.common.management.commands.warm_cache.hot_calls') as registry:
+            self.assertEqual(warmer.run_once(), (0, 3))
+        registry.refreshed.assert_called_once_with(cache_keys=[], forgotten=['test_103_unauthorized'])
+
+
+@override_settings(KAIRNIAL_JOB_RETRY_DELAY=0, KAIRNIAL_JOB_MAX_ATTEMPTS=2)
+class JobTest(SimpleTestCase):
+    """
+    Test background jobs retries and cancellation
+    """
+
+    def test_100_transient_errors_are_retried(self):
+        attempts = []
+
+        @jobs.task('tests.flaky')
+        def flaky(job, items):
+            attempts.append(job.attempts)
+            for item in items:
+                job.advance({'item': item})
+            if len(attempts) == 1:
+                raise KairnialWSServiceError(message='Unavailable', status=503)
+
+        job = jobs.Job(name='tests.flaky', client_id='c', project_id='p', total=2)
+        jobs.run(job, {'items': [1, 2]})
+        self.assertEqual(job.status, jobs.SUCCEEDED)
+        self.assertEqual((attempts, job.done, job.error), ([1, 2], 2, None))
+
+    def test_101_non_idempotent_tasks_are_not_retried(self):
+        attempts = []
+
+        @jobs.task('tests.create', retry=False)
+        def create(job):
+            attempts.append(job.attempts)
+            raise KairnialWSServiceError(message='Timeout', status=504)
+
+        job = jobs.Job(name='tests.create', client_id='c', project_id='p', total=1)
+        jobs.run(job, {})
+        self.assertEqual((job.status, attempts, job.error), (jobs.FAILED, [1], 'Timeout'))
+
+    def test_102_cancelled_job_is_not_run(self):
+        processed = []
+        jobs.task('tests.cancelled')(lambda job, items: processed.extend(items))
+        job = jobs.Job(name='tests.cancelled', client_id='c', project_id='p', total=2)
+        job.save()
+        self.assertTrue(job.cancel())
+        self.assertEqual(jobs.execute(job.id, {'items': [1, 2]}).status, jobs.CANCELLED)
+        self.assertEqual(processed, [])
+        self.assertFalse(job.cancel())
+
+    def test_103_callback_error_skips_remaining_items(self):
+        processed = []
+
+        def stop(item, result, error):
+            raise jobs.JobCancelled(item)
+
+        with self.assertRaises(jobs.JobCancelled):
+            concurrent_outcomes(processed.append, range(10), max_workers=2, callback=stop)
+        self.assertLessEqual(len(processed), 2)
+
+
+class LazyListTest(SimpleTestCase):
+    """
+    Test lazy views used for manual pagination
+    """
+
+    def test_100_only_the_slice_is_transformed(self):
+        transformed = []
+        view = LazyList([1, 2], [], [3, 4, 5], transform=lambda item: transformed.append(item) or item * 10)
+        self.assertEqual(len(view), 5)
+        self.assertEqual(view[1:4], [20, 30, 40])
+        self.assertEqual(transformed, [2, 3, 4])
+        self.assertEqual((view[-1], list(LazyList())), (50, []))
+
+
+class RequestMemoTest(SimpleTestCase):
+    """
+    Test request scoped memoization of upstream calls
+    """
+
+    def test_100_reads_run_once_per_request(self):
+        sent = []
+
+        def call(action, key):
+            return memo.current().call(action, key, lambda: sent.append(key) or key.upper())
+
+        with memo.request_scope():
+            self.assertEqual(concurrent_map(lambda key: call('getUsers', key), 'aaba'), ['A', 'A', 'B', 'A'])
+            self.assertEqual(sorted(sent), ['a', 'b'])
+            call('addUser', 'c')
+            call('getUsers', 'a')
+        self.assertEqual(sent[2:], ['c', 'a'])
+        self.assertIsNone(memo.current())
+
+
+class RecordTest(SimpleTestCase):
+    """
+    Test compact records of cached listings
+    """
+
+    def test_100_records_read_as_dicts(self):
+        items = [{'id': 1, 'name': 'a', 'archived': '0'}, {'id': 2, 'name': 'b'}]
+        with override_settings(KAIRNIAL_COMPACT_ACTIONS=['getItem']):
+            output = pickle.loads(pickle.dumps(compact('getItem', {'items': items, 'count': 2})))
+            self.assertEqual(compact('getUsers', items), items)
+        self.assertIsInstance(output['items'], CompactList)
+        self.assertEqual(output['count'], 2)
+        self.assertEqual([dict(record) for record in output['items']], items)
+        record = output['items'][1]
+        self.assertIsInstance(record, Record)
+        self.assertNotIn('archived', record)
+        self.assertIsNone(record.get('archived'))
+        with self.assertRaises(KeyError):
+            record['archived']
+        self.assertEqual(FilterEngine(name=Exact('name')).filter(output['items'], {'name': 'b'}), [items[1]])
+
+
+class CompressionTest(SimpleTestCase):
+    """
+    Test compression of cached responses
+    """
+    items = [{'id': i, 'name': f'Plan {i}', 'status': 'valid'} for i in range(500)]
+
+    @override_settings(KAIRNIAL_CACHE_COMPRESS_THRESHOLD=1024, KAIRNIAL_CACHE_CODECS=['zlib'])
+    def test_100_large_responses_are_compressed(self):
+        compression_stats.reset()
+        self.assertEqual(pack(self.items[:2]), self.items[:2])
+        cache_set('compression_test', self.items, digest='digest')
+        self.assertEqual(cache_get('compression_test', 'getItem'), ('digest', self.items))
+        stats = compression_stats.snapshot()['zlib']
+        self.assertEqual((stats['compress'], stats['decompress']), (1, 1))
+        self.assertGreater(stats['ratio'], 5)
+
+    @override_settings(KAIRNIAL_CACHE_COMPRESS_THRESHOLD=1024, KAIRNIAL_CACHE_CODECS=['zlib'],
+                       KAIRNIAL_CACHE_STORE_RAW=True, KAIRNIAL_COMPACT_ACTIONS=['getItem'])
+    def test_101_raw_responses_are_decoded(self):
+        raw = json.dumps({'items': self.items}).encode('utf8')
+        cache_set('compression_test', {}, raw=raw)
+        digest, output = cache_get('compression_test', 'getItem')
+        self.assertEqual([dict(item) for item in output['items']], self.items)
+
+    def test_102_unknown_codec_is_a_miss(self):
+        payload = CompressedPayload('brotli', 'pickle', b'')
+        with mock.patch('dynamics_apis.common.payloads.cache.get', return_value=('digest', payload)):
+            self.assertEqual(cache_get('compression_test', 'getItem'), ('digest', None))
+
+
+class ErrorCacheTest(SimpleTestCase):
+    """
+    Test caching of upstream errors
+    """
+
+    def call(self, status: int, project_id: str):
+        response = mock.Mock(status_code=status, content=b'error')
+        with mock.patch('requests.post', return_value=response) as post:
+            service = KairnialWSService(client_id='client', token='token', project_id=project_id)
+            for attempt in range(3):
+                with self.assertRaises(KairnialWSServiceError) as context:
+                    service.call(action='getItem', service='dms', use_cache=True)
+                self.assertEqual(context.exception.status, status)
+        return post.call_count
+
+    def test_100_errors_are_cached_by_status(self):
+        self.assertEqual(self.call(404, 'missing'), 1)
+        self.assertEqual(self.call(503, 'outage'), 1)
+        self.assertEqual(self.call(403, 'forbidden'), 3)
+
+    @override_settings(KAIRNIAL_WS_NOT_FOUND_TIMEOUT=30, KAIRNIAL_WS_ERROR_TIMEOUT=0)
+    def test_101_timeouts(self):
+        self.assertEqual(CachedError.timeout(404), 30)
+        self.assertIsNone(CachedError.timeout(502))
+        self.assertIsNone(CachedError.timeout(401))
+
+    def test_102_unreachable_service_is_a_service_error(self):
+        with mock.patch('requests.post', side_effect=requests.ConnectionError('refused')) as post:
+            service = KairnialWSService(client_id='client', token='token', project_id='test_102')
+            for attempt in range(2):
+                with self.assertRaises(KairnialWSServiceError) as context:
+                    service.call(action='getItem', service='dms', use_cache=True)
+                self.assertEqual(context.exception.status, 503)
+        self.assertEqual(post.call_count, 1)
+
+
+class ConditionalResponseTest(SimpleTestCase):
+    """
+    Test entity tags of list responses
+    """
+    modules = {'modules': [{'id': 1, 'title': 'DMS', 'subtitle': 'Documents'}]}
+
+    def get(self, modules: dict, **headers):
+        path = '/client/project/admin/modules/'
+        request = APIRequestFactory().get(path, **headers)
+        request.token = 'token'
+        request.resolver_match = match = resolve(path)
+        content = json.dumps(modules).encode('utf8')
+        response = mock.Mock(status_code=200, content=content, json=lambda: json.loads(content))
+        with request_scope(), mock.patch('requests.post', return_value=response), \
+                mock.patch('rest_framework.views.APIView.check_permissions'), \
+                mock.patch('rest_framework.views.APIView.perform_authentication'):
+            return match.func(request, **match.kwargs)
+
+    def test_100_unchanged_lists_are_not_sent_again(self):
+        response = self.get(self.modules)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.get(self.modules, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        cache.clear()  # cached response expired
+        changed = {'modules': [{'id': 1, 'title': 'DMS', 'subtitle': 'Files'}]}
+        self.assertEqual(self.get(changed, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class CacheKeyTest(SimpleTestCase):
+    """
+    Test cache keys of Web Services calls
+    """
+
+    def key(self, project_id: str, action: str, token: str = 'token', body: str = '[{}]'):
+        service = KairnialWSService(client_id='keys', token=token, project_id=project_id)
+        return service.cache_key(action=action, service='dms', url='https://ws.kairnial.com/été', data=body)
+
+    def test_100_keys_are_readable(self):
+        key = self.key('rgoc1', 'getItem', body='[{"nom": "日本"}]')
+        components = CacheKey.parse(key)
+        self.assertEqual(
+            (components.client_id, components.project_id, components.service, components.action),
+            ('keys', 'rgoc1', 'dms', 'getItem')
+        )
+        self.assertEqual(str(components), key)
+        self.assertNotEqual(key, self.key('rgoc1', 'getItem'))
+        self.assertNotEqual(CacheKey.parse(self.key('rgoc1', 'getItem', token='other')).principal, components.principal)
+        self.assertIsNone(CacheKey.parse('folder_tree:keys'))
+
+    def test_101_invalidate_matching_keys(self):
+        keys = [self.key('rgoc1', 'getItem'), self.key('rgoc1', 'getUsers'), self.key('rgoc2', 'getItem')]
+        cache.set_many({key: 'cached' for key in keys})
+        self.assertEqual(invalidate(client_id='keys', project_id='rgoc1', action='getItem', keys=keys), 1)
+        self.assertEqual(invalidate(client_id='keys', project_id='rgoc1', keys=keys[1:]), 1)
+        self.assertEqual(list(cache.get_many(keys)), keys[2:])
@@ -0,0 +1,21 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+
+from .viewsets import JobViewSet, ClientJobViewSet
+
+# Create a router and register our viewsets with it.
+router = DefaultRouter()
+router.register(r'jobs', JobViewSet, basename='jobs')
+
+client_router = DefaultRouter()
+client_router.register(r'jobs', ClientJobViewSet, basename='jobs')
+
+# The API URLs are now determined automatically by the router.
+urlpatterns = [
+    path('', include(router.urls)),
+]
+
+# Jobs not attached to a project
+client_urlpatterns = [
+    path('', include(client_router.urls)),
+]
@@ -2,14 +2,25 @@
 Common code related to viewsets
 """
 import os
+from hashlib import sha1
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
 from django.utils.translation import gettext as _
 from django.conf import settings
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter
+from django.urls import reverse
+from drf_spectacular.utils import extend_schema, extend_schema_view
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.viewsets import ViewSet
 
+from dynamics_apis.common import memo as request_memo
+from dynamics_apis.common.jobs import Job
+from dynamics_apis.common.serializers import JobSerializer
+
 default_client_example = OpenApiExample(
     name='Default clientID',
     value=os.environ.get('DEFAULT_KAIRNIAL_CLIENT_ID', '')
@@ -39,6 +50,62 @@ pagination_parameters = [
                      description=_("Number of results per page"), default=getattr(settings, 'PAGE_SIZE', 100)),
 ]
 
+fields_parameters = [
+    OpenApiParameter("fields", OpenApiTypes.STR, OpenApiParameter.QUERY, required=False,
+                     description=_("Comma separated list of the fields to return, all fields by default")),
+]
+
+
+def requested_fields(request):
+    """
+    Fields asked for with ?fields=, None if all fields are requested
+    """
+    fields = request.GET.get('fields')
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(',') if field.strip()]
+
+
+def upstream_etag(request):
+    """
+    Entity tag of a response built from the Kairnial responses received so far, None if unknown
+    The tag changes when the request URL or any of the Kairnial responses change.
+    """
+    memo = request_memo.current()
+    digest = memo.digest() if memo is not None else None
+    if digest is None:
+        return None
+    return quote_etag(sha1(f'{request.get_full_path()}|{digest}'.encode('utf8')).hexdigest())
+
+
+def with_validators(request, response, etag: str = None):
+    """
+    Add the entity tag and the Cache-Control policy of the route to a response
+    Policies are set by URL name in KAIRNIAL_CACHE_CONTROL, KAIRNIAL_DEFAULT_CACHE_CONTROL otherwise.
+    """
+    url_name = getattr(getattr(request, 'resolver_match', None), 'url_name', None)
+    policy = getattr(settings, 'KAIRNIAL_CACHE_CONTROL', {}).get(
+        url_name, getattr(settings, 'KAIRNIAL_DEFAULT_CACHE_CONTROL', {'private': True, 'no_cache': True})
+    )
+    if etag:
+        response['ETag'] = etag
+    patch_cache_control(response, **policy)
+    # responses depend on the access token
+    patch_vary_headers(response, ['Authentication'])
+    return response
+
+
+def not_modified(request, etag: str = None):
+    """
+    304 response if the client already has the version tagged etag, None otherwise
+    """
+    if not etag:
+        return None
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if '*' not in etags and etag not in [tag[2:] if tag.startswith('W/') else tag for tag in etags]:
+        return None
+    return with_validators(request, Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
 
 class PaginatedViewSet(ViewSet):
 
@@ -49,7 +116,7 @@ class PaginatedViewSet(ViewSet):
         try:
             page_limit = int(request.GET.get('page_limit'))
             page_offset = int(request.GET.get('page_offset'))
-        except ValueError:
+        except (TypeError, ValueError):
             page_offset = 0
             page_limit = getattr(settings, 'PAGE_SIZE', 100)
         return page_offset, page_limit
@@ -76,3 +143,176 @@ class PaginatedResponse:
             content_type='application/json',
             status=status.HTTP_200_OK
         )
+
+
+class BulkResponse:
+    """
+    Response of a bulk operation with outcomes per item
+    201 if all items succeeded, 207 if some failed and 400 if all failed
+    """
+
+    def __new__(
+            cls,
+            data,
+            succeeded: int,
+            failed: int
+    ):
+        if not failed:
+            response_status = status.HTTP_201_CREATED
+        elif not succeeded:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_207_MULTI_STATUS
+        return Response(
+            data,
+            content_type='application/json',
+            status=response_status
+        )
+
+
+class JobResponse:
+    """
+    Response for an operation started in background
+    """
+
+    def __new__(
+            cls,
+            job: Job
+    ):
+        kwargs = {'client_id': job.client_id, 'pk': job.id}
+        if job.project_id:
+            kwargs['project_id'] = job.project_id
+        return Response(
+            JobSerializer(job).data,
+            content_type='application/json',
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('jobs-detail', kwargs=kwargs)}
+        )
+
+
+def run_in_background(request) -> bool:
+    """
+    Whether the client asked for an operation to run in background with ?async=true
+    """
+    return request.GET.get('async') in ('true', '1')
+
+
+async_parameters = [
+    OpenApiParameter("async", OpenApiTypes.BOOL, OpenApiParameter.QUERY, required=False,
+                     description=_("Run the operation in background and return a job to follow")),
+]
+
+job_parameters = [
+    OpenApiParameter("id", OpenApiTypes.STR, OpenApiParameter.PATH,
+                     description=_("ID of the job")),
+]
+
+
+class JobViewSet(PaginatedViewSet):
+    """
+    A ViewSet for following background jobs of a project
+    """
+
+    @staticmethod
+    def get_job(request, client_id: str, project_id: str, pk: str):
+        """
+        Job started by the current user, None if not found
+        """
+        job = Job.get(pk)
+        if not job or not job.is_visible_to(client_id, project_id, getattr(request.user, 'uuid', None)):
+            return None
+        return job
+
+    @extend_schema(
+        summary=_("Retrieve a background job"),
+        description=_("Status, progress and results of a job started by the current user"),
+        parameters=project_parameters + job_parameters,
+        responses={200: JobSerializer, 404: OpenApiTypes.STR},
+        methods=["GET"]
+    )
+    def retrieve(self, request, client_id: str, pk: str, project_id: str = None):
+        """
+        Retrieve job status
+        :param request: HttpRequest
+        :param client_id: Client ID token
+        :param pk: ID of the job
+        :param project_id: Project RGOC ID
+        """
+        job = self.get_job(request, client_id, project_id, pk)
+        if not job:
+            return Response(_("Job not found"), status=status.HTTP_404_NOT_FOUND)
+        return Response(JobSerializer(job).data, content_type='application/json', status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary=_("Results of a background job"),
+        description=_("Paginated outcomes of the items processed so far"),
+        parameters=project_parameters + job_parameters + pagination_parameters,
+        responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.STR},
+        methods=["GET"]
+    )
+    @action(['GET'], detail=True, url_path='results', url_name='results')
+    def results(self, request, client_id: str, pk: str, project_id: str = None):
+        """
+        Retrieve job results
+        :param request: HttpRequest
+        :param client_id: Client ID token
+        :param pk: ID of the job
+        :param project_id: Project RGOC ID
+        """
+        job = self.get_job(request, client_id, project_id, pk)
+        if not job:
+            return Response(_("Job not found"), status=status.HTTP_404_NOT_FOUND)
+        page_offset, page_limit = self.get_pagination(request)
+        return PaginatedResponse(
+            data=job.results[page_offset:page_offset + page_limit],
+            total=len(job.results),
+            page_offset=page_offset,
+            page_limit=page_limit
+        )
+
+    @extend_schema(
+        summary=_("Cancel a background job"),
+        description=_("A queued job is cancelled at once, a running job stops before its next item. "
+                      "Items already processed are not rolled back."),
+        parameters=project_parameters + job_parameters,
+        request=None,
+        responses={202: JobSerializer, 404: OpenApiTypes.STR, 409: OpenApiTypes.STR},
+        methods=["POST"]
+    )
+    @action(['POST'], detail=True, url_path='cancel', url_name='cancel')
+    def cancel(self, request, client_id: str, pk: str, project_id: str = None):
+        """
+        Cancel a job
+        :param request: HttpRequest
+        :param client_id: Client ID token
+        :param pk: ID of the job
+        :param project_id: Project RGOC ID
+        """
+        job = self.get_job(request, client_id, project_id, pk)
+        if not job:
+            return Response(_("Job not found"), status=status.HTTP_404_NOT_FOUND)
+        if not job.cancel():
+            return Response(_("Job is already finished"), status=status.HTTP_409_CONFLICT)
+        return Response(JobSerializer(job).data, content_type='application/json', status=status.HTTP_202_ACCEPTED)
+
+
+def client_job_schema(operation_id: str):
+    """
+    Schema of a JobViewSet action on the client path
+    """
+    return extend_schema(
+        operation_id=operation_id,
+        parameters=[OpenApiParameter("project_id", OpenApiTypes.STR, OpenApiParameter.PATH, exclude=True)]
+    )
+
+
+@extend_schema_view(
+    retrieve=client_job_schema('client_jobs_retrieve'),
+    results=client_job_schema('client_jobs_results_retrieve'),
+    cancel=client_job_schema('client_jobs_cancel_create')
+)
+class ClientJobViewSet(JobViewSet):
+    """
+    A ViewSet for following background jobs of a client, such as project creation
+    """
+    pass
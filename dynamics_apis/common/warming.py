@@ -0,0 +1,138 @@
+"""
+Registry of the Kairnial Web Services calls most requested by live traffic
+
+Cached calls are counted in each process and periodically added to shared counters
+stored in the cache, one per call. The warm_cache management command reads them to
+refresh the hottest calls before their cached response expires.
+
+The body of a call holds the access token of the user: each call is stored in its own
+entry, which expires with the token, and the shared index only lists cache keys.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class HotCallRegistry:
+    """
+    Count cached calls per cache key
+    """
+    index_key = 'warming:hot_calls'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.flushed_at = time.time()
+
+    @staticmethod
+    def is_warmable(action: str) -> bool:
+        return action in getattr(settings, 'KAIRNIAL_WARMING_ACTIONS', [])
+
+    def record(self, cache_key: str, call: dict, cached: bool = False):
+        """
+        Count a call
+        :param cache_key: key of the cached response
+        :param call: client_id, project_id, action, url, headers, data, format of the call
+            and expiration time of its access token
+        :param cached: the response has just been fetched and stored in cache
+        """
+        if not self.is_warmable(call.get('action')):
+            return
+        now = time.time()
+        with self.lock:
+            entry = self.pending.setdefault(cache_key, {'call': call, 'hits': 0, 'cached_at': 0})
+            if cached:
+                entry['cached_at'] = now
+            else:
+                entry['hits'] += 1
+            entry['last_seen'] = now
+            if now - self.flushed_at < getattr(settings, 'KAIRNIAL_WARMING_FLUSH_INTERVAL', 10):
+                return
+            pending, self.pending, self.flushed_at = self.pending, {}, now
+        self.merge(pending)
+
+    def flush(self):
+        """
+        Merge calls counted in this process into the shared index
+        """
+        with self.lock:
+            pending, self.pending, self.flushed_at = self.pending, {}, time.time()
+        self.merge(pending)
+
+    @staticmethod
+    def entry_key(kind: str, cache_key: str) -> str:
+        """
+        :param kind: call, hits or cached_at
+        """
+        return f'warming:{kind}:{cache_key}'
+
+    def merge(self, pending: dict):
+        if not pending:
+            return
+        now = time.time()
+        idle_timeout = getattr(settings, 'KAIRNIAL_WARMING_IDLE_TIMEOUT', 600)
+        merged = {}
+        for cache_key, entry in pending.items():
+            expires_at = entry['call'].get('expires_at')
+            # A call cannot be replayed after its access token expires
+            timeout = min(idle_timeout, int(expires_at - now)) if expires_at else 0
+            if timeout <= 0:
+                continue
+            cache.set(self.entry_key('call', cache_key), entry['call'], timeout=timeout)
+            if entry['hits']:
+                self.incr(self.entry_key('hits', cache_key), entry['hits'], timeout=idle_timeout)
+            if entry['cached_at']:
+                cache.set(self.entry_key('cached_at', cache_key), entry['cached_at'], timeout=idle_timeout)
+            merged[cache_key] = entry['last_seen']
+        # Only keys are listed, a key lost by a concurrent update is listed again at the next merge
+        index = cache.get(self.index_key) or {}
+        index.update(merged)
+        # Forget calls nobody asked for recently, they would be warmed for nothing
+        index = {k: last_seen for k, last_seen in index.items() if last_seen >= now - idle_timeout}
+        cache.set(self.index_key, index, timeout=idle_timeout)
+
+    @staticmethod
+    def incr(key: str, delta: int, timeout: int):
+        """
+        Atomically add to a shared counter, created if missing
+        """
+        cache.add(key, 0, timeout=timeout)
+        try:
+            cache.incr(key, delta)
+        except ValueError:  # expired in between
+            cache.add(key, delta, timeout=timeout)
+        cache.touch(key, timeout=timeout)
+
+    def hottest(self, top: int) -> [tuple]:
+        """
+        Most requested calls whose access token has not expired
+        :param top: number of calls to return
+        :return: list of (cache key, entry) sorted by decreasing hits
+        """
+        cache_keys = list(cache.get(self.index_key) or {})
+        entries = cache.get_many([self.entry_key(kind, k) for k in cache_keys for kind in ('call', 'hits', 'cached_at')])
+        hottest = [
+            (cache_key, {
+                'call': entries[self.entry_key('call', cache_key)],
+                'hits': entries.get(self.entry_key('hits', cache_key), 0),
+                'cached_at': entries.get(self.entry_key('cached_at', cache_key), 0),
+            })
+            for cache_key in cache_keys if self.entry_key('call', cache_key) in entries
+        ]
+        return sorted(hottest, key=lambda item: item[1]['hits'], reverse=True)[:top]
+
+    def refreshed(self, cache_keys: [str], forgotten: [str] = None):
+        """
+        Update the registry after warming
+        :param cache_keys: keys refreshed now
+        :param forgotten: keys to remove, e.g. calls with an expired token
+        """
+        now = time.time()
+        idle_timeout = getattr(settings, 'KAIRNIAL_WARMING_IDLE_TIMEOUT', 600)
+        cache.set_many({self.entry_key('cached_at', k): now for k in cache_keys}, timeout=idle_timeout)
+        cache.delete_many([self.entry_key(kind, k) for k in forgotten or [] for kind in ('call', 'hits', 'cached_at')])
+
+
+hot_calls = HotCallRegistry()
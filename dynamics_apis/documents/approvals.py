@@ -0,0 +1,74 @@
+"""
+Index of the approvals (visas) of Kairnial documents
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from dynamics_apis.common.models import LazyList
+
+
+class ApprovalIndex:
+    """
+    Approvals indexed by document and by approval ID
+    The response is kept as is, the approval ID index is only built when an approval is looked up.
+    The document of each looked up approval is remembered for the project, so that a single
+    approval is later fetched with the approvals of its document only.
+    """
+
+    def __init__(self, visas: dict = None):
+        """
+        :param visas: getFilesHeaderAndVisas visas, dict of document ID: list of approvals
+        """
+        # PHP serializes an empty dict as a list
+        self.documents = visas if isinstance(visas, dict) else {}  # document ID: [approvals]
+        self._approvals = None
+
+    @staticmethod
+    def cache_key(client_id: str, project_id: str) -> str:
+        return f'approval_documents:{client_id}:{project_id}'
+
+    @property
+    def approvals(self) -> dict:
+        """
+        Approval ID: approval, built on first access
+        """
+        if self._approvals is None:
+            self._approvals = {
+                int(approval.get('fv_id')): approval
+                for approvals in self.documents.values() for approval in approvals or []
+            }
+        return self._approvals
+
+    def list(self) -> LazyList:
+        """
+        All approvals, grouped by document
+        """
+        return LazyList(*self.documents.values())
+
+    def get(self, approval_id: int):
+        return self.approvals.get(int(approval_id))
+
+    def for_document(self, document_id: int) -> []:
+        return self.documents.get(str(document_id)) or self.documents.get(int(document_id)) or []
+
+    @classmethod
+    def document_of(cls, client_id: str, project_id: str, approval_id: int):
+        """
+        Document ID of a known approval, None if not indexed yet
+        """
+        return (cache.get(cls.cache_key(client_id, project_id)) or {}).get(int(approval_id))
+
+    def save(self, client_id: str, project_id: str):
+        """
+        Remember the document of each approval of the index
+        """
+        if not self.approvals:
+            return
+        key = self.cache_key(client_id, project_id)
+        locations = cache.get(key) or {}
+        locations.update({
+            int(approval.get('fv_id')): int(document_id)
+            for document_id, approvals in self.documents.items()
+            for approval in approvals or []
+        })
+        cache.set(key, locations, timeout=getattr(settings, 'KAIRNIAL_APPROVAL_INDEX_TIMEOUT', 3600))
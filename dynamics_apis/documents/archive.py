@@ -0,0 +1,140 @@
+"""
+Streaming ZIP archives of Kairnial folders
+"""
+import contextvars
+import logging
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+
+from dynamics_apis.common.services import KairnialWSServiceError
+
+CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class ZipSink:
+    """
+    Write-only file receiving the archive, emptied each time the archive is drained
+    """
+
+    def __init__(self):
+        self.chunks = deque()
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        while self.chunks:
+            yield self.chunks.popleft()
+
+
+def safe_name(name: str) -> str:
+    """
+    File or folder name usable as one segment of a path in the archive
+    """
+    name = name.replace('/', '_').replace('\\', '_')
+    return '_' if name in ('', '.', '..') else name
+
+
+def entry_name(document: dict) -> str:
+    """
+    Name of a document in the archive
+    """
+    name = document.get('entete_nom') or document.get('entete_oldName') or str(document.get('item_id'))
+    extension = document.get('entete_ext')
+    if extension and not name.lower().endswith(f'.{extension.lower()}'):
+        name = f'{name}.{extension}'
+    return safe_name(name)
+
+
+def unique_name(name: str, used: set) -> str:
+    """
+    Suffix a name already present in the archive with a counter
+    """
+    folder, slash, base = name.rpartition('/')
+    stem, dot, extension = base.rpartition('.')
+    candidate, counter = name, 1
+    while candidate in used:
+        counter += 1
+        base = f'{stem} ({counter}).{extension}' if dot else f'{extension} ({counter})'
+        candidate = folder + slash + base
+    used.add(candidate)
+    return candidate
+
+
+def stream_archive(entries, open_content, window: int = None):
+    """
+    Stream a ZIP archive of documents, as bytes chunks
+    Contents of the next documents are opened concurrently while the current one is written,
+    the archive is sent as soon as each block is written so memory does not grow with its size.
+    Documents that cannot be read are listed in errors.txt at the end of the archive,
+    KairnialWSServiceError is raised before anything is sent if no document can be read.
+    :param entries: iterable of (path in the archive, document)
+    :param open_content: callable(document) returning a streamed requests response
+    :param window: number of contents opened ahead, defaults to KAIRNIAL_ARCHIVE_WINDOW
+    """
+    window = max(1, window or getattr(settings, 'KAIRNIAL_ARCHIVE_WINDOW', 4))
+    context = contextvars.copy_context()
+    entries = iter(entries)
+    sink = ZipSink()
+    pending = deque()
+    errors = []
+    archived = 0
+    used = set()
+    # contents are mostly compressed formats (PDF, DWG, images), they are stored as is
+    archive = zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED)
+    executor = ThreadPoolExecutor(max_workers=window)
+
+    def submit(entries_slice):
+        for path, document in entries_slice:
+            pending.append((path, executor.submit(lambda d: context.copy().run(open_content, d), document)))
+
+    try:
+        submit(islice(entries, window))
+        while pending:
+            path, future = pending.popleft()
+            submit(islice(entries, 1))
+            try:
+                response = future.result()
+            except Exception as e:
+                logger.warning('Document %s not archived: %s', path, e)
+                errors.append(f'{path}: {e}')
+                if not archived and not pending:
+                    # nothing was sent yet, the request fails instead of returning errors.txt alone
+                    raise KairnialWSServiceError(
+                        message='\n'.join(errors),
+                        status=getattr(e, 'status', 0)
+                    ) from e
+                continue
+            archived += 1
+            try:
+                with archive.open(unique_name(path, used), mode='w', force_zip64=True) as entry:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        entry.write(chunk)
+                        yield from sink.drain()
+            finally:
+                response.close()
+            yield from sink.drain()
+        if errors:
+            archive.writestr('errors.txt', '\n'.join(errors))
+        archive.close()
+        yield from sink.drain()
+    finally:
+        # client gone or failure, release the contents opened ahead
+        for path, future in pending:
+            future.add_done_callback(lambda f: f.exception() is None and f.result().close())
+        executor.shutdown(wait=False)
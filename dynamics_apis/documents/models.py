@@ -1,15 +1,22 @@
 """
 Kairnial Files module models
 """
-import hashlib
 import json
 import os
 
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 
-from dynamics_apis.common.models import PaginatedModel
+from dynamics_apis.common.models import PaginatedModel, LazyList
+from dynamics_apis.common.services import KairnialWSServiceError
+from dynamics_apis.common.sync import SyncSession
+from dynamics_apis.documents.approvals import ApprovalIndex
+from dynamics_apis.documents.archive import stream_archive, entry_name, safe_name
 from dynamics_apis.documents.services import KairnialFolderService, KairnialDocumentService, \
     KairnialApprovalTypeService, KairnialApprovalService
+from dynamics_apis.documents.serializers.folders import FolderCreateSerializer
+from dynamics_apis.documents.tree import FolderTree, PathIndex, ROOT
+from dynamics_apis.documents.uploads import UploadIndex, file_md5
 
 
 class Folder(PaginatedModel):
@@ -34,7 +41,8 @@ class Folder(PaginatedModel):
         :return:
         """
         kf = KairnialFolderService(client_id=client_id, token=token, project_id=project_id)
-        return kf.list(parent_id=parent_id, filters=filters).get('brut')
+        # Root folders are requested by every client opening the project
+        return kf.list(parent_id=parent_id, filters=filters, use_cache=not parent_id).get('brut')
 
     @staticmethod
     def get(
@@ -69,7 +77,15 @@ class Folder(PaginatedModel):
         :return: FolderSerializer data
         """
         fs = KairnialFolderService(client_id=client_id, token=token, project_id=project_id)
-        return fs.create(folder_create_serializer=serialized_data)
+        parent_id = int(serialized_data.get('parentId') or ROOT)
+        folder = fs.create(folder_create_serializer=serialized_data)
+        tree = FolderTree.load(client_id=client_id, token=token, project_id=project_id)
+        if isinstance(folder, dict) and folder.get('fcat_id') and tree.is_loaded(parent_id):
+            tree.add(parent_id=parent_id, folder=folder)
+        else:
+            tree.invalidate(parent_id)
+        tree.save(client_id=client_id, token=token, project_id=project_id)
+        return folder
 
     @staticmethod
     def update(
@@ -88,7 +104,15 @@ class Folder(PaginatedModel):
         :param serialized_data: FolderUpdateSerializer validated data
         """
         fs = KairnialFolderService(client_id=client_id, token=token, project_id=project_id)
-        return fs.update(id=id, folder_update_serializer=serialized_data)
+        updated = fs.update(id=id, folder_update_serializer=serialized_data)
+        tree = FolderTree.load(client_id=client_id, token=token, project_id=project_id)
+        parent_id = tree.parents.get(int(id))
+        if parent_id is not None:
+            # Siblings are fetched again on next access to get the new name
+            tree.invalidate(parent_id)
+            tree.save(client_id=client_id, token=token, project_id=project_id)
+        PathIndex.clear(client_id=client_id, token=token, project_id=project_id)
+        return updated
 
     @staticmethod
     def archive(
@@ -105,7 +129,159 @@ class Folder(PaginatedModel):
         :param id: Universal ID of the folder
         """
         fs = KairnialFolderService(client_id=client_id, token=token, project_id=project_id)
-        return fs.archive(id=id)
+        archived = fs.archive(id=id)
+        tree = FolderTree.load(client_id=client_id, token=token, project_id=project_id)
+        folder_id = tree.uuids.get(str(id))
+        if folder_id is not None:
+            tree.remove(folder_id)
+            tree.save(client_id=client_id, token=token, project_id=project_id)
+        PathIndex.clear(client_id=client_id, token=token, project_id=project_id)
+        return archived
+
+    @staticmethod
+    def tree(
+            client_id: str,
+            token: str,
+            project_id: str,
+            root_id: int = ROOT,
+            depth: int = None
+    ):
+        """
+        Get a folder subtree as nested folders
+        :param client_id: ID of the client
+        :param token: Access token
+        :param project_id: RGOC Code of the project
+        :param root_id: Numeric ID of the subtree root, 0 for the whole project
+        :param depth: Number of levels to return, all levels if None
+        """
+        kf = KairnialFolderService(client_id=client_id, token=token, project_id=project_id)
+        tree = FolderTree.load(client_id=client_id, token=token, project_id=project_id)
+        tree.expand(service=kf, root_id=root_id, depth=depth)
+        tree.save(client_id=client_id, token=token, project_id=project_id)
+        return tree.nested(root_id=root_id, depth=depth)
+
+    @staticmethod
+    def get_by_path(
+            client_id: str,
+            token: str,
+            project_id: str,
+            path: str
+    ):
+        """
+        Get Folder by path
+        :param client_id: ID of the client
+        :param token: Access token
+        :param project_id: RGOC Code of the project
+        :param path: Folder names from the project root, separated with /
+        :return: folder or None
+        """
+        kf = KairnialFolderService(client_id=client_id, token=token, project_id=project_id)
+        tree = FolderTree.load(client_id=client_id, token=token, project_id=project_id)
+        folder_id = tree.resolve(service=kf, path=path)
+        tree.save(client_id=client_id, token=token, project_id=project_id)
+        if folder_id is None or folder_id == ROOT:
+            return None
+        return tree.folders[folder_id]
+
+    @staticmethod
+    def documents(
+            client_id: str,
+            token: str,
+            project_id: str,
+            id: int,
+            recursive: bool = False
+    ):
+        """
+        Iterate over the documents of a folder, page by page
+        :param client_id: ID of the client
+        :param token: Access token
+        :param project_id: RGOC Code of the project
+        :param id: Numeric ID of the folder
+        :param recursive: Include the documents of subfolders
+        :return: iterator of (path relative to the folder, document)
+        """
+        kf = KairnialFolderService(client_id=client_id, token=token, project_id=project_id)
+        kd = KairnialDocumentService(client_id=client_id, token=token, project_id=project_id)
+        folders = [(int(id), '')]
+        if recursive:
+            tree = FolderTree.load(client_id=client_id, token=token, project_id=project_id)
+            tree.expand(service=kf, root_id=int(id))
+            tree.save(client_id=client_id, token=token, project_id=project_id)
+            depth = len(tree.names_of(int(id)))
+            folders += [
+                (folder_id, ''.join(safe_name(name) + '/' for name in tree.names_of(folder_id)[depth:]))
+                for folder_id in tree.descendants(int(id))
+            ]
+        page_size = getattr(settings, 'PAGE_SIZE', 100)
+        for folder_id, folder_path in folders:
+            offset = 0
+            while True:
+                page = kd.list(filters={'id': folder_id}, offset=offset, limit=page_size).get('fichiers') or []
+                for document in page:
+                    yield folder_path + entry_name(document), document
+                if len(page) < page_size:
+                    break
+                offset += page_size
+
+    @classmethod
+    def download(
+            cls,
+            client_id: str,
+            token: str,
+            project_id: str,
+            id: int,
+            recursive: bool = False
+    ):
+        """
+        Stream a ZIP archive of the documents of a folder
+        :param client_id: ID of the client
+        :param token: Access token
+        :param project_id: RGOC Code of the project
+        :param id: Numeric ID of the folder
+        :param recursive: Include subfolders
+        :return: iterator of bytes
+        """
+        kd = KairnialDocumentService(client_id=client_id, token=token, project_id=project_id)
+        return stream_archive(
+            entries=cls.documents(client_id=client_id, token=token, project_id=project_id, id=id,
+                                  recursive=recursive),
+            open_content=lambda document: kd.download(id=document.get('item_id'))
+        )
+
+    @staticmethod
+    def resolve_paths(
+            client_id: str,
+            token: str,
+            project_id: str,
+            paths: [str],
+            create: bool = True
+    ) -> dict:
+        """
+        Get the folder IDs of many paths, creating missing folders
+        Resolved paths are kept for the user, so that documents imported in the same
+        folders do not resolve their path again.
+        :param client_id: ID of the client
+        :param token: Access token
+        :param project_id: RGOC Code of the project
+        :param paths: Folder names from the project root, separated with /
+        :param create: Create missing folders
+        :return: dict of path: folder ID, None if the path does not exist
+        """
+        index = PathIndex.load(client_id=client_id, token=token, project_id=project_id)
+        missing = [path for path in set(paths) if index.get(path) is None]
+        if missing:
+            kf = KairnialFolderService(client_id=client_id, token=token, project_id=project_id)
+
+            def create_folder(parent_id: int, name: str):
+                fcs = FolderCreateSerializer(data={'parent_id': parent_id, 'name': name, 'infos': {}})
+                fcs.is_valid(raise_exception=True)
+                return kf.create(folder_create_serializer=dict(fcs.validated_data))
+
+            tree = FolderTree.load(client_id=client_id, token=token, project_id=project_id)
+            index.update(tree.ensure(service=kf, paths=missing, create=create_folder if create else None))
+            tree.save(client_id=client_id, token=token, project_id=project_id)
+            index.save(client_id=client_id, token=token, project_id=project_id)
+        return {path: index.get(path) for path in paths}
 
 
 class Document(PaginatedModel):
@@ -149,37 +325,87 @@ class Document(PaginatedModel):
         kf = KairnialDocumentService(client_id=client_id, token=token, project_id=project_id)
         return kf.get(id=id)
 
+    @staticmethod
+    def sync(
+            client_id: str,
+            token: str,
+            project_id: str,
+            sync_token: str = None,
+            folder_id: int = None,
+            limit: int = 100
+    ):
+        """
+        Read changes on documents since a sync token
+        :param client_id: ID of the client
+        :param token: Access token
+        :param project_id: RGOC Code of the project
+        :param sync_token: token returned by the previous sync, None for a full sync
+        :param folder_id: Numeric ID of the synchronized folder, all folders if None
+        :param limit: maximum number of changes to return
+        :return: list of (change type, document), next sync token, more changes to read
+        :raise InvalidSyncToken:
+        """
+        kf = KairnialDocumentService(client_id=client_id, token=token, project_id=project_id)
+        session = SyncSession.from_token(
+            token=sync_token,
+            scope=SyncSession.make_scope(client_id, project_id, 'documents', folder_id or '')
+        )
+        scope_filters = {'id': folder_id} if folder_id else {}
+
+        def fetch(**filters):
+            return lambda offset, take: kf.list(
+                filters=dict(scope_filters, **filters), offset=offset, limit=take
+            ).get('fichiers')
+
+        since = session.window_start()
+        if since is None:
+            phases = [('created', fetch())]
+        else:
+            phases = [
+                ('created', fetch(creation_start=since)),
+                ('updated', fetch(modification_start=since)),
+                ('revised', fetch(files_update=since)),
+                ('archived', fetch(only_archive=2, modification_start=since)),
+            ]
+        changes, next_session, has_more = session.run(phases=phases, limit=limit)
+        return changes, next_session.to_token(), has_more
+
     @classmethod
-    def extract_attachment_data(cls, attachment: InMemoryUploadedFile):
+    def extract_attachment_data(cls, attachment: UploadedFile):
         """
-        Read attributes from InMemoryUploadFile object
+        Read attributes from UploadedFile object
+        The content is not read in memory, it is the uploaded file itself, ready to be streamed.
         """
         name = os.path.splitext(attachment.name)[0]
         extension = os.path.splitext(attachment.name)[-1][1:]
         file_type = attachment.content_type
         file_handler = attachment.file
-        file_content = attachment.read()
-        file_hash = hashlib.md5(file_content).hexdigest()
+        file_hash = file_md5(attachment)
         file_size = attachment.size
-        print(name, extension, file_type, file_handler, file_hash, file_size)
-        return name, extension, file_type, file_handler, file_hash, file_size, file_content
+        attachment.seek(0)
+        return name, extension, file_type, file_handler, file_hash, file_size, attachment
 
     @classmethod
-    def create(
+    def store(
             cls,
+            action: str,
             client_id: str,
             token: str,
             project_id: str,
             serialized_data: dict,
-            attachment
+            attachment,
+            idempotency_key: str = None
     ):
         """
-        Create a Kairnial Document
+        Create or revise a Kairnial Document, without uploading known contents again
+        A retried request with the same idempotency key returns the document created by the first one.
+        :param action: create or revise
         :param client_id: ID of the client
         :param token: Access token
         :param project_id: RGOC Code of the project
         :param serialized_data: DocumentCreateSerializer validated data
         :param attachment: File field
+        :param idempotency_key: key sent by the client with each attempt of the request, optional
         :return: DocumentSerializer data
         """
         name, extension, \
@@ -196,8 +422,69 @@ class Document(PaginatedModel):
         serialized_data['hash'] = file_hash
         serialized_data['size'] = file_size
         serialized_data['typeFichier'] = file_type
+        if serialized_data.get('path'):
+            # the folder is resolved here, where paths are cached
+            path = serialized_data.pop('path')
+            folder_id = Folder.resolve_paths(
+                client_id=client_id,
+                token=token,
+                project_id=project_id,
+                paths=[path],
+                create=serialized_data.pop('createFolders', True)
+            )[path]
+            if folder_id is None:
+                raise KairnialWSServiceError(message=f'Folder {path} does not exist', status=404)
+            serialized_data['category'] = folder_id
+        index = UploadIndex(client_id=client_id, token=token, project_id=project_id)
+        fingerprint = None
+        if idempotency_key:
+            fingerprint = index.fingerprint(action=action, serialized_data=serialized_data,
+                                            idempotency_key=idempotency_key)
+            document = index.document(fingerprint)
+            if document is not None:
+                return document
         fs = KairnialDocumentService(client_id=client_id, token=token, project_id=project_id)
-        return fs.create(document_create_serializer=serialized_data, content=file_content)
+        file_uuid = index.blob(file_hash=file_hash, file_size=file_size)
+        if file_uuid is None:
+            file_uuid = fs.upload(json_data=serialized_data, content=file_content)
+            index.save_blob(file_hash=file_hash, file_size=file_size, file_uuid=file_uuid)
+        if action == 'revise':
+            document = fs.revise(document_revise_serializer=serialized_data, file_uuid=file_uuid)
+        else:
+            document = fs.create(document_create_serializer=serialized_data, file_uuid=file_uuid)
+        if document and fingerprint:
+            index.save_document(fingerprint, document)
+        return document
+
+    @classmethod
+    def create(
+            cls,
+            client_id: str,
+            token: str,
+            project_id: str,
+            serialized_data: dict,
+            attachment,
+            idempotency_key: str = None
+    ):
+        """
+        Create a Kairnial Document
+        :param client_id: ID of the client
+        :param token: Access token
+        :param project_id: RGOC Code of the project
+        :param serialized_data: DocumentCreateSerializer validated data
+        :param attachment: File field
+        :param idempotency_key: key sent by the client with each attempt of the request, optional
+        :return: DocumentSerializer data
+        """
+        return cls.store(
+            action='create',
+            client_id=client_id,
+            token=token,
+            project_id=project_id,
+            serialized_data=serialized_data,
+            attachment=attachment,
+            idempotency_key=idempotency_key
+        )
 
     @classmethod
     def update(
@@ -206,7 +493,8 @@ class Document(PaginatedModel):
             token: str,
             project_id: str,
             serialized_data: dict,
-            attachment
+            attachment,
+            idempotency_key: str = None
     ):
         """
         Revise a Kairnial Document
@@ -215,24 +503,18 @@ class Document(PaginatedModel):
         :param project_id: RGOC Code of the project
         :param serialized_data: DocumentCreateSerializer validated data
         :param attachment: File field
+        :param idempotency_key: key sent by the client with each attempt of the request, optional
         :return: DocumentSerializer data
         """
-        name, extension, \
-        file_type, \
-        file_handler, \
-        file_hash, \
-        file_size, \
-        file_content = cls.extract_attachment_data(
-            attachment=attachment
+        return cls.store(
+            action='revise',
+            client_id=client_id,
+            token=token,
+            project_id=project_id,
+            serialized_data=serialized_data,
+            attachment=attachment,
+            idempotency_key=idempotency_key
         )
-        if 'nom' not in serialized_data:
-            serialized_data['nom'] = name
-        serialized_data['ext'] = extension
-        serialized_data['hash'] = file_hash
-        serialized_data['size'] = file_size
-        serialized_data['typeFichier'] = file_type
-        fs = KairnialDocumentService(client_id=client_id, token=token, project_id=project_id)
-        return fs.revise(document_create_serializer=serialized_data, content=file_content)
 
     @staticmethod
     def archive(
@@ -268,10 +550,17 @@ class ApprovalType(PaginatedModel):
         :return:
         """
         kat = KairnialApprovalTypeService(client_id=client_id, token=token, project_id=project_id)
-        approval_types = kat.list().get('notes')
-        for at in approval_types:
-            at['content'] = json.loads(at.get('content') or '{}')
-        return  approval_types
+        return LazyList(kat.list().get('notes'), transform=ApprovalType.parse)
+
+    @staticmethod
+    def parse(approval_type: dict) -> dict:
+        """
+        Decode the JSON configuration of an approval type
+        """
+        content = approval_type.get('content')
+        if isinstance(content, dict):
+            return approval_type
+        return dict(approval_type, content=json.loads(content or '{}'))
 
     @staticmethod
     def archive(
@@ -297,23 +586,78 @@ class Approval(PaginatedModel):
     """
 
     @staticmethod
+    def index(
+            client_id: str,
+            token: str,
+            project_id: str,
+            filters: dict = None,
+            folder_id: int = None
+    ) -> ApprovalIndex:
+        """
+        Fetch the approvals of the selected documents and index them
+        :param client_id: ID of the client
+        :param token: Access token
+        :param project_id: RGOC Code of the project
+        :param filters: DocumentFilterSerializer validated data
+        :param folder_id: Numeric ID of the folder of the documents
+        """
+        ka = KairnialApprovalService(client_id=client_id, token=token, project_id=project_id)
+        return ApprovalIndex(ka.list(filters=filters, folder_id=folder_id).get('visas'))
+
+    @classmethod
     def list(
+            cls,
             client_id: str,
             token: str,
-            project_id: str
+            project_id: str,
+            filters: dict = None,
+            folder_id: int = None
     ):
         """
-        List document approval types
+        List approvals of the selected documents
         :param client_id: ID of the client
         :param token: Access token
         :param project_id: RGOC Code of the project
+        :param filters: DocumentFilterSerializer validated data
+        :param folder_id: Numeric ID of the folder of the documents
         :return:
         """
-        output = []
-        ka = KairnialApprovalService(client_id=client_id, token=token, project_id=project_id)
-        for fileid, list_of_approvals in ka.list().get('visas').items():
-            output.extend(list_of_approvals)
-        return output
+        return cls.index(
+            client_id=client_id,
+            token=token,
+            project_id=project_id,
+            filters=filters,
+            folder_id=folder_id
+        ).list()
+
+    @classmethod
+    def get(
+            cls,
+            client_id: str,
+            token: str,
+            project_id: str,
+            id: int,
+            document_id: int = None
+    ):
+        """
+        Get an approval by ID
+        Only the approvals of its document are fetched when the document is given or already indexed.
+        :param client_id: ID of the client
+        :param token: Access token
+        :param project_id: RGOC Code of the project
+        :param id: Numeric ID of the approval
+        :param document_id: Numeric ID of the document of the approval, optional
+        :return: approval or None
+        """
+        document_id = document_id or ApprovalIndex.document_of(client_id=client_id, project_id=project_id,
+                                                               approval_id=id)
+        filters = {'getSingleID': int(document_id)} if document_id else None
+        index = cls.index(client_id=client_id, token=token, project_id=project_id, filters=filters)
+        if index.get(id) is None and filters:
+            # stale document, look in all approvals
+            index = cls.index(client_id=client_id, token=token, project_id=project_id)
+        index.save(client_id=client_id, project_id=project_id)
+        return index.get(id)
 
     @staticmethod
     def update(
@@ -1,9 +1,12 @@
 """
 Serializers for documents
 """
+from django.conf import settings
 from django.utils.translation import gettext as _
 from rest_framework import serializers
 
+from dynamics_apis.common.serializers import ProjectionMixin
+
 
 class CustomFieldSerializer(serializers.Serializer):
     id = serializers.UUIDField(
@@ -324,7 +327,7 @@ class DocumentQuerySerializer(serializers.Serializer):
     )
 
 
-class DocumentSerializer(serializers.Serializer):
+class DocumentSerializer(ProjectionMixin, serializers.Serializer):
     """
     Base Document serializer
     """
@@ -622,6 +625,68 @@ class DocumentSerializer(serializers.Serializer):
     )
 
 
+class DocumentSyncQuerySerializer(serializers.Serializer):
+    """
+    Serializer for document delta sync parameters
+    """
+    sync_token = serializers.CharField(
+        label=_('Sync token'),
+        help_text=_('Token returned by the previous sync, empty to start a full sync'),
+        required=False,
+        allow_blank=True
+    )
+    folder_id = serializers.IntegerField(
+        label=_('ID of the folder'),
+        help_text=_('Only synchronize documents of this folder'),
+        required=False
+    )
+    page_limit = serializers.IntegerField(
+        label=_('Maximum number of changes'),
+        help_text=_('Maximum number of changes returned in one response'),
+        default=getattr(settings, 'PAGE_SIZE', 100),
+        min_value=1
+    )
+
+
+class DocumentChangeSerializer(serializers.Serializer):
+    """
+    Serializer for a document change
+    """
+    change = serializers.ChoiceField(
+        label=_('Type of change'),
+        help_text=_('created, updated, revised or archived'),
+        choices=['created', 'updated', 'revised', 'archived'],
+        read_only=True
+    )
+    document = DocumentSerializer(
+        label=_('Document'),
+        help_text=_('Document state after the change'),
+        read_only=True
+    )
+
+
+class DocumentSyncSerializer(serializers.Serializer):
+    """
+    Serializer for document delta sync
+    """
+    changes = DocumentChangeSerializer(
+        label=_('Changes'),
+        help_text=_('Changes since the sync token, delivered at least once'),
+        many=True,
+        read_only=True
+    )
+    sync_token = serializers.CharField(
+        label=_('Next sync token'),
+        help_text=_('Token to pass to the next sync'),
+        read_only=True
+    )
+    has_more = serializers.BooleanField(
+        label=_('More changes'),
+        help_text=_('Sync again immediately with the new token to read more changes'),
+        read_only=True
+    )
+
+
 class LinkedObjectSerializer(serializers.Serializer):
     """
     Serializer for linked objects
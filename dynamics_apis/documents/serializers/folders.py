@@ -4,6 +4,7 @@ Serializers for Kairnial Files module
 import json
 
 from django.utils.translation import gettext as _
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
 
@@ -54,6 +55,78 @@ class FolderQuerySerializer(serializers.Serializer):
     )
 
 
+class FolderTreeQuerySerializer(serializers.Serializer):
+    """
+    Serializer for folder tree query parameters
+    """
+    root_id = serializers.IntegerField(
+        label=_("root folder ID"),
+        help_text=_("numeric ID of the subtree root, 0 for the project root"),
+        required=False,
+        default=0,
+        min_value=0
+    )
+    depth = serializers.IntegerField(
+        label=_("tree depth"),
+        help_text=_("number of levels to retrieve, all levels if empty"),
+        required=False,
+        min_value=1
+    )
+
+
+class FolderPathQuerySerializer(serializers.Serializer):
+    """
+    Serializer for folder path lookup
+    """
+    path = serializers.CharField(
+        label=_("folder path"),
+        help_text=_("folder names from the project root, separated with /"),
+        required=True
+    )
+
+
+class FolderArchiveQuerySerializer(serializers.Serializer):
+    """
+    Serializer for folder archive query parameters
+    """
+    recursive = serializers.BooleanField(
+        label=_("Include subfolders"),
+        help_text=_("Archive the documents of subfolders too, in their folders"),
+        required=False,
+        default=False
+    )
+
+
+class FolderPathsSerializer(serializers.Serializer):
+    """
+    Serializer for batch folder path resolution
+    """
+    paths = serializers.ListField(
+        label=_("folder paths"),
+        help_text=_("folder names from the project root, separated with /"),
+        child=serializers.CharField(),
+        allow_empty=False
+    )
+    create_folders = serializers.BooleanField(
+        label=_("Create missing folders"),
+        help_text=_("Create the folders of the paths that do not exist"),
+        default=True
+    )
+
+
+class FolderPathResultSerializer(serializers.Serializer):
+    """
+    Serializer for a resolved folder path
+    """
+    path = serializers.CharField(label=_("folder path"), read_only=True)
+    id = serializers.IntegerField(
+        label=_("Folder ID"),
+        help_text=_("numeric ID of the folder, empty if the path does not exist"),
+        allow_null=True,
+        read_only=True
+    )
+
+
 class FolderInfoSerializer(serializers.Serializer):
     """
     Serializer for folder info
@@ -211,6 +284,19 @@ class FolderDetailSerializer(FolderSerializer):
         return None
 
 
+class FolderTreeSerializer(FolderSerializer):
+    """
+    Serializer for nested folders
+    """
+    children = serializers.SerializerMethodField(
+        label=_('subfolders'),
+    )
+
+    @extend_schema_field(serializers.ListField(child=serializers.DictField()))
+    def get_children(self, obj):
+        return FolderTreeSerializer(obj.get('children', []), many=True).data
+
+
 class FolderCreateSerializer(serializers.Serializer):
     type = serializers.ChoiceField(
         label=_('Folder type'),
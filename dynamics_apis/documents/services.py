@@ -24,10 +24,11 @@ class KairnialFolderService(KairnialWSService):
     """
     service_domain = 'fichiers'
 
-    def list(self, parent_id: str = None, filters: dict = None):
+    def list(self, parent_id: str = None, filters: dict = None, use_cache: bool = False):
         """
         List folders
         :param parent_id: ID of the parent folder, optional
+        :param use_cache: serve the list from cache
         :return:
         """
         parameters = []
@@ -35,7 +36,7 @@ class KairnialFolderService(KairnialWSService):
             parameters = [{key: value} for key, value in filters.items()]
         if parent_id:
             parameters.append({'asyncFolderId': parent_id})
-        return self.call(action='getFlexDossiers', parameters=parameters)
+        return self.call(action='getFlexDossiers', parameters=parameters, use_cache=use_cache)
 
     def get(self, id: int):
         """
@@ -170,6 +171,7 @@ class KairnialDocumentService(KairnialWSService):
                 message=output.get('error'),
                 status=output.get('errorCode')
             )
+        return output
 
     def get(self, id: int):
         """
@@ -179,50 +181,84 @@ class KairnialDocumentService(KairnialWSService):
         """
         return self.call(action='getFilesFromCat', parameters=[{'id': id}])
 
-    def create(self, document_create_serializer: dict, content):
+    def download(self, id: int):
         """
-        Create a Kairnial folder
-        :param document_create_serializer: validated data from a DocumentCreateSerializer
-        :param content: Binary file content
+        Open the content of a document for streaming
+        :param id: Numeric ID of the document
+        :return: requests response, its body is not read yet
+        """
+        link = self.call(
+            action=getattr(settings, 'KAIRNIAL_DOWNLOAD_ACTION', 'prepareFileDownload'),
+            parameters=[{'id': id}],
+            use_cache=False
+        )
+        url = link.get('url') if isinstance(link, dict) else None
+        if not url:
+            raise KairnialWSServiceError(
+                message='No download link for document',
+                status=0
+            )
+        response = requests.get(url, stream=True, timeout=getattr(settings, 'KAIRNIAL_DOWNLOAD_TIMEOUT', 60))
+        if not response.ok:
+            response.close()
+            raise KairnialWSServiceError(
+                message='File download failed',
+                status=response.status_code
+            )
+        return response
+
+    def upload(self, json_data: dict, content) -> str:
+        """
+        Push a file content to storage
+        :param json_data: validated data from a DocumentCreateSerializer
+        :param content: Binary file content or file object, file objects are streamed
+        :return: UUID of the uploaded file
         """
         # 1. Get file link
-        us = self._get_file_link(json_data=document_create_serializer)
+        us = self._get_file_link(json_data=json_data)
 
         # 2. Post file to url
         response = REQUESTS_METHODS[us.validated_data.get('method').lower()](
             us.validated_data.get('url'),
             data=content,
         )
+        if not response.ok:
+            raise KairnialWSServiceError(
+                message='File upload failed',
+                status=response.status_code
+            )
+        return str(us.validated_data.get('uuid'))
+
+    def create(self, document_create_serializer: dict, content=None, file_uuid: str = None):
+        """
+        Create a Kairnial document
+        :param document_create_serializer: validated data from a DocumentCreateSerializer
+        :param content: Binary file content
+        :param file_uuid: UUID of an already uploaded file with the same content, replaces content
+        """
+        file_uuid = file_uuid or self.upload(json_data=document_create_serializer, content=content)
 
         # 3. Create Document with file
-        output = self._create_document(
-            uuid=us.validated_data.get('uuid'),
+        return self._create_document(
+            uuid=file_uuid,
             json_data=document_create_serializer
         )
 
-    def revise(self, document_revise_serializer: dict, content):
+    def revise(self, document_revise_serializer: dict, content=None, file_uuid: str = None):
         """
-        Create a Kairnial folder
+        Revise a Kairnial document
         :param document_revise_serializer: validated data from a DocumentReviseSerializer
         :param content: Binary file content
+        :param file_uuid: UUID of an already uploaded file with the same content, replaces content
         """
-        # 1. Get file link
-        us = self._get_file_link(json_data=document_revise_serializer)
-
-        # 2. Post file to url
-        response = REQUESTS_METHODS[us.validated_data.get('method').lower()](
-            us.validated_data.get('url'),
-            data=content,
-        )
+        file_uuid = file_uuid or self.upload(json_data=document_revise_serializer, content=content)
 
         # 3. Create Document with file
-        output = self._create_document(
-            uuid=us.validated_data.get('uuid'),
+        return self._create_document(
+            uuid=file_uuid,
             json_data=document_revise_serializer
         )
 
-        return output
-
     def archive(self, id: int):
         """
         Archive a Kairnial document
@@ -268,18 +304,18 @@ class KairnialApprovalService(KairnialWSService):
     """
     service_domain = 'fichiers'
 
-    def list(self):
+    def list(self, filters: dict = None, folder_id: int = None):
         """
         List approvals for a set of documents
-        :param document_ids: List of Numeric document IDs
+        :param filters: DocumentFilterSerializer validated data, selects the documents
+        :param folder_id: Numeric ID of the folder of the documents, optional
         """
-        parameters = [
-            {
-            },
-        ]
+        document_filters = dict(filters or {})
+        if folder_id:
+            document_filters['id'] = folder_id
         return self.call(
             action='getFilesHeaderAndVisas',
-            parameters=parameters,
+            parameters=[document_filters],
             use_cache=True
         )
 
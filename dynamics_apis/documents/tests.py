@@ -0,0 +1,251 @@
+"""
+Test document and folder models
+"""
+import hashlib
+import io
+import os
+import tracemalloc
+import zipfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from rest_framework.parsers import MultiPartParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from dynamics_apis.common.services import KairnialWSServiceError
+from . import services as document_services
+from .approvals import ApprovalIndex
+from .archive import stream_archive
+from .models import Approval, Document, Folder
+from .services import KairnialApprovalService, KairnialDocumentService, KairnialFolderService
+from .tree import FolderTree
+from .uploads import hash_uploads, uploaded_file
+
+
+class FolderTreeTest(SimpleTestCase):
+    """
+    Test the materialized folder tree
+    """
+
+    def setUp(self) -> None:
+        # 0 -> 1 (a) -> 3 (c), 4 (d, empty) ; 0 -> 2 (b, empty)
+        self.levels = {
+            None: [{'fcat_id': '1', 'fcat_nom': 'a'}, {'fcat_id': '2', 'fcat_nom': 'b', 'nbsubfolders': 0}],
+            1: [{'fcat_id': '3', 'fcat_nom': 'c'}, {'fcat_id': '4', 'fcat_nom': 'd', 'nbsubfolders': '0'}],
+            3: [],
+        }
+        self.service = mock.Mock()
+        self.service.list.side_effect = lambda parent_id: {'brut': self.levels[parent_id]}
+
+    def test_100_levels_are_fetched_once(self):
+        tree = FolderTree()
+        tree.expand(service=self.service)
+        # empty folders are not fetched
+        self.assertEqual([c.kwargs['parent_id'] for c in self.service.list.call_args_list], [None, 1, 3])
+        tree.expand(service=self.service)
+        self.assertEqual(self.service.list.call_count, 3)
+
+    def test_101_depth_limits_fetched_levels(self):
+        tree = FolderTree()
+        tree.expand(service=self.service, depth=1)
+        self.assertEqual(self.service.list.call_count, 1)
+        self.assertFalse(tree.is_loaded(1))
+        self.assertTrue(tree.is_loaded(2))
+
+    def test_102_descendants_and_paths(self):
+        tree = FolderTree()
+        tree.expand(service=self.service)
+        self.assertEqual(tree.descendants(0), [1, 3, 4, 2])
+        self.assertEqual(tree.descendants(1), [3, 4])
+        self.assertEqual(tree.path_of(4), '/a/d')
+        self.assertEqual(tree.path_of(0), '/')
+        tree.remove(1)
+        self.assertEqual(tree.descendants(0), [2])
+        self.assertEqual(tree.path_of(3), '/')
+
+
+class FolderPathTest(SimpleTestCase):
+    """
+    Test creation of folder paths
+    """
+
+    def test_100_shared_segments_are_created_once(self):
+        created = []
+
+        def create(parent_id, name):
+            created.append((parent_id, name))
+            return {'fcat_id': ord(name), 'fcat_nom': name}
+
+        service = mock.Mock()
+        service.list.return_value = {'brut': []}
+        found = FolderTree().ensure(service=service, paths=['a/b/c', 'a/b/d', '/a/e/'], create=create)
+        a, b = ord('a'), ord('b')
+        self.assertEqual(sorted(created), [(0, 'a'), (a, 'b'), (a, 'e'), (b, 'c'), (b, 'd')])
+        self.assertEqual(found, {'a/b/c': ord('c'), 'a/b/d': ord('d'), '/a/e/': ord('e')})
+        self.assertEqual(service.list.call_count, 1)  # new folders are known to be empty
+
+    def test_101_resolved_paths_are_kept_per_user(self):
+        def list_folders(parent_id=None):
+            return {'brut': [{'fcat_id': '7', 'fcat_nom': 'plans'}] if parent_id is None else []}
+
+        with mock.patch.object(KairnialFolderService, 'list', side_effect=list_folders) as list_call:
+            for token in ['user', 'user', 'other user']:
+                found = Folder.resolve_paths(client_id='c', token=token, project_id='test_101',
+                                             paths=['/plans'], create=False)
+                self.assertEqual(found, {'/plans': 7})
+            self.assertEqual(list_call.call_count, 2)
+            # a rename by the user forgets the paths it resolved
+            with mock.patch.object(KairnialFolderService, 'update', return_value=True):
+                Folder.update(client_id='c', token='user', project_id='test_101', id=7, serialized_data={})
+            Folder.resolve_paths(client_id='c', token='user', project_id='test_101', paths=['/plans'], create=False)
+            self.assertEqual(list_call.call_count, 3)
+
+
+class ApprovalTest(SimpleTestCase):
+    """
+    Test index and lookup of document approvals
+    """
+    visas = {'10': [{'fv_id': '1'}, {'fv_id': '2'}], '20': [{'fv_id': '3'}]}
+
+    def test_100_approvals_are_indexed_by_document_and_id(self):
+        index = ApprovalIndex(self.visas)
+        self.assertEqual(list(index.list()), [{'fv_id': '1'}, {'fv_id': '2'}, {'fv_id': '3'}])
+        self.assertEqual(index.get('3'), {'fv_id': '3'})
+        self.assertIsNone(index.get(4))
+        self.assertEqual(index.for_document(20), [{'fv_id': '3'}])
+        # PHP serializes an empty dict as a list
+        self.assertEqual(list(ApprovalIndex([]).list()), [])
+
+    def test_101_approvals_are_fetched_with_their_document(self):
+        fetched = []
+
+        def list_approvals(filters=None, folder_id=None):
+            fetched.append(filters)
+            if filters:
+                return {'visas': {str(filters['getSingleID']): self.visas.get(str(filters['getSingleID']), [])}}
+            return {'visas': self.visas}
+
+        with mock.patch.object(KairnialApprovalService, 'list', side_effect=list_approvals):
+            self.assertEqual(Approval.get(client_id='c', token='t', project_id='test_101', id=3), {'fv_id': '3'})
+            self.assertEqual(Approval.get(client_id='c', token='t', project_id='test_101', id=3), {'fv_id': '3'})
+            # approval moved to another document
+            self.assertEqual(
+                Approval.get(client_id='c', token='t', project_id='test_101', id=2, document_id=20), {'fv_id': '2'}
+            )
+        self.assertEqual(fetched, [None, {'getSingleID': 20}, {'getSingleID': 20}, None])
+
+
+class UploadIndexTest(SimpleTestCase):
+    """
+    Test deduplication of document uploads
+    """
+
+    def create(self, token, category, idempotency_key=None):
+        return Document.create(client_id='c', token=token, project_id='upload_test',
+                               serialized_data={'category': category},
+                               attachment=SimpleUploadedFile('plan.pdf', b'content', 'application/pdf'),
+                               idempotency_key=idempotency_key)
+
+    def test_100_retries_are_uploaded_once(self):
+        with mock.patch.object(KairnialDocumentService, 'upload', return_value='blob') as upload, \
+                mock.patch.object(KairnialDocumentService, 'create',
+                                  side_effect=lambda **kwargs: {'uuid': kwargs['file_uuid']}) as create_document:
+            for category, key in [(1, 'test_100_k1'), (2, 'test_100_k2'), (2, 'test_100_k2')]:
+                self.create('user', category, key)
+            self.assertEqual((upload.call_count, create_document.call_count), (2, 2))
+
+    @override_settings(KAIRNIAL_UPLOAD_SHARE_BLOBS=True)
+    def test_101_identical_contents_are_uploaded_once(self):
+        with mock.patch.object(KairnialDocumentService, 'upload', return_value='blob') as upload, \
+                mock.patch.object(KairnialDocumentService, 'create',
+                                  side_effect=lambda **kwargs: {'uuid': kwargs['file_uuid']}) as create_document:
+            # same content in two folders, then a retry
+            for category, key in [(1, 'test_101_k1'), (2, 'test_101_k2'), (2, 'test_101_k2')]:
+                self.create('user', category, key)
+            self.assertEqual((upload.call_count, create_document.call_count), (1, 2))
+            # a new request, e.g. after the document was archived
+            self.create('user', 2)
+            self.assertEqual((upload.call_count, create_document.call_count), (1, 3))
+            # contents and documents are not shared with other users
+            self.create('other user', 2, 'test_101_k2')
+            self.assertEqual((upload.call_count, create_document.call_count), (2, 4))
+
+    def test_200_contents_are_streamed_to_storage(self):
+        size = 8 * 1024 * 1024
+        attachment = SimpleUploadedFile('scan.pdf', os.urandom(size), 'application/pdf')
+        link = mock.Mock(validated_data={'method': 'PUT', 'url': 'https://storage', 'uuid': 'u'})
+
+        def put(url, data):
+            while data.read(64 * 1024):
+                pass
+            return mock.Mock(ok=True)
+
+        with mock.patch.dict(document_services.REQUESTS_METHODS, {'put': put}), \
+                mock.patch.object(KairnialDocumentService, '_get_file_link', return_value=link), \
+                mock.patch.object(KairnialDocumentService, '_create_document', return_value={}):
+            # tracemalloc traces Python allocations only, not the RSS of the process: a full size
+            # copy of the upload in a bytes object is caught, buffers of C extensions are not
+            tracemalloc.start()
+            Document.create(client_id='c', token='t', project_id='upload_test',
+                            serialized_data={}, attachment=attachment)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.assertLess(peak, size / 8)
+
+    def test_201_contents_are_hashed_while_received(self):
+        content = os.urandom(256 * 1024)
+        http_request = APIRequestFactory().post('/', {'file': SimpleUploadedFile('scan.pdf', content)})
+        request = Request(http_request, parsers=[MultiPartParser()])
+        hash_uploads(request)
+        self.assertIn('file', request.data)
+        hash_uploads(request)  # already parsed
+        self.assertEqual(uploaded_file(request).md5, hashlib.md5(content).hexdigest())
+
+
+class ArchiveTest(SimpleTestCase):
+    """
+    Test streaming of folder archives
+    """
+
+    def test_100_documents_are_streamed_in_order(self):
+        def open_content(document):
+            if document['item_id'] == 2:
+                raise KairnialWSServiceError(message='missing', status=404)
+            return mock.Mock(iter_content=lambda chunk_size: iter([b'a' * 10, b'b' * 10]))
+
+        entries = [('plan.pdf', {'item_id': 1}), ('lost.pdf', {'item_id': 2}), ('plan.pdf', {'item_id': 3})]
+        chunks = list(stream_archive(entries, open_content, window=2))
+        self.assertGreater(len(chunks), 3)  # sent while written
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        self.assertEqual(archive.namelist(), ['plan.pdf', 'plan (2).pdf', 'errors.txt'])
+        self.assertEqual(archive.read('plan (2).pdf'), b'a' * 10 + b'b' * 10)
+        self.assertEqual(archive.read('errors.txt'), b'lost.pdf: missing')
+
+    def test_101_nothing_is_sent_when_every_document_fails(self):
+        def open_content(document):
+            raise KairnialWSServiceError(message='forbidden', status=403)
+
+        with self.assertRaises(KairnialWSServiceError) as raised:
+            next(stream_archive([('a.pdf', {}), ('b.pdf', {})], open_content))
+        self.assertEqual(raised.exception.status, 403)
+        self.assertEqual(raised.exception.message, 'a.pdf: forbidden\nb.pdf: forbidden')
+
+    def test_102_folder_names_stay_inside_the_archive(self):
+        levels = {
+            None: [{'fcat_id': '1', 'fcat_nom': 'root'}],
+            1: [{'fcat_id': '2', 'fcat_nom': '..'}, {'fcat_id': '3', 'fcat_nom': 'a/b'}],
+            2: [], 3: [],
+        }
+        documents = {'fichiers': [{'entete_nom': 'plan.pdf'}]}
+
+        def list_folders(parent_id):
+            return {'brut': levels[parent_id]}
+
+        with mock.patch.object(KairnialFolderService, 'list', side_effect=list_folders), \
+                mock.patch.object(KairnialDocumentService, 'list', return_value=documents):
+            entries = Folder.documents(client_id='c', token='t', project_id='test_102', id=1, recursive=True)
+            paths = [path for path, document in entries]
+        self.assertEqual(paths, ['plan.pdf', '_/plan.pdf', 'a_b/plan.pdf'])
+
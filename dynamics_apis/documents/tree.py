@@ -0,0 +1,277 @@
+"""
+Materialized folder tree of a Kairnial project
+"""
+from hashlib import sha1
+
+from django.conf import settings
+from django.core.cache import cache
+
+from dynamics_apis.common.concurrency import concurrent_map
+from dynamics_apis.documents.services import KairnialFolderService
+
+ROOT = 0
+
+
+class FolderTree:
+    """
+    Adjacency structure of the project folders
+    Children are fetched level by level and kept indexed by parent and by name,
+    so that subtrees and path lookups are served from memory.
+    """
+
+    def __init__(self):
+        self.folders = {}  # folder ID: folder
+        self.children = {}  # parent ID: [folder IDs]
+        self.parents = {}  # folder ID: parent ID
+        self.names = {}  # parent ID: {folder name: folder ID}
+        self.uuids = {}  # folder UUID: folder ID
+
+    @staticmethod
+    def cache_key(client_id: str, token: str, project_id: str) -> str:
+        digest = sha1(f'{client_id}||{project_id}||{token}'.encode('utf8')).hexdigest()
+        return f'folder_tree:{digest}'
+
+    @classmethod
+    def load(cls, client_id: str, token: str, project_id: str):
+        """
+        Get the cached tree for the project, or an empty one
+        """
+        return cache.get(cls.cache_key(client_id, token, project_id)) or cls()
+
+    def save(self, client_id: str, token: str, project_id: str):
+        cache.set(
+            self.cache_key(client_id, token, project_id),
+            self,
+            timeout=getattr(settings, 'KAIRNIAL_FOLDER_TREE_TIMEOUT', 300)
+        )
+
+    @staticmethod
+    def folder_name(folder: dict) -> str:
+        return folder.get('fcat_originalName') or folder.get('fcat_nom') or ''
+
+    @staticmethod
+    def split_path(path: str) -> [str]:
+        return [segment.strip() for segment in (path or '').split('/') if segment.strip()]
+
+    def is_loaded(self, folder_id: int) -> bool:
+        return folder_id in self.children
+
+    def set_children(self, parent_id: int, folders: []):
+        """
+        Replace the children of a folder
+        """
+        folders = folders or []
+        kept_ids = {int(folder.get('fcat_id')) for folder in folders}
+        for folder_id in self.children.get(parent_id, []):
+            if folder_id not in kept_ids:
+                self.remove(folder_id)
+        self.children[parent_id] = []
+        self.names[parent_id] = {}
+        for folder in folders:
+            self.add(parent_id=parent_id, folder=folder)
+
+    def add(self, parent_id: int, folder: dict):
+        """
+        Add a folder under a loaded parent
+        """
+        folder_id = int(folder.get('fcat_id'))
+        self.folders[folder_id] = folder
+        self.parents[folder_id] = parent_id
+        if folder.get('folder_uuid'):
+            self.uuids[folder.get('folder_uuid')] = folder_id
+        siblings = self.children.setdefault(parent_id, [])
+        if folder_id not in siblings:
+            siblings.append(folder_id)
+        self.names.setdefault(parent_id, {})[self.folder_name(folder)] = folder_id
+
+    def remove(self, folder_id: int):
+        """
+        Remove a folder and its subtree
+        """
+        parent_id = self.parents.pop(folder_id, None)
+        if parent_id is not None:
+            self.children[parent_id] = [f for f in self.children.get(parent_id, []) if f != folder_id]
+            names = self.names.get(parent_id, {})
+            for name in [n for n, f in names.items() if f == folder_id]:
+                names.pop(name)
+        for child_id in self.children.pop(folder_id, []):
+            self.remove(child_id)
+        self.names.pop(folder_id, None)
+        folder = self.folders.pop(folder_id, None) or {}
+        self.uuids.pop(folder.get('folder_uuid'), None)
+
+    def invalidate(self, folder_id: int):
+        """
+        Force the children of a folder to be fetched again
+        """
+        self.children.pop(folder_id, None)
+
+    def load_children(self, service: KairnialFolderService, parent_ids: [int]):
+        """
+        Fetch the children of the folders that are not loaded yet, concurrently
+        """
+
+        def fetch(parent_id):
+            return service.list(parent_id=parent_id or None).get('brut') or []
+
+        missing = sorted({f for f in parent_ids if not self.is_loaded(f)})
+        for parent_id, folders in zip(missing, concurrent_map(fetch, missing)):
+            self.set_children(parent_id, folders)
+
+    def expand(self, service: KairnialFolderService, root_id: int = ROOT, depth: int = None):
+        """
+        Fetch missing levels under root_id, concurrently for each level
+        :param service: folder service of the project
+        :param root_id: numeric ID of the subtree root, 0 for the project root
+        :param depth: number of levels to load, all levels if None
+        """
+
+        level = [root_id]
+        current_depth = 0
+        while level and (depth is None or current_depth < depth):
+            self.load_children(service=service, parent_ids=level)
+            next_level = []
+            for parent_id in level:
+                for child_id in self.children.get(parent_id, []):
+                    # Folders known to be empty do not need a round trip
+                    if self.folders[child_id].get('nbsubfolders') in (0, '0') \
+                            and not self.is_loaded(child_id):
+                        self.set_children(child_id, [])
+                    next_level.append(child_id)
+            level = next_level
+            current_depth += 1
+
+    def nested(self, root_id: int = ROOT, depth: int = None) -> []:
+        """
+        Children of root_id as nested folders with a children attribute
+        """
+        if depth is not None and depth <= 0:
+            return []
+        next_depth = depth - 1 if depth is not None else None
+        return [
+            dict(self.folders[folder_id], children=self.nested(folder_id, next_depth))
+            for folder_id in self.children.get(root_id, [])
+        ]
+
+    def descendants(self, folder_id: int) -> [int]:
+        """
+        IDs of the loaded subfolders of a folder, depth first
+        """
+        folder_ids = []
+        for child_id in self.children.get(folder_id, []):
+            folder_ids.append(child_id)
+            folder_ids += self.descendants(child_id)
+        return folder_ids
+
+    def names_of(self, folder_id: int) -> [str]:
+        """
+        Names of a folder and its parents, from the project root
+        """
+        segments = []
+        while folder_id in self.folders:
+            segments.insert(0, self.folder_name(self.folders[folder_id]))
+            folder_id = self.parents.get(folder_id)
+        return segments
+
+    def path_of(self, folder_id: int) -> str:
+        """
+        Path of a folder from the project root, built with folder names
+        """
+        return '/' + '/'.join(self.names_of(folder_id))
+
+    def resolve(self, service: KairnialFolderService, path: str):
+        """
+        Find a folder ID from its path, fetching unknown levels
+        :param service: folder service of the project
+        :param path: path of folder names separated with /
+        :return: folder ID or None if the path does not exist
+        """
+        folder_id = ROOT
+        for segment in self.split_path(path):
+            if not self.is_loaded(folder_id):
+                self.expand(service=service, root_id=folder_id, depth=1)
+            folder_id = self.names.get(folder_id, {}).get(segment)
+            if folder_id is None:
+                return None
+        return folder_id
+
+    def ensure(self, service: KairnialFolderService, paths: [str], create=None) -> dict:
+        """
+        Find the folder IDs of many paths, creating missing folders level by level
+        Folders of a level are created concurrently and a folder shared by several paths is created once.
+        :param service: folder service of the project
+        :param paths: paths of folder names separated with /
+        :param create: callable(parent_id, name) returning the created folder, None to only look paths up
+        :return: dict of path: folder ID or None if the path does not exist
+        """
+        segments = {path: self.split_path(path) for path in paths}
+        found = {path: ROOT for path in segments}
+        level = 0
+        active = [path for path in segments if len(segments[path]) > level]
+        while active:
+            self.load_children(service=service, parent_ids=[found[path] for path in active])
+            missing = sorted({
+                (found[path], segments[path][level]) for path in active
+                if segments[path][level] not in self.names.get(found[path], {})
+            })
+            if missing and create is not None:
+                for (parent_id, name), folder in zip(missing, concurrent_map(lambda m: create(*m), missing)):
+                    if isinstance(folder, dict) and folder.get('fcat_id'):
+                        self.add(parent_id=parent_id, folder=folder)
+                        # a new folder is empty
+                        self.set_children(int(folder.get('fcat_id')), [])
+                    else:
+                        self.invalidate(parent_id)
+                self.load_children(service=service, parent_ids=[parent_id for parent_id, name in missing])
+            for path in active:
+                found[path] = self.names.get(found[path], {}).get(segments[path][level])
+            level += 1
+            active = [path for path in active if found[path] is not None and len(segments[path]) > level]
+        return found
+
+
+class PathIndex:
+    """
+    Folder IDs of the paths resolved by a user in a project
+    Folders visible to users differ, the index is kept per access token as the folder tree.
+    It is cleared when the user renames or archives a folder, changes made by other users
+    are seen once it expires.
+    """
+
+    def __init__(self, paths: dict = None):
+        self.paths = paths or {}  # normalized path: folder ID
+
+    @staticmethod
+    def cache_key(client_id: str, token: str, project_id: str) -> str:
+        digest = sha1(f'{client_id}||{project_id}||{token}'.encode('utf8')).hexdigest()
+        return f'folder_paths:{digest}'
+
+    @staticmethod
+    def normalize(path: str) -> str:
+        return '/'.join(FolderTree.split_path(path))
+
+    @classmethod
+    def load(cls, client_id: str, token: str, project_id: str):
+        return cls(cache.get(cls.cache_key(client_id, token, project_id)))
+
+    @classmethod
+    def clear(cls, client_id: str, token: str, project_id: str):
+        cache.delete(cls.cache_key(client_id, token, project_id))
+
+    def get(self, path: str):
+        return self.paths.get(self.normalize(path))
+
+    def update(self, resolved: dict):
+        """
+        Add resolved paths, paths that do not exist are not kept
+        """
+        self.paths.update({
+            self.normalize(path): folder_id for path, folder_id in resolved.items() if folder_id is not None
+        })
+
+    def save(self, client_id: str, token: str, project_id: str):
+        cache.set(
+            self.cache_key(client_id, token, project_id),
+            self.paths,
+            timeout=getattr(settings, 'KAIRNIAL_FOLDER_PATH_TIMEOUT', 300)
+        )
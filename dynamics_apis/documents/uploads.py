@@ -0,0 +1,133 @@
+"""
+Document uploads: content hashing while receiving and index of uploaded contents
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadhandler import FileUploadHandler
+
+from dynamics_apis.authentication.authentication import token_subject
+from dynamics_apis.common.keys import fast_hash
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Compute the MD5 hash of uploaded files while they are received
+    Chunks are passed on unchanged to the next handlers, which store the file in memory
+    or in a temporary file. Hashes are kept in request.upload_hashes by field name.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.md5 = hashlib.md5()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.md5.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, 'upload_hashes'):
+            self.request.upload_hashes = {}
+        self.request.upload_hashes[self.field_name] = self.md5.hexdigest()
+        return None
+
+
+def hash_uploads(request):
+    """
+    Hash uploaded files while the request body is parsed
+    Does nothing if the body is already parsed, files are then hashed from their content by file_md5.
+    :param request: REST framework or Django request
+    """
+    http_request = getattr(request, '_request', request)
+    if hasattr(http_request, '_files'):
+        return
+    http_request.upload_handlers.insert(0, HashingUploadHandler(http_request))
+
+
+def uploaded_file(request, field: str = 'file'):
+    """
+    Uploaded file of a field, with its md5 attribute when hashed during the upload
+    """
+    attachment = request.FILES.get(field)
+    if attachment is not None:
+        attachment.md5 = getattr(request, 'upload_hashes', {}).get(field)
+    return attachment
+
+
+def file_md5(attachment) -> str:
+    """
+    MD5 hash of an uploaded file, read by chunks if not hashed during the upload
+    """
+    if getattr(attachment, 'md5', None):
+        return attachment.md5
+    md5 = hashlib.md5()
+    for chunk in attachment.chunks():
+        md5.update(chunk)
+    attachment.seek(0)
+    return md5.hexdigest()
+
+
+class UploadIndex:
+    """
+    Recently uploaded file contents and created documents of a user in a project
+    Contents are indexed by MD5 hash and size, so that an identical file is not pushed
+    to storage again. Documents are indexed by idempotency key, content and metadata, so that
+    a retried request returns the document created by the first one.
+    """
+
+    def __init__(self, client_id: str, token: str, project_id: str):
+        """
+        :param client_id: ID of the client
+        :param token: access token, the index is scoped to its user
+        :param project_id: RGOC Code of the project
+        """
+        self.client_id = client_id
+        self.project_id = project_id
+        self.user_id = token_subject(token, client_id) or fast_hash((token or '').encode('utf8'))[:16]
+        self.timeout = getattr(settings, 'KAIRNIAL_UPLOAD_INDEX_TIMEOUT', 600)
+
+    def blob_key(self, file_hash: str, file_size: int) -> str:
+        return f'upload_blob:{self.client_id}:{self.project_id}:{self.user_id}:{file_hash}:{file_size}'
+
+    def document_key(self, fingerprint: str) -> str:
+        return f'upload_document:{self.client_id}:{self.project_id}:{self.user_id}:{fingerprint}'
+
+    @staticmethod
+    def fingerprint(action: str, serialized_data: dict, idempotency_key: str) -> str:
+        """
+        Digest of a create or revise request, content hash and size included
+        :param action: create or revise
+        :param serialized_data: DocumentCreateSerializer validated data
+        :param idempotency_key: key sent by the client, the same for all attempts of a request
+        """
+        metadata = {key: value for key, value in serialized_data.items() if key != 'file'}
+        return hashlib.sha256(
+            json.dumps([action, idempotency_key, metadata], sort_keys=True, default=str).encode('utf8')
+        ).hexdigest()
+
+    def blob(self, file_hash: str, file_size: int):
+        """
+        UUID of a file with the same content uploaded by the user, None if unknown
+        """
+        if not self.share_blobs():
+            return None
+        return cache.get(self.blob_key(file_hash, file_size))
+
+    def save_blob(self, file_hash: str, file_size: int, file_uuid: str):
+        if self.share_blobs():
+            cache.set(self.blob_key(file_hash, file_size), str(file_uuid), timeout=self.timeout)
+
+    @staticmethod
+    def share_blobs() -> bool:
+        return getattr(settings, 'KAIRNIAL_UPLOAD_SHARE_BLOBS', False)
+
+    def document(self, fingerprint: str):
+        """
+        Response of an identical request, None if unknown
+        """
+        return cache.get(self.document_key(fingerprint))
+
+    def save_document(self, fingerprint: str, document):
+        cache.set(self.document_key(fingerprint), document, timeout=self.timeout)
@@ -12,7 +12,7 @@ from dynamics_apis.common.serializers import ErrorSerializer
 # Create your views here.
 from dynamics_apis.common.services import KairnialWSServiceError
 from dynamics_apis.common.viewsets import project_parameters, PaginatedResponse, \
-    pagination_parameters, PaginatedViewSet
+    pagination_parameters, PaginatedViewSet, not_modified, upstream_etag, with_validators
 from ..models import ApprovalType, Approval
 from ..serializers.approvals import ApprovalTypeSerializer, ApprovalSerializer, \
     ApprovalUpdateSerializer
@@ -48,14 +48,17 @@ class ApprovalTypeViewSet(PaginatedViewSet):
                 page_offset=page_offset,
                 page_limit=page_limit
             )
-
+            etag = upstream_etag(request)
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
             serializer = ApprovalTypeSerializer(approval_type_list, many=True)
-            return PaginatedResponse(
+            return with_validators(request, PaginatedResponse(
                 data=serializer.data,
                 total=total,
                 page_offset=page_offset,
                 page_limit=page_limit
-            )
+            ), etag)
         except (KairnialWSServiceError, KeyError) as e:
             error = ErrorSerializer({
                 'status': 400,
@@ -104,8 +107,10 @@ class ApprovalViewSet(PaginatedViewSet):
 
     @extend_schema(
         summary=_("List Kairnial approvals for folder"),
-        description=_("List Kairnial approvals on a folder"),
+        description=_("List Kairnial approvals of the documents of a folder or matching document filters"),
         parameters=project_parameters + pagination_parameters + [
+            OpenApiParameter(name='folder_id', type=OpenApiTypes.INT, location='query',
+                             required=False, description=_("Numeric ID of the folder of the documents")),
             DocumentFilterSerializer
         ],
         responses={200: ApprovalSerializer, 400: ErrorSerializer},
@@ -117,9 +122,11 @@ class ApprovalViewSet(PaginatedViewSet):
         :param request:
         :param client_id: Client ID token
         :param project_id: Project RGOC ID
-        :param folder_id: ID of the folder
         :return:
         """
+        dfs = DocumentFilterSerializer(data=request.GET, partial=True)
+        if not dfs.is_valid():
+            return Response(dfs.errors, content_type='application/json', status=status.HTTP_400_BAD_REQUEST)
         page_offset, page_limit = self.get_pagination(request=request)
         try:
             total, approval_list, page_offset, page_limit = Approval.paginated_list(
@@ -127,11 +134,10 @@ class ApprovalViewSet(PaginatedViewSet):
                 token=request.token,
                 project_id=project_id,
                 page_offset=page_offset,
-                page_limit=page_limit
+                page_limit=page_limit,
+                filters=dfs.validated_data,
+                folder_id=request.GET.get('folder_id')
             )
-
-            print(approval_list[0].keys())
-
             serializer = ApprovalSerializer(approval_list, many=True)
             return PaginatedResponse(
                 data=serializer.data,
@@ -148,19 +154,47 @@ class ApprovalViewSet(PaginatedViewSet):
             return Response(error.data, content_type='application/json',
                             status=status.HTTP_400_BAD_REQUEST)
 
-
-
+    @extend_schema(
+        summary=_("Retrieve Kairnial approval"),
+        description=_("Retrieve Kairnial approval by ID, "
+                      "giving the document of the approval avoids reading all approvals of the project"),
+        parameters=project_parameters + [
+            OpenApiParameter(name='id', type=OpenApiTypes.INT, location='path',
+                             description=_("Approval numeric ID")),
+            OpenApiParameter(name='document_id', type=OpenApiTypes.INT, location='query',
+                             required=False, description=_("Numeric ID of the document of the approval")),
+        ],
+        responses={200: ApprovalSerializer, 400: ErrorSerializer, 404: OpenApiTypes.STR},
+        methods=["GET"]
+    )
     def retrieve(self, request: HttpRequest, client_id: str, project_id: str, pk: int):
         """
         Get approval detail by ID
         :param request:
         :param client_id: Client ID token
         :param project_id: Project RGOC ID
-        :param folder_id: ID of the folder
+        :param pk: Numeric ID of the approval
         :return:
         """
-        # TODO: Get only one approval
-        return Response("Not implemented", status=status.HTTP_501_NOT_IMPLEMENTED)
+        try:
+            approval = Approval.get(
+                client_id=client_id,
+                token=request.token,
+                project_id=project_id,
+                id=int(pk),
+                document_id=request.GET.get('document_id')
+            )
+        except (KairnialWSServiceError, KeyError, ValueError) as e:
+            error = ErrorSerializer({
+                'status': 400,
+                'code': getattr(e, 'status', 0),
+                'description': getattr(e, 'message', str(e))
+            })
+            return Response(error.data, content_type='application/json',
+                            status=status.HTTP_400_BAD_REQUEST)
+        if approval is None:
+            return Response(_("Approval not found"), status=status.HTTP_404_NOT_FOUND)
+        return Response(ApprovalSerializer(approval).data, content_type='application/json')
 
     @extend_schema(
         summary=_("List Kairnial approvals for folder"),
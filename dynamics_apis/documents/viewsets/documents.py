@@ -7,17 +7,26 @@ from django.utils.translation import gettext as _
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import status
+from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 
 from dynamics_apis.common.serializers import ErrorSerializer
 # Create your views here.
 from dynamics_apis.common.services import KairnialWSServiceError
+from dynamics_apis.common.sync import InvalidSyncToken
 from dynamics_apis.common.viewsets import project_parameters, PaginatedResponse, \
-    pagination_parameters, PaginatedViewSet
+    pagination_parameters, PaginatedViewSet, fields_parameters, requested_fields
 from ..models import Document
 from ..serializers.documents import DocumentQuerySerializer, DocumentSerializer, \
-    DocumentCreateSerializer, DocumentReviseSerializer
+    DocumentCreateSerializer, DocumentReviseSerializer, DocumentSyncQuerySerializer, DocumentSyncSerializer
+from ..uploads import hash_uploads, uploaded_file
+
+idempotency_parameters = [
+    OpenApiParameter("Idempotency-Key", OpenApiTypes.STR, OpenApiParameter.HEADER, required=False,
+                     description=_("Unique key of the request, a retry with the same key returns "
+                                   "the document created by the first attempt")),
+]
 
 
 class DocumentViewSet(PaginatedViewSet):
@@ -29,7 +38,7 @@ class DocumentViewSet(PaginatedViewSet):
     @extend_schema(
         summary=_("List Kairnial documents"),
         description=_("List Kairnial documents on this project"),
-        parameters=project_parameters + pagination_parameters + [
+        parameters=project_parameters + pagination_parameters + fields_parameters + [
             OpenApiParameter(name='parent_id', type=OpenApiTypes.STR, location='query',
                              required=False, description=_("Parent folder ID")),
             DocumentQuerySerializer,  # serializer fields are converted to parameters
@@ -60,7 +69,7 @@ class DocumentViewSet(PaginatedViewSet):
                 filters=dqs.validated_data
             )
 
-            serializer = DocumentSerializer(document_list, many=True)
+            serializer = DocumentSerializer(document_list, many=True, fields=requested_fields(request))
             return PaginatedResponse(
                 data=serializer.data,
                 total=total,
@@ -79,7 +88,7 @@ class DocumentViewSet(PaginatedViewSet):
     @extend_schema(
         summary=_("Retrieve Kairnial document"),
         description=_("Retrieve Kairnial document by ID"),
-        parameters=project_parameters + [
+        parameters=project_parameters + fields_parameters + [
             OpenApiParameter(name='id', type=OpenApiTypes.INT, location='path',
                              required=False, description=_("Folder numeric ID")),
         ],
@@ -101,15 +110,59 @@ class DocumentViewSet(PaginatedViewSet):
             id=pk
         )
         if document:
-            serializer = DocumentSerializer(document)
+            serializer = DocumentSerializer(document, fields=requested_fields(request))
             return Response(data=serializer.data, content_type='application/json', status=status.HTTP_200_OK)
         else:
             return Response(_("Document not found"), status=status.HTTP_404_NOT_FOUND)
 
+    @extend_schema(
+        summary=_("Synchronize Kairnial documents"),
+        description=_("List changes on Kairnial documents since a sync token. "
+                      "Without token, all documents are returned, followed by a token for the next sync."),
+        parameters=project_parameters + [DocumentSyncQuerySerializer],
+        responses={200: DocumentSyncSerializer, 400: ErrorSerializer},
+        methods=["GET"]
+    )
+    @action(['GET'], detail=False, url_path='sync', url_name="document_sync")
+    def sync(self, request: HttpRequest, client_id: str, project_id: str):
+        """
+        Delta sync of documents
+        :param request: HttpRequest
+        :param client_id: Client ID token
+        :param project_id: Project RGOC ID
+        """
+        dsqs = DocumentSyncQuerySerializer(data=request.GET)
+        if not dsqs.is_valid():
+            return Response(dsqs.errors, content_type='application/json',
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            changes, sync_token, has_more = Document.sync(
+                client_id=client_id,
+                token=request.token,
+                project_id=project_id,
+                sync_token=dsqs.validated_data.get('sync_token'),
+                folder_id=dsqs.validated_data.get('folder_id'),
+                limit=dsqs.validated_data.get('page_limit')
+            )
+        except (KairnialWSServiceError, InvalidSyncToken) as e:
+            error = ErrorSerializer({
+                'status': 400,
+                'code': getattr(e, 'status', 0),
+                'description': getattr(e, 'message', str(e))
+            })
+            return Response(error.data, content_type='application/json',
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = DocumentSyncSerializer({
+            'changes': [{'change': change, 'document': document} for change, document in changes],
+            'sync_token': sync_token,
+            'has_more': has_more
+        })
+        return Response(serializer.data, content_type='application/json', status=status.HTTP_200_OK)
+
     @extend_schema(
         summary=_("Create Kairnial document with file"),
         description=_("Create Kairnial"),
-        parameters=project_parameters,
+        parameters=project_parameters + idempotency_parameters,
         request=DocumentCreateSerializer,
         responses={201: DocumentSerializer, 400: ErrorSerializer, 404: OpenApiTypes.STR},
         methods=["POST"]
@@ -122,9 +175,8 @@ class DocumentViewSet(PaginatedViewSet):
         :param project_id: Project RGOC ID
         :return:
         """
-        data = request.POST.copy()
-        data.update(request.FILES)
-        dcs = DocumentCreateSerializer(data=data)
+        hash_uploads(request)
+        dcs = DocumentCreateSerializer(data=request.data)
         if not dcs.is_valid():
             return Response(dcs.errors, content_type='application/json',
                             status=status.HTTP_400_BAD_REQUEST)
@@ -134,7 +186,8 @@ class DocumentViewSet(PaginatedViewSet):
                 token=request.token,
                 project_id=project_id,
                 serialized_data=dcs.validated_data,
-                attachment=request.FILES.get('file')
+                attachment=uploaded_file(request),
+                idempotency_key=request.META.get('HTTP_IDEMPOTENCY_KEY')
             )
             serializer = DocumentSerializer(document)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -144,7 +197,7 @@ class DocumentViewSet(PaginatedViewSet):
     @extend_schema(
         summary=_("Revise Kairnial document"),
         description=_("Revise Kairnial document"),
-        parameters=project_parameters,
+        parameters=project_parameters + idempotency_parameters,
         request=DocumentReviseSerializer,
         responses={201: DocumentSerializer, 400: ErrorSerializer, 404: OpenApiTypes.STR},
         methods=["PUT"]
@@ -157,19 +210,19 @@ class DocumentViewSet(PaginatedViewSet):
         :param project_id: Project RGOC ID
         :return:
         """
-        data = request.POST.copy()
-        data.update(request.FILES)
-        dcs = DocumentCreateSerializer(data=data)
+        hash_uploads(request)
+        dcs = DocumentCreateSerializer(data=request.data)
         if not dcs.is_valid():
             return Response(dcs.errors, content_type='application/json',
                             status=status.HTTP_400_BAD_REQUEST)
         try:
-            document = Document.create(
+            document = Document.update(
                 client_id=client_id,
                 token=request.token,
                 project_id=project_id,
                 serialized_data=dcs.validated_data,
-                attachment=request.FILES.get('file')
+                attachment=uploaded_file(request),
+                idempotency_key=request.META.get('HTTP_IDEMPOTENCY_KEY')
             )
             serializer = DocumentSerializer(document)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
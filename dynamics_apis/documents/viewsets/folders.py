@@ -1,11 +1,14 @@
 """
 Viewsets for the Kairnial files module
 """
-from django.http import HttpRequest
+from itertools import chain
+
+from django.http import HttpRequest, StreamingHttpResponse
 from django.utils.translation import gettext as _
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from dynamics_apis.common.serializers import ErrorSerializer
@@ -15,7 +18,8 @@ from dynamics_apis.common.viewsets import project_parameters, PaginatedResponse,
     pagination_parameters, PaginatedViewSet
 from ..models import Folder
 from ..serializers.folders import FolderQuerySerializer, FolderSerializer, FolderDetailSerializer, \
-    FolderUpdateSerializer, FolderCreateSerializer
+    FolderUpdateSerializer, FolderCreateSerializer, FolderTreeQuerySerializer, FolderPathQuerySerializer, \
+    FolderTreeSerializer, FolderPathsSerializer, FolderPathResultSerializer, FolderArchiveQuerySerializer
 
 
 class FolderViewSet(PaginatedViewSet):
@@ -103,6 +107,171 @@ class FolderViewSet(PaginatedViewSet):
         else:
             return Response(_("Folder not found"), status=status.HTTP_404_NOT_FOUND)
 
+    @extend_schema(
+        summary=_("Kairnial folder tree"),
+        description=_("Retrieve Kairnial folders of this project as a tree"),
+        parameters=project_parameters + [FolderTreeQuerySerializer],
+        responses={200: FolderTreeSerializer, 400: ErrorSerializer},
+        methods=["GET"]
+    )
+    @action(['GET'], detail=False, url_path='tree', url_name="folder_tree")
+    def tree(self, request: HttpRequest, client_id: str, project_id: str):
+        """
+        Retrieve the folder tree, or a subtree
+        :param request: HttpRequest
+        :param client_id: client ID token
+        :param project_id: RGOC ID of the project
+        """
+        ftqs = FolderTreeQuerySerializer(data=request.GET)
+        if not ftqs.is_valid():
+            return Response(ftqs.errors, content_type='application/json',
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            folders = Folder.tree(
+                client_id=client_id,
+                token=request.token,
+                project_id=project_id,
+                root_id=ftqs.validated_data.get('root_id'),
+                depth=ftqs.validated_data.get('depth')
+            )
+        except KairnialWSServiceError as e:
+            error = ErrorSerializer({
+                'status': 400,
+                'code': getattr(e, 'status', 0),
+                'description': getattr(e, 'message', str(e))
+            })
+            return Response(error.data, content_type='application/json',
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = FolderTreeSerializer(folders, many=True)
+        return Response(serializer.data, content_type='application/json', status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary=_("Retrieve Kairnial folder by path"),
+        description=_("Retrieve Kairnial folder from its path in the folder tree"),
+        parameters=project_parameters + [FolderPathQuerySerializer],
+        responses={200: FolderSerializer, 400: ErrorSerializer, 404: OpenApiTypes.STR},
+        methods=["GET"]
+    )
+    @action(['GET'], detail=False, url_path='path', url_name="folder_by_path")
+    def path(self, request: HttpRequest, client_id: str, project_id: str):
+        """
+        Retrieve folder from its path
+        :param request: HttpRequest
+        :param client_id: client ID token
+        :param project_id: RGOC ID of the project
+        """
+        fpqs = FolderPathQuerySerializer(data=request.GET)
+        if not fpqs.is_valid():
+            return Response(fpqs.errors, content_type='application/json',
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            folder = Folder.get_by_path(
+                client_id=client_id,
+                token=request.token,
+                project_id=project_id,
+                path=fpqs.validated_data.get('path')
+            )
+        except KairnialWSServiceError as e:
+            error = ErrorSerializer({
+                'status': 400,
+                'code': getattr(e, 'status', 0),
+                'description': getattr(e, 'message', str(e))
+            })
+            return Response(error.data, content_type='application/json',
+                            status=status.HTTP_400_BAD_REQUEST)
+        if folder:
+            serializer = FolderSerializer(folder)
+            return Response(data=serializer.data, content_type='application/json', status=status.HTTP_200_OK)
+        else:
+            return Response(_("Folder not found"), status=status.HTTP_404_NOT_FOUND)
+
+    @extend_schema(
+        summary=_("Download Kairnial folder"),
+        description=_("Download the documents of a folder as a ZIP archive, streamed as documents are read"),
+        parameters=project_parameters + [
+            OpenApiParameter(name='id', type=OpenApiTypes.INT, location='path',
+                             required=False, description=_("Folder numeric ID")),
+            FolderArchiveQuerySerializer
+        ],
+        responses={(200, 'application/zip'): OpenApiTypes.BINARY, 400: ErrorSerializer},
+        methods=["GET"]
+    )
+    @action(['GET'], detail=True, url_path='archive', url_name="folder_archive")
+    def archive(self, request: HttpRequest, client_id: str, project_id: str, pk: int):
+        """
+        Download a folder as a ZIP archive
+        :param request: HttpRequest
+        :param client_id: client ID token
+        :param project_id: RGOC ID of the project
+        :param pk: Numeric ID of the folder
+        """
+        faqs = FolderArchiveQuerySerializer(data=request.GET)
+        if not faqs.is_valid():
+            return Response(faqs.errors, content_type='application/json',
+                            status=status.HTTP_400_BAD_REQUEST)
+        stream = Folder.download(
+            client_id=client_id,
+            token=request.token,
+            project_id=project_id,
+            id=pk,
+            recursive=faqs.validated_data.get('recursive')
+        )
+        try:
+            # errors on the folder are reported before the response starts
+            first_chunk = next(stream)
+        except KairnialWSServiceError as e:
+            error = ErrorSerializer({
+                'status': 400,
+                'code': getattr(e, 'status', 0),
+                'description': getattr(e, 'message', str(e))
+            })
+            return Response(error.data, content_type='application/json',
+                            status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(chain([first_chunk], stream), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="folder-{pk}.zip"'
+        return response
+
+    @extend_schema(
+        summary=_("Resolve Kairnial folder paths"),
+        description=_("Get the IDs of many folder paths at once, creating missing folders. "
+                      "Use it before importing documents in a new folder tree."),
+        parameters=project_parameters,
+        request=FolderPathsSerializer,
+        responses={200: FolderPathResultSerializer(many=True), 400: ErrorSerializer},
+        methods=["POST"]
+    )
+    @action(['POST'], detail=False, url_path='paths', url_name="folder_paths")
+    def paths(self, request: HttpRequest, client_id: str, project_id: str):
+        """
+        Resolve or create folder paths
+        :param request: HttpRequest
+        :param client_id: client ID token
+        :param project_id: RGOC ID of the project
+        """
+        fps = FolderPathsSerializer(data=request.data)
+        if not fps.is_valid():
+            return Response(fps.errors, content_type='application/json',
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            folder_ids = Folder.resolve_paths(
+                client_id=client_id,
+                token=request.token,
+                project_id=project_id,
+                paths=fps.validated_data.get('paths'),
+                create=fps.validated_data.get('create_folders')
+            )
+        except KairnialWSServiceError as e:
+            error = ErrorSerializer({
+                'status': 400,
+                'code': getattr(e, 'status', 0),
+                'description': getattr(e, 'message', str(e))
+            })
+            return Response(error.data, content_type='application/json',
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = FolderPathResultSerializer(
+            [{'path': path, 'id': folder_id} for path, folder_id in folder_ids.items()], many=True)
+        return Response(serializer.data, content_type='application/json', status=status.HTTP_200_OK)
+
     @extend_schema(
         summary=_("Create Kairnial folder"),
         description=_("Create Kairnial"),
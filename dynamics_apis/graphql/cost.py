@@ -0,0 +1,182 @@
+"""
+Static cost analysis of GraphQL queries
+
+The cost of a query estimates the number of Kairnial Web Services calls it triggers.
+Each field costs KAIRNIAL_GRAPHQL_COSTS calls, the cost of the fields selected under
+a paginated field is multiplied by its page_limit.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode, GraphQLObjectType, GraphQLSchema, \
+    get_named_type
+from graphql.execution.values import get_argument_values
+from graphql.language import DocumentNode, OperationDefinitionNode, FragmentDefinitionNode
+
+
+class QueryCost:
+    """
+    Cost of a GraphQL operation, with an optional cap on page limits
+    """
+
+    def __init__(self, schema: GraphQLSchema, document: DocumentNode, variables: dict = None,
+                 operation_name: str = None):
+        """
+        :param schema: executable schema
+        :param document: parsed query
+        :param variables: query variables
+        :param operation_name: operation to run, the only one if None
+        """
+        self.schema = schema
+        self.variables = variables or {}
+        self.costs = getattr(settings, 'KAIRNIAL_GRAPHQL_COSTS', {})
+        self.multipliers = getattr(settings, 'KAIRNIAL_GRAPHQL_MULTIPLIERS', {})
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions if isinstance(definition, FragmentDefinitionNode)
+        }
+        operations = [
+            definition for definition in document.definitions
+            if isinstance(definition, OperationDefinitionNode)
+            and (operation_name is None or (definition.name and definition.name.value == operation_name))
+        ]
+        self.operation = operations[0] if len(operations) == 1 else None
+
+    def fields(self, selection_set, visited=None):
+        """
+        Field nodes of a selection set, fragments included
+        """
+        visited = visited if visited is not None else set()
+        for selection in selection_set.selections if selection_set else []:
+            if isinstance(selection, FieldNode):
+                yield selection
+            elif isinstance(selection, InlineFragmentNode):
+                yield from self.fields(selection.selection_set, visited)
+            elif isinstance(selection, FragmentSpreadNode) and selection.name.value not in visited:
+                visited.add(selection.name.value)
+                fragment = self.fragments.get(selection.name.value)
+                if fragment:
+                    yield from self.fields(fragment.selection_set, visited)
+
+    def arguments(self, parent_type, node: FieldNode) -> dict:
+        field = parent_type.fields.get(node.name.value)
+        try:
+            return get_argument_values(field, node, self.variables)
+        except Exception:  # invalid arguments are reported by validation
+            return {}
+
+    def selection_cost(self, parent_type, selection_set, cap: int = None) -> int:
+        total = 0
+        for node in self.fields(selection_set):
+            field = parent_type.fields.get(node.name.value)
+            if field is None:
+                continue
+            key = f'{parent_type.name}.{node.name.value}'
+            children = 0
+            field_type = get_named_type(field.type)
+            if node.selection_set and isinstance(field_type, GraphQLObjectType):
+                children = self.selection_cost(field_type, node.selection_set, cap)
+            multiplier = 1
+            if key in self.multipliers:
+                multiplier = self.arguments(parent_type, node).get(self.multipliers[key]) or 1
+                if cap:
+                    multiplier = min(multiplier, cap)
+            total += self.costs.get(key, 0) + multiplier * children
+        return total
+
+    def cost(self, cap: int = None) -> int:
+        """
+        Estimated number of upstream calls
+        :param cap: maximum page limit applied to paginated fields
+        """
+        if self.operation is None or self.operation.operation.value != 'query':
+            return 0
+        return self.selection_cost(self.schema.query_type, self.operation.selection_set, cap)
+
+    def largest_cap(self, budget: int):
+        """
+        Largest page limit keeping the cost within budget, None if no page limit fits
+        """
+        low, high = 1, max(1, self.max_page_limit())
+        if self.cost(cap=low) > budget:
+            return None
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.cost(cap=middle) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def max_page_limit(self) -> int:
+        limits = [0]
+
+        def walk(parent_type, selection_set):
+            for node in self.fields(selection_set):
+                field = parent_type.fields.get(node.name.value)
+                if field is None:
+                    continue
+                key = f'{parent_type.name}.{node.name.value}'
+                if key in self.multipliers:
+                    limits.append(self.arguments(parent_type, node).get(self.multipliers[key]) or 1)
+                field_type = get_named_type(field.type)
+                if node.selection_set and isinstance(field_type, GraphQLObjectType):
+                    walk(field_type, node.selection_set)
+
+        if self.operation is not None:
+            walk(self.schema.query_type, self.operation.selection_set)
+        return max(limits)
+
+    def clients(self) -> [str]:
+        """
+        Client IDs queried by the root fields
+        """
+        if self.operation is None:
+            return []
+        query_type = self.schema.query_type
+        return sorted({
+            self.arguments(query_type, node).get('client_id')
+            for node in self.fields(self.operation.selection_set)
+            if node.name.value in query_type.fields
+        } - {None})
+
+
+class CostBudget:
+    """
+    Query cost and per minute budgets of a client
+    Defaults are KAIRNIAL_GRAPHQL_MAX_COST and KAIRNIAL_GRAPHQL_COST_PER_MINUTE,
+    overridden per client ID in KAIRNIAL_GRAPHQL_CLIENT_BUDGETS.
+    """
+
+    def __init__(self, client_id: str):
+        budgets = getattr(settings, 'KAIRNIAL_GRAPHQL_CLIENT_BUDGETS', {}).get(client_id, {})
+        self.client_id = client_id
+        self.max_cost = budgets.get('max_cost', getattr(settings, 'KAIRNIAL_GRAPHQL_MAX_COST', 200))
+        self.per_minute = budgets.get('per_minute', getattr(settings, 'KAIRNIAL_GRAPHQL_COST_PER_MINUTE', 2000))
+
+    def cache_key(self) -> str:
+        return f'graphql_cost:{self.client_id}:{int(time.time() // 60)}'
+
+    def spend(self, cost: int):
+        """
+        Charge a cost to the current minute
+        :return: remaining budget of the minute, negative and not charged if exceeded
+        """
+        key = self.cache_key()
+        # add does not overwrite the charge of a concurrent first query of the minute
+        cache.add(key, 0, timeout=120)
+        spent = cache.incr(key, cost)
+        if spent > self.per_minute:
+            self.refund(cost, key=key)
+        return self.per_minute - spent
+
+    def refund(self, cost: int, key: str = None):
+        """
+        Give back a cost charged by spend
+        :param key: cache key of the minute it was charged to, the current minute if None
+        """
+        try:
+            cache.decr(key or self.cache_key(), cost)
+        except ValueError:  # the minute expired
+            pass
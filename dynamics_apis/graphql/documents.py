@@ -0,0 +1,138 @@
+"""
+Persisted queries and cache of parsed GraphQL documents
+"""
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+
+from ariadne.graphql import parse_query, validate_query
+from django.conf import settings
+from django.core.cache import cache
+from graphql import GraphQLSchema
+
+
+class PersistedQueryNotFound(Exception):
+    """
+    The hash of a persisted query is not registered, the client must send the query again
+    """
+    pass
+
+
+class PersistedQueryMismatch(Exception):
+    """
+    The hash sent with a query is not its SHA-256
+    """
+    pass
+
+
+class PersistedQueries:
+    """
+    Registry of automatic persisted queries, by SHA-256 hash of the query
+    Clients send the hash only and the full query when the hash is not known yet.
+    """
+
+    @staticmethod
+    def cache_key(query_hash: str) -> str:
+        return f'graphql_query:{query_hash}'
+
+    @staticmethod
+    def hash(query: str) -> str:
+        return sha256(query.encode('utf8')).hexdigest()
+
+    @staticmethod
+    def persisted_hash(data: dict) -> str:
+        """
+        Hash sent in the persistedQuery extension of a request, None if not a persisted query
+        """
+        extensions = data.get('extensions') if isinstance(data, dict) else None
+        persisted = extensions.get('persistedQuery') if isinstance(extensions, dict) else None
+        if not isinstance(persisted, dict) or not persisted.get('sha256Hash'):
+            return None
+        return str(persisted['sha256Hash']).lower()
+
+    @classmethod
+    def resolve(cls, data: dict) -> dict:
+        """
+        Fill the query of a request sent with a persistedQuery extension
+        :param data: GraphQL request body
+        :return: request body with its query
+        :raise PersistedQueryNotFound: if only an unknown hash is sent
+        :raise PersistedQueryMismatch: if the hash does not match the query
+        """
+        query_hash = cls.persisted_hash(data)
+        if query_hash is None:
+            return data
+        query = data.get('query')
+        if not query:
+            query = cache.get(cls.cache_key(query_hash))
+            if query is None:
+                raise PersistedQueryNotFound(query_hash)
+            return dict(data, query=query)
+        if not isinstance(query, str) or cls.hash(query) != query_hash:
+            raise PersistedQueryMismatch(query_hash)
+        return data
+
+    @classmethod
+    def register(cls, data: dict) -> bool:
+        """
+        Register the query of a request sent with a persistedQuery extension
+        Only call it once the query is parsed and validated, queries over KAIRNIAL_GRAPHQL_PERSISTED_MAX_SIZE
+        characters are not registered and must always be sent.
+        :param data: GraphQL request body resolved by resolve
+        :return: whether the query is registered
+        """
+        query_hash = cls.persisted_hash(data)
+        query = data.get('query') if query_hash else None
+        if not isinstance(query, str) or len(query) > getattr(settings, 'KAIRNIAL_GRAPHQL_PERSISTED_MAX_SIZE', 10000):
+            return False
+        timeout = getattr(settings, 'KAIRNIAL_GRAPHQL_PERSISTED_TIMEOUT', 86400)
+        cache.set(cls.cache_key(query_hash), query, timeout=timeout)
+        return True
+
+
+class DocumentCache:
+    """
+    Least recently used parsed documents of a schema, by query text
+    Validation errors are kept with each document for each set of validation rules.
+    """
+
+    def __init__(self, schema: GraphQLSchema, size: int):
+        self.schema = schema
+        self.size = size
+        self.documents = OrderedDict()  # query hash: (document, {(rules, introspection): validation errors})
+        self.lock = threading.Lock()
+
+    def entry(self, query: str) -> tuple:
+        key = PersistedQueries.hash(query)
+        with self.lock:
+            if key in self.documents:
+                self.documents.move_to_end(key)
+                return self.documents[key]
+        entry = parse_query(query), {}
+        with self.lock:
+            self.documents[key] = entry
+            while len(self.documents) > self.size:
+                self.documents.popitem(last=False)
+        return entry
+
+    def parse(self, query: str):
+        """
+        Parse a query, or get it from cache
+        :raise GraphQLError: on syntax error
+        """
+        return self.entry(query)[0]
+
+    def get(self, query: str, rules: [type] = None, introspection: bool = True) -> tuple:
+        """
+        Parse and validate a query, or get it from cache
+        :param rules: validation rules added to the rules of the specification
+        :param introspection: allow introspection queries
+        :return: document, list of validation errors
+        :raise GraphQLError: on syntax error
+        """
+        document, validations = self.entry(query)
+        key = tuple(rules or ()), introspection
+        errors = validations.get(key)
+        if errors is None:
+            errors = validations[key] = validate_query(self.schema, document, rules, enable_introspection=introspection)
+        return document, errors
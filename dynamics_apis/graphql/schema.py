@@ -3,6 +3,8 @@ Djangophysics GraphQL schemas
 """
 
 from ariadne import QueryType, gql, make_executable_schema
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode, get_named_type
+from graphql.execution.values import get_argument_values
 
 from dynamics_apis.projects.models import Project
 from dynamics_apis.users.models.contacts import Contact
@@ -99,6 +101,35 @@ gql(type_defs)
 query = QueryType()
 
 
+def selected_fields(info, field_nodes=None, parent_type=None) -> dict:
+    """
+    Fields selected under the resolved field, fragments included
+    :param info: QraphQL request context
+    :param field_nodes: nodes of the field, the resolved field if None
+    :param parent_type: type of the field, the return type of the resolved field if None
+    :return: dict of field name: (field node, argument values)
+    """
+    field_nodes = info.field_nodes if field_nodes is None else field_nodes
+    parent_type = get_named_type(info.return_type) if parent_type is None else parent_type
+    selections = {}
+
+    def collect(selection_set):
+        for selection in selection_set.selections if selection_set else []:
+            if isinstance(selection, FieldNode):
+                name = selection.name.value
+                field = parent_type.fields.get(name)
+                if name not in selections and field is not None:
+                    selections[name] = selection, get_argument_values(field, selection, info.variable_values)
+            elif isinstance(selection, InlineFragmentNode):
+                collect(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                collect(info.fragments[selection.name.value].selection_set)
+
+    for node in field_nodes:
+        collect(node.selection_set)
+    return selections
+
+
 # User resolver
 @query.field("user")
 def resolve_user(_, info, client_id, project_id):
@@ -111,14 +142,19 @@ def resolve_user(_, info, client_id, project_id):
     """
     request = info.context.get('request', None)
     if hasattr(request, 'token'):
-        filters = {'email': request.user.email}
+        filters = {'account_email': request.user.email}
         user_list = User.list(
             client_id=client_id,
             token=request.token,
             project_id=project_id,
             filters=filters
         )
-        serializer = ProjectMemberSerializer(user_list[0])
+        # account_email is a substring filter, bob@x.com also matches jimbob@x.com
+        email = request.user.email.casefold()
+        user = next((u for u in user_list or [] if str(u.get('account_email') or '').casefold() == email), None)
+        if user is None:
+            return None
+        serializer = ProjectMemberSerializer(user)
         return serializer.data
 
 
@@ -186,14 +222,17 @@ def resolve_contacts(_, info, client_id, project_id, **filters):
             project_id=project_id,
             filters=cqs.validated_data
         )
-        serializer = ContactSerializer(contacts_list, many=True)
+        serializer = ContactSerializer(contacts_list, many=True, fields=selected_fields(info))
         return serializer.data
 
 
-def enhance_project_list(obj_list, client_id, token, selections):
+def enhance_project_list(obj_list, client_id, token, selections, fields=None):
     """
     Inject client_id and token into lists to use in serializer relations
+    :param selections: dict of relation name: filters
+    :param fields: dict of relation name: fields selected on related objects
     """
+    fields = fields or {}
     node_serializers = {
         'users': UserQuerySerializer,
         'groups': GroupQuerySerializer,
@@ -213,7 +252,8 @@ def enhance_project_list(obj_list, client_id, token, selections):
                 'client_id': client_id, 'token': token,
                 'project_id': obj_list[i]['g_nom'],
                 'selected': selected,
-                'filters': filters.get(sel, {})
+                'filters': filters.get(sel, {}),
+                'fields': fields.get(sel)
             }
 
 
@@ -227,6 +267,9 @@ def resolve_projects(_, info, client_id: str, page_offset: int = 0, page_limit:
     :param info: QraphQL request context
     """
     request = info.context.get('request', None)
+    if info.context.get('page_limit_cap'):
+        # query over its cost budget
+        page_limit = min(page_limit, info.context['page_limit_cap'])
     if hasattr(request, 'token'):
         total, project_list, page_offset, page_limit = Project.paginated_list(
             client_id=client_id,
@@ -235,14 +278,18 @@ def resolve_projects(_, info, client_id: str, page_offset: int = 0, page_limit:
             page_limit=page_limit,
             search=search
         )
-        selections = {s.name.value: {a.name.value: a.value.value for a in s.arguments} for s in
-                      info.field_nodes[0].selection_set.selections}
+        project_type = get_named_type(info.return_type)
+        selections = selected_fields(info)
         enhance_project_list(
             obj_list=project_list,
             client_id=client_id,
             token=request.token,
-            selections=selections)
-        serializer = ProjectGraphQLSerializer(project_list, many=True)
+            selections={name: arguments for name, (node, arguments) in selections.items()},
+            fields={
+                name: selected_fields(info, [node], get_named_type(project_type.fields[name].type))
+                for name, (node, arguments) in selections.items() if node.selection_set
+            })
+        serializer = ProjectGraphQLSerializer(project_list, many=True, fields=selections)
         return serializer.data
 
 
@@ -25,7 +25,7 @@ class LazyContactsField(serializers.Field):
                 project_id=obj.get('project_id'),
                 filters=obj.get('filters')
             )
-            return ContactSerializer(contacts_list, many=True).data
+            return ContactSerializer(contacts_list, many=True, fields=obj.get('fields')).data
         return []
 
 
@@ -0,0 +1,150 @@
+"""
+Test GraphQL resolvers and views
+"""
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+from ariadne import graphql_sync
+from django.test import SimpleTestCase, override_settings
+from graphql import parse
+from rest_framework.test import APIRequestFactory
+
+from dynamics_apis.users.services.users import KairnialUser
+from .cost import CostBudget, QueryCost
+from .documents import DocumentCache, PersistedQueries, PersistedQueryNotFound
+from .schema import schema
+from .views import CostLimitedGraphQLView
+
+
+class UserResolverTest(SimpleTestCase):
+    """
+    Test resolution of the connected user
+    """
+
+    def resolve(self, email: str, users: [dict]):
+        request = SimpleNamespace(token='t', user=SimpleNamespace(email=email))
+        with mock.patch.object(KairnialUser, 'list', return_value={'items': users}):
+            success, result = graphql_sync(
+                schema,
+                {'query': '{ user(client_id: "c", project_id: "p") { id email } }'},
+                context_value={'request': request}
+            )
+        self.assertTrue(success)
+        return result['data']['user']
+
+    def test_100_user_is_matched_on_account_email(self):
+        users = [
+            {'account_id': 1, 'account_email': 'jime@example.com', 'account_firstname': 'Other'},
+            {'account_id': 2, 'account_email': 'me@example.com', 'account_firstname': 'Me'},
+        ]
+        self.assertEqual(self.resolve('ME@example.com', users), {'id': 2, 'email': 'me@example.com'})
+        self.assertIsNone(self.resolve('nobody@example.com', users))
+        self.assertIsNone(self.resolve('e@example.com', users[:1]))
+
+
+class QueryCostTest(SimpleTestCase):
+    """
+    Test static cost analysis of GraphQL queries
+    """
+
+    def test_100_relations_are_multiplied_by_page_limit(self):
+        query = parse('query($limit: Int) { projects(client_id: "c", page_limit: $limit) { id ...Relations } } '
+                      'fragment Relations on Project { users { id } groups { id } }')
+        query_cost = QueryCost(schema=schema, document=query, variables={'limit': 150})
+        self.assertEqual((query_cost.cost(), query_cost.clients()), (301, ['c']))
+        self.assertEqual(query_cost.largest_cap(budget=101), 50)
+
+
+class PersistedQueryTest(SimpleTestCase):
+    """
+    Test persisted queries and cache of parsed documents
+    """
+
+    def test_100_hash_only_query_is_resolved_once_registered(self):
+        query = '{ __typename }'
+        data = {'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': PersistedQueries.hash(query)}}}
+        with self.assertRaises(PersistedQueryNotFound):
+            PersistedQueries.resolve(data)
+        self.assertTrue(PersistedQueries.register(PersistedQueries.resolve(dict(data, query=query))))
+        self.assertEqual(PersistedQueries.resolve(data)['query'], query)
+
+    @override_settings(KAIRNIAL_GRAPHQL_PERSISTED_MAX_SIZE=10)
+    def test_101_large_queries_are_not_registered(self):
+        query = '{ test_101: __typename }'
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': PersistedQueries.hash(query)}}
+        data = {'query': query, 'extensions': extensions}
+        self.assertFalse(PersistedQueries.register(data))
+        with self.assertRaises(PersistedQueryNotFound):
+            PersistedQueries.resolve(dict(data, query=None))
+
+    def test_200_documents_are_reused(self):
+        documents = DocumentCache(schema=schema, size=1)
+        document, errors = documents.get('{ __typename }')
+        self.assertEqual(errors, [])
+        self.assertIs(documents.get('{ __typename }')[0], document)
+        documents.get('{ nope }')
+        self.assertEqual(len(documents.documents), 1)
+
+
+class CostLimitedGraphQLViewTest(SimpleTestCase):
+    """
+    Test cost limits and persisted queries of the GraphQL endpoint
+    """
+    query = '{ projects(client_id: "%s", page_limit: 150) { id users { id } } }'
+
+    def post(self, data: dict, **initkwargs):
+        request = APIRequestFactory().post('/graphql', data, format='json')
+        response = CostLimitedGraphQLView.as_view(schema=schema, **initkwargs)(request)
+        return response.status_code, json.loads(response.content)
+
+    @override_settings(KAIRNIAL_GRAPHQL_OVER_BUDGET='reject', KAIRNIAL_GRAPHQL_MAX_COST=101)
+    def test_100_over_budget_queries_are_rejected(self):
+        status, result = self.post({'query': self.query % 'test_100'})
+        self.assertEqual(status, 400)
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'QUERY_COST_EXCEEDED')
+        self.assertEqual(result['extensions']['cost']['requested'], 151)
+
+    @override_settings(KAIRNIAL_GRAPHQL_OVER_BUDGET='degrade', KAIRNIAL_GRAPHQL_MAX_COST=101)
+    def test_101_over_budget_queries_are_degraded(self):
+        status, result = self.post({'query': self.query % 'test_101'})
+        self.assertEqual(status, 200)
+        self.assertEqual(result['extensions']['cost']['page_limit'], 100)
+        self.assertEqual(result['extensions']['cost']['cost'], 101)
+
+    @override_settings(KAIRNIAL_GRAPHQL_CLIENT_BUDGETS={'test_102': {'per_minute': 200}})
+    def test_102_exhausted_budget_is_throttled(self):
+        with mock.patch.object(CostBudget, 'cache_key', return_value='graphql_cost:test_102'):
+            self.assertEqual(self.post({'query': self.query % 'test_102'})[0], 200)
+            status, result = self.post({'query': self.query % 'test_102'})
+        self.assertEqual(status, 429)
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'QUERY_COST_EXCEEDED')
+
+    def test_103_unknown_persisted_query_is_asked_again(self):
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': PersistedQueries.hash('{ test_103 }')}}
+        status, result = self.post({'extensions': extensions})
+        self.assertEqual(status, 200)
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND')
+
+    def test_104_view_validation_options_are_applied(self):
+        query = {'query': '{ __schema { queryType { name } } }'}
+        self.assertEqual(self.post(query)[0], 200)
+        self.assertEqual(self.post(query, introspection=False)[0], 400)
+        rules = mock.Mock(return_value=[])
+        self.assertEqual(self.post(query, validation_rules=rules)[0], 200)
+        self.assertEqual(rules.call_count, 1)
+
+    @override_settings(KAIRNIAL_GRAPHQL_CLIENT_BUDGETS={'test_105_b': {'per_minute': 1}})
+    def test_105_rejected_queries_are_not_charged(self):
+        query = ('{ a: projects(client_id: "test_105_a", page_limit: 1) { id } '
+                 'b: projects(client_id: "test_105_b", page_limit: 1) { id } }')
+        self.assertEqual(self.post({'query': query})[0], 429)
+        self.assertEqual(CostBudget('test_105_a').spend(0), 2000)
+        self.assertEqual(CostBudget('test_105_b').spend(0), 1)
+
+    def test_106_invalid_queries_are_not_registered(self):
+        for query in ['{ test_106 }', '{ test_106']:
+            extensions = {'persistedQuery': {'version': 1, 'sha256Hash': PersistedQueries.hash(query)}}
+            self.assertEqual(self.post({'query': query, 'extensions': extensions})[0], 400)
+            result = self.post({'extensions': extensions})[1]
+            self.assertEqual(result['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND')
@@ -1,11 +1,11 @@
 """
 GraphQL URL Configuration
 """
-from ariadne_django.views import GraphQLView
 from django.urls import path
 
 from .schema import schema
+from .views import CostLimitedGraphQLView
 
 urlpatterns = [
-    path('', GraphQLView.as_view(schema=schema), name='graphql'),
+    path('', CostLimitedGraphQLView.as_view(schema=schema), name='graphql'),
 ]
\ No newline at end of file
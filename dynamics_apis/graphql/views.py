@@ -0,0 +1,141 @@
+"""
+GraphQL views
+"""
+from ariadne.exceptions import HttpBadRequestError
+from ariadne.extensions import ExtensionManager
+from ariadne.graphql import handle_graphql_errors, handle_query_result, validate_data
+from ariadne_django.views import GraphQLView
+from django.conf import settings
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.utils.translation import gettext as _
+from graphql import GraphQLError, ExecutionContext, execute
+
+from .cost import QueryCost, CostBudget
+from .documents import DocumentCache, PersistedQueries, PersistedQueryNotFound, PersistedQueryMismatch
+
+
+class CostLimitedGraphQLView(GraphQLView):
+    """
+    GraphQL view checking the cost of queries against the budget of their client before execution
+    Over budget queries are rejected, or run with smaller pages when KAIRNIAL_GRAPHQL_OVER_BUDGET is degrade.
+    The cost is reported in the extensions of the response.
+    Queries may be sent as automatic persisted queries, parsed and validated documents are cached.
+    """
+    document_cache = None
+
+    def get_document_cache(self) -> DocumentCache:
+        cls = type(self)
+        if cls.document_cache is None or cls.document_cache.schema is not self.schema:
+            cls.document_cache = DocumentCache(
+                schema=self.schema,
+                size=getattr(settings, 'KAIRNIAL_GRAPHQL_DOCUMENT_CACHE_SIZE', 256)
+            )
+        return cls.document_cache
+
+    def post(self, request, *args, **kwargs):
+        try:
+            data = self.extract_data_from_request(request)
+        except HttpBadRequestError as error:
+            return HttpResponseBadRequest(error.message)
+        try:
+            data = PersistedQueries.resolve(data)
+        except PersistedQueryNotFound:
+            return JsonResponse({
+                'errors': [{'message': 'PersistedQueryNotFound', 'extensions': {'code': 'PERSISTED_QUERY_NOT_FOUND'}}]
+            })
+        except PersistedQueryMismatch:
+            return self.error(_("Provided sha256Hash does not match query"), 'PERSISTED_QUERY_MISMATCH', status=400)
+        kwargs_graphql = self.get_kwargs_graphql(request)
+        extension_manager = ExtensionManager(kwargs_graphql['extensions'], kwargs_graphql['context_value'])
+        error_handling = {
+            'logger': kwargs_graphql['logger'],
+            'error_formatter': kwargs_graphql['error_formatter'],
+            'debug': kwargs_graphql['debug'],
+            'extension_manager': extension_manager,
+        }
+        report = None
+        with extension_manager.request():
+            try:
+                validate_data(data)
+                documents = self.get_document_cache()
+                context_value = kwargs_graphql['context_value']
+                validation_rules = kwargs_graphql['validation_rules']
+                if callable(validation_rules):
+                    validation_rules = validation_rules(context_value, documents.parse(data['query']), data)
+                document, errors = documents.get(
+                    data['query'],
+                    rules=validation_rules,
+                    introspection=kwargs_graphql['introspection']
+                )
+                if errors:
+                    success, result = handle_graphql_errors(errors, **error_handling)
+                else:
+                    PersistedQueries.register(data)
+                    report, rejection = self.check_cost(document, data, context_value)
+                    if rejection:
+                        return rejection
+                    root_value = kwargs_graphql['root_value']
+                    if callable(root_value):
+                        root_value = root_value(context_value, document)
+                    result = execute(
+                        self.schema,
+                        document,
+                        root_value=root_value,
+                        context_value=context_value,
+                        variable_values=data.get('variables'),
+                        operation_name=data.get('operationName'),
+                        execution_context_class=ExecutionContext,
+                        middleware=extension_manager.as_middleware_manager(kwargs_graphql['middleware']),
+                    )
+                    success, result = handle_query_result(result, **error_handling)
+            except GraphQLError as error:
+                success, result = handle_graphql_errors([error], **error_handling)
+        if report:
+            result['extensions'] = dict(result.get('extensions') or {}, cost=report)
+        return JsonResponse(result, status=200 if success else 400)
+
+    @staticmethod
+    def error(message: str, code: str, status: int, report: dict = None):
+        response = {'errors': [{'message': message, 'extensions': {'code': code}}]}
+        if report:
+            response['extensions'] = {'cost': report}
+        return JsonResponse(response, status=status)
+
+    def check_cost(self, document, data: dict, context: dict) -> tuple:
+        """
+        Compute the cost of the query and charge it to its clients
+        :return: cost report, error response if the query is refused
+        """
+        query_cost = QueryCost(
+            schema=self.schema,
+            document=document,
+            variables=data.get('variables'),
+            operation_name=data.get('operationName')
+        )
+        requested = query_cost.cost()
+        budgets = [CostBudget(client_id) for client_id in query_cost.clients()] or [CostBudget(None)]
+        maximum = min(budget.max_cost for budget in budgets)
+        report = {'requested': requested, 'cost': requested, 'maximum': maximum}
+        if requested > maximum:
+            cap = None
+            if getattr(settings, 'KAIRNIAL_GRAPHQL_OVER_BUDGET', 'degrade') == 'degrade':
+                cap = query_cost.largest_cap(maximum)
+            if cap is None:
+                return report, self.error(
+                    _("Query cost {} exceeds the maximum of {}").format(requested, maximum),
+                    'QUERY_COST_EXCEEDED', status=400, report=report)
+            context['page_limit_cap'] = cap
+            report.update(cost=query_cost.cost(cap=cap), page_limit=cap)
+        charged = []
+        for budget in budgets:
+            remaining = budget.spend(report['cost'])
+            if remaining < 0:
+                # the query is not run, other clients are not charged for it
+                for other in charged:
+                    other.refund(report['cost'])
+                return report, self.error(
+                    _("Query cost budget of client {} exhausted for this minute").format(budget.client_id),
+                    'QUERY_COST_EXCEEDED', status=429, report=report)
+            charged.append(budget)
+            report['remaining'] = min(remaining, report.get('remaining', remaining))
+        return report, None
@@ -0,0 +1,142 @@
+"""
+Catalogue of the projects of a user
+
+The projects a user can access are fetched once and cached per user for
+KAIRNIAL_PROJECT_CATALOGUE_TIMEOUT seconds. Searches and pages are then served from the
+catalogue, through a search index built once per process and catalogue version.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class ProjectCatalogue:
+    """
+    Projects of a user, searchable on project ID, name and description
+    """
+    indexes = OrderedDict()  # cache key: catalogue indexed in this process
+    index_size = 128
+    lock = threading.Lock()
+
+    def __init__(self, projects: [dict], fetched_at: float):
+        """
+        :param projects: projects as returned by Kairnial
+        :param fetched_at: time the projects were fetched, version of the catalogue
+        """
+        self.projects = projects
+        self.fetched_at = fetched_at
+        self.texts = [self.searchable(project) for project in projects]
+
+    @staticmethod
+    def searchable(project: dict) -> str:
+        """
+        Searched text of a project: ID, name and description
+        """
+        try:
+            infos = json.loads(project.get('g_infos') or '{}')
+        except (TypeError, ValueError):
+            infos = {}
+        description = infos.get('DESCOP') if isinstance(infos, dict) else None
+        return '|'.join(
+            str(value or '') for value in (project.get('g_nom'), project.get('g_desc'), description)
+        ).casefold()
+
+    @staticmethod
+    def cache_key(client_id: str, user_id: str) -> str:
+        return f'project_catalogue:{client_id}:{user_id}'
+
+    @classmethod
+    def get(cls, client_id: str, user_id: str):
+        """
+        Cached catalogue of a user, None if not cached
+        """
+        key = cls.cache_key(client_id, user_id)
+        cached = cache.get(key)
+        if cached is None:
+            return None
+        fetched_at, projects = cached
+        with cls.lock:
+            catalogue = cls.indexes.get(key)
+            if catalogue is not None and catalogue.fetched_at == fetched_at:
+                cls.indexes.move_to_end(key)
+                return catalogue
+        return cls.index(key, cls(projects, fetched_at))
+
+    @classmethod
+    def save(cls, client_id: str, user_id: str, projects: [dict]):
+        """
+        Cache the projects of a user
+        :return: catalogue
+        """
+        key = cls.cache_key(client_id, user_id)
+        catalogue = cls(projects, time.time())
+        cache.set(
+            key,
+            (catalogue.fetched_at, projects),
+            timeout=getattr(settings, 'KAIRNIAL_PROJECT_CATALOGUE_TIMEOUT', 300)
+        )
+        return cls.index(key, catalogue)
+
+    @staticmethod
+    def overflow_key(client_id: str, user_id: str) -> str:
+        return f'project_catalogue_overflow:{client_id}:{user_id}'
+
+    @classmethod
+    def overflows(cls, client_id: str, user_id: str) -> bool:
+        """
+        Whether the user has too many projects for a catalogue, their pages are then fetched from Kairnial
+        """
+        return bool(cache.get(cls.overflow_key(client_id, user_id)))
+
+    @classmethod
+    def save_overflow(cls, client_id: str, user_id: str):
+        """
+        Remember the user has more than KAIRNIAL_PROJECT_CATALOGUE_MAX projects
+        """
+        cache.set(
+            cls.overflow_key(client_id, user_id),
+            True,
+            timeout=getattr(settings, 'KAIRNIAL_PROJECT_CATALOGUE_TIMEOUT', 300)
+        )
+
+    @classmethod
+    def index(cls, key: str, catalogue):
+        with cls.lock:
+            cls.indexes[key] = catalogue
+            cls.indexes.move_to_end(key)
+            while len(cls.indexes) > cls.index_size:
+                cls.indexes.popitem(last=False)
+        return catalogue
+
+    @classmethod
+    def clear(cls, client_id: str, user_id: str):
+        """
+        Forget the catalogue of a user, after a project is created or updated
+        """
+        cache.delete_many([cls.cache_key(client_id, user_id), cls.overflow_key(client_id, user_id)])
+
+    def search(self, search: str = None) -> [dict]:
+        """
+        Projects containing the search text, case insensitive
+        """
+        if not search:
+            return self.projects
+        needle = search.casefold()
+        return [project for project, text in zip(self.projects, self.texts) if needle in text]
+
+    def page(self, search: str = None, page_offset: int = 0, page_limit: int = None) -> dict:
+        """
+        Page of projects, in the format of the Kairnial project list
+        """
+        page_limit = page_limit or getattr(settings, 'PAGE_SIZE', 100)
+        projects = self.search(search)
+        return {
+            'total': len(projects),
+            'items': projects[page_offset:page_offset + page_limit],
+            'LIMITSKIP': page_offset,
+            'LIMITTAKE': page_limit
+        }
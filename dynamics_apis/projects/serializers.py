@@ -6,6 +6,8 @@ import json
 from django.utils.translation import gettext as _
 from rest_framework import serializers
 
+from dynamics_apis.common.serializers import ProjectionMixin
+
 
 class ProjectInfoSerializer(serializers.Serializer):
     """
@@ -71,7 +73,7 @@ class ProjectInfoSerializer(serializers.Serializer):
         read_only=True)
 
 
-class ProjectSerializer(serializers.Serializer):
+class ProjectSerializer(ProjectionMixin, serializers.Serializer):
     """
     Serializer for the Kairnial Project response
     """
@@ -3,14 +3,14 @@ Call to Kairnial Web Services
 """
 import json
 import logging
-from hashlib import sha1
 
 import requests
 from django.conf import settings
-from django.core.cache import cache
 from django.utils.translation import gettext as _
 
+from dynamics_apis.authentication.authentication import token_subject
 from dynamics_apis.common.services import KairnialWSServiceError, KairnialCrossService
+from dynamics_apis.projects.catalogue import ProjectCatalogue
 
 PROJECT_LIST_PATH = '/api/v2/projects'
 PROJECT_CREATION_PATH = '/adminEC'
@@ -30,11 +30,49 @@ class KairnialProject(KairnialCrossService):
              page_limit: int = getattr(settings, 'PAGE_SIZE', 100)) -> []:
         """
         List projects
+        Pages and searches are served from the catalogue of the user, fetched once.
         :param search: Search into project name and description
         :param page_offset: list projects starting from this index
         :param page_limit: number of projects
         :return:
         """
+        user_id = token_subject(self.token, self.client_id)
+        if user_id is None:
+            return self.fetch_page(search=search, page_offset=page_offset, page_limit=page_limit)
+        catalogue = ProjectCatalogue.get(self.client_id, user_id)
+        if catalogue is None:
+            projects = None if ProjectCatalogue.overflows(self.client_id, user_id) else self.fetch_all()
+            if projects is None:
+                ProjectCatalogue.save_overflow(self.client_id, user_id)
+                return self.fetch_page(search=search, page_offset=page_offset, page_limit=page_limit)
+            catalogue = ProjectCatalogue.save(self.client_id, user_id, projects)
+        return catalogue.page(search=search, page_offset=page_offset, page_limit=page_limit)
+
+    def fetch_all(self):
+        """
+        All the projects of the user
+        :return: list of projects, None if there are more than KAIRNIAL_PROJECT_CATALOGUE_MAX
+        """
+        take = getattr(settings, 'KAIRNIAL_PROJECT_CATALOGUE_PAGE', 500)
+        projects = []
+        while True:
+            response = self.fetch_page(page_offset=len(projects), page_limit=take)
+            total = response.get('total', 0)
+            if total > getattr(settings, 'KAIRNIAL_PROJECT_CATALOGUE_MAX', 5000):
+                return None
+            items = response.get('items') or []
+            projects.extend(items)
+            if not items or len(projects) >= total:
+                return projects
+
+    def fetch_page(self, search: str = None, page_offset: int = 0,
+                   page_limit: int = getattr(settings, 'PAGE_SIZE', 100)) -> dict:
+        """
+        Page of projects from Kairnial
+        :param search: Search into project name and description
+        :param page_offset: list projects starting from this index
+        :param page_limit: number of projects
+        """
         logger = logging.getLogger('services')
         url = settings.KAIRNIAL_AUTH_SERVER + PROJECT_LIST_PATH
         data = {
@@ -49,9 +87,6 @@ class KairnialProject(KairnialCrossService):
             'Content-type': 'application/json',
             'Authorization': f'{self.token_type} {self.token}'
         }
-        cache_key = sha1(f'{url}||{json.dumps(headers)}||{data}'.encode('latin1')).hexdigest()
-        if cache.get(cache_key):
-            return cache.get(cache_key)
         logger.debug(url)
         logger.debug(headers)
         logger.debug(data)
@@ -66,20 +101,28 @@ class KairnialProject(KairnialCrossService):
                     f"Fetching from Kairnial backend failed with response {response.status_code}: {response.content}"),
                 status=response.status_code
             )
-        json_response = response.json()
-        cache.set(cache_key, json_response)
-        return json_response
+        return response.json()
+
+    def forget_catalogue(self):
+        """
+        Clear the cached catalogue of the user, once a project is created or updated
+        """
+        user_id = token_subject(self.token, self.client_id)
+        if user_id is not None:
+            ProjectCatalogue.clear(self.client_id, user_id)
 
     def create(self, serialized_project):
         """
         Create a new project
         :param serialized_project: ProjectCreationSerializer validated_data
         """
-        return self.call(
+        output = self.call(
             action='adminEC.registerProject',
             parameters=[serialized_project],
             use_cache=False
         )
+        self.forget_catalogue()
+        return output
 
     def update(self, pk, serialized_update_project):
         """
@@ -88,8 +131,10 @@ class KairnialProject(KairnialCrossService):
         :return:
         """
         serialized_update_project['g_nom'] = pk
-        return self.call(
+        output = self.call(
             action='adminEC.updateProjectInfos',
             parameters=[serialized_update_project],
             use_cache=False
         )
+        self.forget_catalogue()
+        return output
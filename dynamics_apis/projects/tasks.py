@@ -0,0 +1,22 @@
+"""
+Background tasks for Kairnial projects
+"""
+from django.utils.translation import gettext as _
+
+from dynamics_apis.common.jobs import task, Job
+from dynamics_apis.projects.models import Project
+
+
+@task('projects.create', retry=False)
+def create_project(job: Job, token: str, project: dict):
+    """
+    Create a project for the client of the job
+    """
+    created = Project.create(
+        client_id=job.client_id,
+        token=token,
+        serialized_project=project
+    )
+    if not created:
+        raise ValueError(_("Project could not be created"))
+    job.advance({'name': project.get('name'), 'created': created})
@@ -0,0 +1,83 @@
+"""
+Test project serializers and catalogue
+"""
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory
+
+from dynamics_apis.common import jobs
+from .serializers import ProjectSerializer
+from .services import KairnialProject
+
+
+class ProjectionTest(SimpleTestCase):
+    """
+    Test rendering of requested fields only
+    """
+
+    def test_100_unrequested_fields_are_not_computed(self):
+        # infos would fail to decode g_infos
+        projects = [{'g_nom': 'rgoc1', 'g_desc': 'Project', 'g_infos': 'not json'}]
+        self.assertEqual(ProjectSerializer(projects, many=True, fields=['id', 'name', 'unknown']).data,
+                         [{'id': 'rgoc1', 'name': 'Project'}])
+
+
+class ProjectCatalogueTest(SimpleTestCase):
+    """
+    Test the cached project catalogue of a user
+    """
+    projects = [
+        {'g_nom': f'rgoc{i}', 'g_desc': f'Tower {i}', 'g_infos': json.dumps({'DESCOP': 'Offices' if i % 2 else 'Flats'})}
+        for i in range(25)
+    ]
+
+    def post(self, url, headers, data):
+        data = json.loads(data)
+        page = self.projects[data['LIMITSKIP']:data['LIMITSKIP'] + data['LIMITTAKE']]
+        content = {'total': len(self.projects), 'items': page}
+        return mock.Mock(status_code=200, json=lambda: content)
+
+    @override_settings(KAIRNIAL_PROJECT_CATALOGUE_PAGE=10)
+    def test_100_searches_and_pages_are_served_from_the_catalogue(self):
+        service = KairnialProject(client_id='client', token='token')
+        with mock.patch('dynamics_apis.projects.services.token_subject', return_value='user-catalogue'), \
+                mock.patch('requests.post', side_effect=self.post) as post:
+            first = service.list(page_offset=20, page_limit=10)
+            offices = service.list(search='OFFICES', page_offset=0, page_limit=5)
+            towers = service.list(search='tower 1', page_offset=0, page_limit=100)
+        self.assertEqual(post.call_count, 3)
+        self.assertEqual([p['g_nom'] for p in first['items']], [f'rgoc{i}' for i in range(20, 25)])
+        self.assertEqual((offices['total'], len(offices['items'])), (12, 5))
+        self.assertEqual(towers['total'], 11)  # Tower 1 and Tower 10 to 19
+
+    @override_settings(KAIRNIAL_PROJECT_CATALOGUE_MAX=20)
+    def test_101_users_with_many_projects_get_pages(self):
+        service = KairnialProject(client_id='client', token='token')
+        with mock.patch('dynamics_apis.projects.services.token_subject', return_value='user-overflow'), \
+                mock.patch('requests.post', side_effect=self.post) as post:
+            for page_offset in [0, 10]:
+                page = service.list(page_offset=page_offset, page_limit=10)
+                self.assertEqual(page['items'], self.projects[page_offset:page_offset + 10])
+        # the full catalogue is only attempted once
+        self.assertEqual([json.loads(c.kwargs['data'])['LIMITTAKE'] for c in post.call_args_list], [500, 10, 10])
+
+
+class ProjectCreationTest(SimpleTestCase):
+    """
+    Test creation of projects in background
+    """
+
+    def test_100_unregistered_task_is_an_error(self):
+        path = '/client/projects/'
+        request = APIRequestFactory().post(path + '?async=true', {'name': 'Tower'}, format='json')
+        request.token = 'token'
+        request.resolver_match = match = resolve(path)
+        with mock.patch.dict(jobs.TASKS, clear=True), \
+                mock.patch('rest_framework.views.APIView.check_permissions'), \
+                mock.patch('rest_framework.views.APIView.perform_authentication'):
+            response = match.func(request, **match.kwargs)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['description'], 'Unknown task projects.create')
@@ -9,9 +9,11 @@ from drf_spectacular.utils import OpenApiParameter, extend_schema
 from rest_framework import status
 from rest_framework.response import Response
 
-from dynamics_apis.common.serializers import ErrorSerializer
+from dynamics_apis.common import jobs
+from dynamics_apis.common.serializers import ErrorSerializer, JobSerializer
 from dynamics_apis.common.services import KairnialWSServiceError
-from dynamics_apis.common.viewsets import client_parameters, pagination_parameters, PaginatedViewSet, PaginatedResponse
+from dynamics_apis.common.viewsets import client_parameters, pagination_parameters, PaginatedViewSet, PaginatedResponse, \
+    JobResponse, async_parameters, run_in_background, fields_parameters, requested_fields
 from .models import Project
 from .serializers import ProjectSerializer, ProjectCreationSerializer, ProjectUpdateSerializer
 
@@ -25,7 +27,7 @@ class ProjectViewSet(PaginatedViewSet):
         summary=_("List projects"),
         description=_("Get a list of projects associated to current connected user"),
         request=ProjectSerializer,
-        parameters=client_parameters + pagination_parameters + [
+        parameters=client_parameters + pagination_parameters + fields_parameters + [
             OpenApiParameter("search", OpenApiTypes.STR, OpenApiParameter.QUERY,
                              description=_("Search project name containing")),
         ],
@@ -42,7 +44,7 @@ class ProjectViewSet(PaginatedViewSet):
                 page_offset=page_offset,
                 page_limit=page_limit
             )
-            serializer = ProjectSerializer(project_list, many=True)
+            serializer = ProjectSerializer(project_list, many=True, fields=requested_fields(request))
             return PaginatedResponse(
                 total=total,
                 data=serializer.data,
@@ -65,14 +67,33 @@ class ProjectViewSet(PaginatedViewSet):
             OpenApiParameter("client_id", OpenApiTypes.STR, OpenApiParameter.PATH,
                              description=_("Client ID token"),
                              default=os.environ.get('DEFAULT_KAIRNIAL_CLIENT_ID', '')),
-        ],
+        ] + async_parameters,
         request=ProjectCreationSerializer,
-        responses={201: OpenApiTypes.STR, 400: OpenApiTypes.STR, 406: OpenApiTypes.STR},
+        responses={201: OpenApiTypes.STR, 202: JobSerializer, 400: OpenApiTypes.STR, 406: OpenApiTypes.STR},
         methods=["POST"]
     )
     def create(self, request, client_id):
         pcs = ProjectCreationSerializer(data=request.data)
         if pcs.is_valid():
+            if run_in_background(request):
+                try:
+                    job = jobs.enqueue(
+                        'projects.create',
+                        client_id=client_id,
+                        owner=getattr(request.user, 'uuid', None),
+                        total=1,
+                        token=request.token,
+                        project=pcs.validated_data
+                    )
+                except KeyError as e:
+                    # the projects application is not installed, its tasks are not registered
+                    error = ErrorSerializer({
+                        'status': 400,
+                        'description': e.args[0]
+                    })
+                    return Response(error.data, content_type='application/json',
+                                    status=status.HTTP_400_BAD_REQUEST)
+                return JobResponse(job)
             created = Project.create(
                 client_id=client_id,
                 token=request.token,
@@ -6,6 +6,122 @@ KIARNIAL_AUTHENTICATION_SCOPES = [
     'project-list',
     'direct-login'
 ]
+# Kairnial actions sent at most once per API request, other actions reset the request memo
+KAIRNIAL_MEMO_READ_PREFIXES = ('get', 'list', 'search', 'count')
+# Maximum number of concurrent calls to Kairnial Web Services for a single operation
+KAIRNIAL_WS_MAX_WORKERS = 8
+# Number of users sent in each addUserToGroup / removeUserFromGroup call
+KAIRNIAL_GROUP_MEMBERSHIP_BATCH_SIZE = 1
+# Maximum number of invitations sent per minute
+KAIRNIAL_INVITE_RATE = 120
+# Larger invitation batches are sent in background
+KAIRNIAL_INVITE_SYNC_LIMIT = 20
+# Queue of background jobs: local runs them in the web process, redis in run_jobs workers
+# The redis queue requires the redis package and a cache shared between processes
+KAIRNIAL_JOB_QUEUE = 'local'
+KAIRNIAL_JOB_REDIS_URL = 'redis://localhost:6379/0'
+# Number of background jobs run at the same time by each process
+KAIRNIAL_JOB_WORKERS = 2
+# Attempts of a job failing on network or server errors, with a delay in seconds doubled at each retry
+KAIRNIAL_JOB_MAX_ATTEMPTS = 3
+KAIRNIAL_JOB_RETRY_DELAY = 5
+# Lifetime in seconds of background job status and results
+KAIRNIAL_JOB_TIMEOUT = 24 * 3600
+# Lifetime in seconds of the remembered document of each approval
+KAIRNIAL_APPROVAL_INDEX_TIMEOUT = 3600
+# Lifetime in seconds of a cached project folder tree
+KAIRNIAL_FOLDER_TREE_TIMEOUT = 300
+# Lifetime in seconds of a delta sync token
+KAIRNIAL_SYNC_TOKEN_MAX_AGE = 30 * 24 * 3600
+# Lifetime in seconds of cached Kairnial Web Services responses
+KAIRNIAL_WS_CACHE_TIMEOUT = 30
+# Version of cached Web Services responses, part of their cache keys: bump it to drop them all
+KAIRNIAL_WS_CACHE_VERSION = 1
+# Cache warming: actions tracked from live traffic and refreshed by the warm_cache command
+KAIRNIAL_WARMING_ACTIONS = [
+    'getUsers',
+    'getGroups',
+    'getAclGrants',
+    'getModules',
+    'getAllCircuitVisa',
+    'getFlexDossiers',
+]
+# Maximum number of upstream calls per minute made by the warm_cache command
+KAIRNIAL_WARMING_BUDGET = 120
+# Number of hottest calls kept warm
+KAIRNIAL_WARMING_TOP = 50
+# Calls that have not been requested for this many seconds are no longer warmed
+KAIRNIAL_WARMING_IDLE_TIMEOUT = 600
+# Interval in seconds between merges of calls counted by each process
+KAIRNIAL_WARMING_FLUSH_INTERVAL = 10
+
+# Upstream calls made by each GraphQL field, Type.field: calls
+KAIRNIAL_GRAPHQL_COSTS = {
+    'Query.user': 1,
+    'Query.users': 1,
+    'Query.groups': 1,
+    'Query.contacts': 1,
+    'Query.projects': 1,
+    'Project.users': 1,
+    'Project.groups': 1,
+    'Project.contacts': 1,
+}
+# Argument multiplying the cost of the fields selected under a paginated GraphQL field
+KAIRNIAL_GRAPHQL_MULTIPLIERS = {
+    'Query.projects': 'page_limit',
+}
+# Maximum cost of a GraphQL query and cost allowed per minute for each client
+KAIRNIAL_GRAPHQL_MAX_COST = 200
+KAIRNIAL_GRAPHQL_COST_PER_MINUTE = 2000
+# Budgets per client ID, {client_id: {'max_cost': int, 'per_minute': int}}
+KAIRNIAL_GRAPHQL_CLIENT_BUDGETS = {}
+# Over budget GraphQL queries are rejected (reject) or run with smaller pages (degrade)
+KAIRNIAL_GRAPHQL_OVER_BUDGET = 'degrade'
+# Number of parsed and validated GraphQL documents kept by each process
+KAIRNIAL_GRAPHQL_DOCUMENT_CACHE_SIZE = 256
+# Lifetime in seconds of persisted GraphQL queries
+KAIRNIAL_GRAPHQL_PERSISTED_TIMEOUT = 86400
+# Maximum length of persisted GraphQL queries, longer queries must always be sent in full
+KAIRNIAL_GRAPHQL_PERSISTED_MAX_SIZE = 10000
+# Lifetime in seconds of the index of uploaded document contents, used to skip identical uploads
+KAIRNIAL_UPLOAD_INDEX_TIMEOUT = 600
+# Reference the file of an identical content uploaded by the same user instead of uploading it again,
+# only if Kairnial storage accepts the same file UUID in several addFile calls
+KAIRNIAL_UPLOAD_SHARE_BLOBS = False
+# Lifetime in seconds of the folder IDs of the folder paths resolved by a user
+KAIRNIAL_FOLDER_PATH_TIMEOUT = 300
+# Number of document contents opened ahead while a folder archive is streamed
+KAIRNIAL_ARCHIVE_WINDOW = 4
+# Timeout in seconds to connect to and read document contents from storage
+KAIRNIAL_DOWNLOAD_TIMEOUT = 60
+# Web Service action returning the storage URL of a document content, counterpart of prepareFileUpload
+KAIRNIAL_DOWNLOAD_ACTION = 'prepareFileDownload'
+# Actions whose listings are kept as compact records, in cache and in memory
+KAIRNIAL_COMPACT_ACTIONS = ['getUsers', 'getUsersByGroup', 'getItem', 'getFilesFromCat']
+# Cached responses larger than this size in bytes are compressed, None to never compress
+KAIRNIAL_CACHE_COMPRESS_THRESHOLD = 16 * 1024
+# Compression codecs by preference, the first one installed is used (zstd needs zstandard, lz4 needs lz4)
+KAIRNIAL_CACHE_CODECS = ['zstd', 'lz4', 'zlib']
+# Cache the raw bytes of large JSON responses instead of the decoded response
+KAIRNIAL_CACHE_STORE_RAW = False
+# Errors of cached calls are cached to spare a failing upstream, 0 to disable
+# Lifetime in seconds of cached not found errors, by HTTP status
+KAIRNIAL_WS_NOT_FOUND_STATUSES = [400, 404]
+KAIRNIAL_WS_NOT_FOUND_TIMEOUT = 10
+# Lifetime in seconds of cached server errors (5xx and unreachable server)
+KAIRNIAL_WS_ERROR_TIMEOUT = 2
+# Cache-Control directives of list responses by URL name, as keyword arguments of patch_cache_control
+# Responses depend on the access token, they must stay private
+KAIRNIAL_DEFAULT_CACHE_CONTROL = {'private': True, 'no_cache': True}
+KAIRNIAL_CACHE_CONTROL = {
+    'modules-list': {'private': True, 'max_age': 300},
+    'approval_types-list': {'private': True, 'max_age': 60},
+}
+# Lifetime in seconds of the cached catalogue of the projects of a user
+KAIRNIAL_PROJECT_CATALOGUE_TIMEOUT = 300
+# Projects fetched per call to build a catalogue, users with more projects are not cached
+KAIRNIAL_PROJECT_CATALOGUE_PAGE = 500
+KAIRNIAL_PROJECT_CATALOGUE_MAX = 5000
 
 import os
 def load_key(path):
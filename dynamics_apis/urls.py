@@ -22,6 +22,7 @@ from .authorization import urls as authorization_urls
 from .projects import urls as project_urls
 from .documents import urls as document_urls
 from .graphql import urls as graphql_urls
+from .common import urls as common_urls
 
 project_path = '<str:client_id>/<str:project_id>/'
 
@@ -31,9 +32,11 @@ urlpatterns = [
     path('', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     path('<str:client_id>/projects/', include(project_urls)),
+    path('<str:client_id>/', include(common_urls.client_urlpatterns)),
     path(project_path + 'dms/', include(document_urls)),
     path(project_path + 'admin/', include(users_urls)),
     path(project_path + 'admin/', include(authorization_urls)),
+    path(project_path, include(common_urls)),
     path('authentication/', include(authenticate_urls)),
     path('graphql', include(graphql_urls)),
 ]
@@ -1,6 +1,7 @@
 """
 Kairnial user model classes
 """
+from dynamics_apis.common.sync import SyncSession, TombstoneJournal
 from dynamics_apis.users.services.contacts import KairnialContact
 
 
@@ -48,4 +49,65 @@ class Contact:
         Archive a contact
         """
         kc = KairnialContact(client_id=client_id, token=token, project_id=project_id)
-        return kc.delete(pk=pk)
\ No newline at end of file
+        deleted = kc.delete(pk=pk)
+        if deleted:
+            Contact.journal(client_id=client_id, project_id=project_id).record(int(pk))
+        return deleted
+
+    @staticmethod
+    def journal(client_id: str, project_id: str) -> TombstoneJournal:
+        """
+        Journal of contacts and companies archived through this API
+        getItem does not list archived contacts, and archiveEntreprise does not tell their type.
+        """
+        return TombstoneJournal(scope=SyncSession.make_scope(client_id, project_id, 'contacts'))
+
+    @staticmethod
+    def sync(
+            client_id: str,
+            token: str,
+            project_id: str,
+            contact_type: str = 'contact',
+            sync_token: str = None,
+            limit: int = 100
+    ):
+        """
+        Read contacts or companies created, updated or archived since a sync token
+        :param client_id: ClientID Token
+        :param token: Access token
+        :param project_id: Project RGOC Code
+        :param contact_type: contact or entreprise
+        :param sync_token: token returned by the previous sync, None for a full sync
+        :param limit: maximum number of changes to return
+        :return: list of (change type, contact), next sync token, more changes to read
+        :raise InvalidSyncToken:
+        """
+        session = SyncSession.from_token(
+            token=sync_token,
+            scope=SyncSession.make_scope(client_id, project_id, 'contacts', contact_type)
+        )
+
+        def fetch(**filters):
+            # getItem is not paginated, pages are read from the (cached) change list
+            return lambda offset, take: (Contact.list(
+                client_id=client_id,
+                token=token,
+                project_id=project_id,
+                filters=dict(type=contact_type, **filters)
+            ) or [])[offset:offset + take]
+
+        def fetch_archived(offset, take):
+            archived = Contact.journal(client_id=client_id, project_id=project_id).since(since)
+            return [{'contact_id': contact_id} for contact_id in archived[offset:offset + take]]
+
+        since = session.window_start()
+        if since is None:
+            phases = [('created', fetch())]
+        else:
+            phases = [
+                ('created', fetch(created_start=since)),
+                ('updated', fetch(update_start=since)),
+                ('archived', fetch_archived),
+            ]
+        changes, next_session, has_more = session.run(phases=phases, limit=limit)
+        return changes, next_session.to_token(), has_more
\ No newline at end of file
@@ -1,6 +1,7 @@
 """
 Kairnial group model classes
 """
+from dynamics_apis.common.filters import FilterEngine, Contains
 from dynamics_apis.users.services.groups import KairnialGroup
 
 
@@ -10,27 +11,23 @@ class Group:
     """
     name = None
     description = None
-    properties = {
-        'name': 'groups_label',
-        'description': 'groups_description'
-    }
-    filters = ['name', ]
+    filter_engine = FilterEngine(
+        name=Contains('groups_label'),
+    )
 
     def __init__(self, name: str, description: str = ''):
         self.name = name
         self.description = description
 
     @classmethod
-    def list(cls, client_id: str, token: str, project_id: str, filters: dict = {}) -> []:
+    def list(cls, client_id: str, token: str, project_id: str, filters: dict = None) -> []:
         """
         Get a filtered list of groups from web services
+        :param filters: GroupQuerySerializer validated data
         """
         kg = KairnialGroup(client_id=client_id, token=token, project_id=project_id)
         groups = kg.list().get('groups')
-        manual_filters = (set(cls.filters) & set(filters.keys())) or []
-        for m in manual_filters:
-            groups = [g for g in groups if filters.get(m).lower() in g.get(cls.properties[m], '').lower()]
-        return groups
+        return cls.filter_engine.filter(groups, filters)
 
     def create(self, client_id: str, token: str, project_id: str):
         """
@@ -40,7 +37,7 @@ class Group:
         return kg.create(self)
 
     @staticmethod
-    def add_users(client_id: str, token: str, project_id: str, pk: int, user_list: [str]):
+    def add_users(client_id: str, token: str, project_id: str, pk: int, user_list: [str], callback=None):
         """
         Add user to group
         :param client_id: ClientID Token
@@ -48,22 +45,26 @@ class Group:
         :param project_id: Project RGOC Code
         :param pk: Group numeric ID
         :param user_list: List of user numeric ID
+        :param callback: optional callable(user ID, error message or None) called as soon as a user is done
+        :return: dict of user ID: error message or None on success
         """
         kg = KairnialGroup(client_id=client_id, token=token, project_id=project_id)
-        return kg.add_users(group_id=pk, user_list=user_list)
+        return kg.add_users(group_id=pk, user_list=user_list, callback=callback)
 
     @staticmethod
-    def remove_users(client_id: str, token: str, project_id: str, pk: int, user_list: [str]):
+    def remove_users(client_id: str, token: str, project_id: str, pk: int, user_list: [str], callback=None):
         """
-        Add user to group
+        Remove user from group
         :param client_id: ClientID Token
         :param token: Access token
         :param project_id: Project RGOC Code
         :param pk: Group numeric ID
         :param user_list: List of user numeric ID
+        :param callback: optional callable(user ID, error message or None) called as soon as a user is done
+        :return: dict of user ID: error message or None on success
         """
         kg = KairnialGroup(client_id=client_id, token=token, project_id=project_id)
-        return kg.remove_users(group_id=pk, user_list=user_list)
+        return kg.remove_users(group_id=pk, user_list=user_list, callback=callback)
 
     @staticmethod
     def list_authorizations(client_id: str, token: str, project_id: str, pk: str):
@@ -104,3 +105,16 @@ class Group:
         kg = KairnialGroup(client_id=client_id, token=token, project_id=project_id)
         return kg.remove_authorizations(group_id=pk, authorizations=authorizations)
 
+    @staticmethod
+    def apply_authorizations(client_id: str, token: str, project_id: str, changes: [dict], callback=None):
+        """
+        Grant or revoke authorizations on several groups
+        :param client_id: ClientID Token
+        :param token: Access token
+        :param project_id: Project RGOC Code
+        :param changes: GroupAuthorizationMatrixSerializer validated changes
+        :param callback: optional callable receiving each outcome as soon as it is known
+        :return: changes with status (applied, unchanged, failed) and error
+        """
+        kg = KairnialGroup(client_id=client_id, token=token, project_id=project_id)
+        return kg.apply_authorizations(changes=changes, callback=callback)
@@ -1,6 +1,7 @@
 """
 Kairnial user model classes
 """
+from dynamics_apis.common.filters import FilterEngine, Contains, Exact
 from dynamics_apis.users.services.groups import KairnialGroup
 from dynamics_apis.users.services.users import KairnialUser
 
@@ -14,16 +15,23 @@ class User:
     """
     Kairnial user class
     """
+    filter_engine = FilterEngine(
+        account_firstname=Contains('account_firstname'),
+        account_email=Contains('account_email'),
+        account_achive=Exact('account_achive'),
+    )
+
     @classmethod
-    def list(cls, client_id: str, token: str, project_id: str, filters: dict = dict) -> []:
+    def list(cls, client_id: str, token: str, project_id: str, filters: dict = None) -> []:
         """
         Get a list of users for a project
         :param client_id: ClientID Token
         :param token: Access token
         :param project_id: Project RGOC Code
-        :param filters: Dict of filters
+        :param filters: UserQuerySerializer validated data
         :return:
         """
+        filters = filters or {}
         ku = KairnialUser(client_id=client_id, token=token, project_id=project_id)
         if 'groups' in filters:
             try:
@@ -32,12 +40,7 @@ class User:
                 return None
         else:
             users = ku.list().get('items')
-        for key, value in filters.items():
-            if type(value) == str:
-                users = [u for u in users if value.lower() in u.get(key, "").lower()]
-            elif type(value) == bool or type(value) == int:
-                users = [u for u in users if value == u.get(key)]
-        return users
+        return cls.filter_engine.filter(users, filters)
 
     @classmethod
     def count(cls, client_id: str, token: str, project_id: str):
@@ -80,16 +83,18 @@ class User:
         return ku.get_groups(pk=pk)
 
     @classmethod
-    def invite(self, client_id: str, token: str, project_id: str, users: list):
+    def invite(self, client_id: str, token: str, project_id: str, users: list, callback=None):
         """
-        Get a specific user
+        Invite users on the project
         :param client_id: ClientID Token
         :param token: Access token
         :param project_id: Project RGOC Code
         :param users: List of validated UserInviteSerializer
+        :param callback: optional callable receiving each outcome as soon as it is known
+        :return: list of outcomes with email, success, error and invitation
         """
         ku = KairnialUser(client_id=client_id, token=token, project_id=project_id)
-        return ku.invite(users=users)
+        return ku.invite(users=users, callback=callback)
 
     @classmethod
     def archive(self, client_id: str, token: str, project_id: str, pk: str):
@@ -1,9 +1,12 @@
 """
 Contact serializers
 """
+from django.conf import settings
 from django.utils.translation import gettext as _
 from rest_framework import serializers
 
+from dynamics_apis.common.serializers import ProjectionMixin
+
 
 class ContactQuerySerializer(serializers.Serializer):
     """
@@ -64,7 +67,7 @@ class ContactCreatorSerializer(serializers.Serializer):
                                   source='contact_created_by_email')
 
 
-class ContactSerializer(serializers.Serializer):
+class ContactSerializer(ProjectionMixin, serializers.Serializer):
     """
     Serializer for contact list and retrieve
     """
@@ -219,6 +222,69 @@ class ContactSerializer(serializers.Serializer):
     )
 
 
+class ContactSyncQuerySerializer(serializers.Serializer):
+    """
+    Serializer for contact delta sync parameters
+    """
+    type = serializers.ChoiceField(
+        label=_("Type of contact"),
+        help_text=_("Type of contact in contact / company"),
+        choices=['entreprise', 'contact'],
+        default='contact'
+    )
+    sync_token = serializers.CharField(
+        label=_("Sync token"),
+        help_text=_("Token returned by the previous sync, empty to start a full sync"),
+        required=False,
+        allow_blank=True
+    )
+    page_limit = serializers.IntegerField(
+        label=_("Maximum number of changes"),
+        help_text=_("Maximum number of changes returned in one response"),
+        default=getattr(settings, 'PAGE_SIZE', 100),
+        min_value=1
+    )
+
+
+class ContactChangeSerializer(serializers.Serializer):
+    """
+    Serializer for a contact change
+    """
+    change = serializers.ChoiceField(
+        label=_("Type of change"),
+        help_text=_("created, updated or archived. Archived contacts only have an ID"),
+        choices=['created', 'updated', 'archived'],
+        read_only=True
+    )
+    contact = ContactSerializer(
+        label=_("Contact"),
+        help_text=_("Contact or company after the change"),
+        read_only=True
+    )
+
+
+class ContactSyncSerializer(serializers.Serializer):
+    """
+    Serializer for contact delta sync
+    """
+    changes = ContactChangeSerializer(
+        label=_("Changes"),
+        help_text=_("Changes since the sync token, delivered at least once"),
+        many=True,
+        read_only=True
+    )
+    sync_token = serializers.CharField(
+        label=_("Next sync token"),
+        help_text=_("Token to pass to the next sync"),
+        read_only=True
+    )
+    has_more = serializers.BooleanField(
+        label=_("More changes"),
+        help_text=_("Sync again immediately with the new token to read more changes"),
+        read_only=True
+    )
+
+
 class ContactCreationSerializer(serializers.Serializer):
     """
     Serializer for contact creation
@@ -36,6 +36,28 @@ class GroupAddUserSerializer(serializers.Serializer):
                                   child=serializers.IntegerField(),
                                   required=True)
 
+class GroupMembershipFailureSerializer(serializers.Serializer):
+    """
+    Serializer for a user that could not be added or removed
+    """
+    user = serializers.IntegerField(label=_("Numerical user ID"), read_only=True)
+    error = serializers.CharField(label=_("Error returned by Kairnial"), read_only=True)
+
+
+class GroupMembershipReportSerializer(serializers.Serializer):
+    """
+    Serializer for the outcome of a group membership change
+    """
+    succeeded = serializers.ListField(label=_("Users changed"),
+                                      help_text=_("Numerical IDs of the users added or removed"),
+                                      child=serializers.IntegerField(),
+                                      read_only=True)
+    failed = GroupMembershipFailureSerializer(label=_("Users in error"),
+                                              help_text=_("Users that could not be added or removed"),
+                                              many=True,
+                                              read_only=True)
+
+
 class GroupAddAuthorizationSerializer(serializers.Serializer):
     """
     Serializer for user addition or removal to group
@@ -45,6 +67,40 @@ class GroupAddAuthorizationSerializer(serializers.Serializer):
                                   required=True)
 
 
+class GroupAuthorizationChangeSerializer(serializers.Serializer):
+    """
+    Serializer for one cell of a group authorization matrix
+    """
+    group = serializers.UUIDField(label=_("UUID of the group"))
+    authorization = serializers.UUIDField(label=_("UUID of the authorization"))
+    type = serializers.CharField(label=_("Type of authorization"),
+                                 help_text=_("Type of the authorization, e.g. bim:pins"))
+    grant = serializers.BooleanField(label=_("Grant authorization"),
+                                     help_text=_("True to grant the authorization, false to revoke it"),
+                                     default=True)
+
+
+class GroupAuthorizationMatrixSerializer(serializers.Serializer):
+    """
+    Serializer for bulk authorization changes on groups
+    """
+    changes = GroupAuthorizationChangeSerializer(label=_("Authorization changes"),
+                                                 help_text=_("List of group / authorization changes"),
+                                                 many=True,
+                                                 allow_empty=False)
+
+
+class GroupAuthorizationOutcomeSerializer(GroupAuthorizationChangeSerializer):
+    """
+    Serializer for the outcome of one cell of a group authorization matrix
+    """
+    status = serializers.ChoiceField(label=_("Outcome"),
+                                     help_text=_("applied, unchanged if already in the requested state, or failed"),
+                                     choices=['applied', 'unchanged', 'failed'],
+                                     read_only=True)
+    error = serializers.CharField(label=_("Error returned by Kairnial"), allow_null=True, read_only=True)
+
+
 class GroupCreationSerializer(serializers.Serializer):
     """
     Serializer for group creation
@@ -1,7 +1,10 @@
 """
 Call to Kairnial Group Web Services
 """
+from django.conf import settings
+from django.utils.translation import gettext as _
 
+from dynamics_apis.common.concurrency import concurrent_outcomes, error_message
 from dynamics_apis.common.services import KairnialWSService
 
 
@@ -33,44 +36,113 @@ class KairnialGroup(KairnialWSService):
             use_cache=False
         )
 
-    def add_users(self, group_id: int, user_list: [int]):
+    def _change_membership(self, action: str, group_id: int, user_list: [int], callback=None) -> dict:
         """
-        Add a list of users to a group
+        Add or remove users concurrently
+        Users are packed by KAIRNIAL_GROUP_MEMBERSHIP_BATCH_SIZE in each call,
+        a refused batch is retried user by user to find out which users failed.
+        :param action: addUserToGroup or removeUserFromGroup
+        :param callback: optional callable(user ID, error message or None) called as soon as a user is done
+        :return: dict of user ID: error message or None on success, in the order of user_list
         """
-        no_error = True
-        for user in user_list:
-            resp = self.call(
-                action='addUserToGroup',
-                parameters=[{'groupe': group_id, 'user': [user, ]}],
+        user_list = list(dict.fromkeys(user_list))
+        size = max(1, getattr(settings, 'KAIRNIAL_GROUP_MEMBERSHIP_BATCH_SIZE', 1))
+        batches = [user_list[i:i + size] for i in range(0, len(user_list), size)]
+
+        def change(users):
+            return self.call(
+                action=action,
+                parameters=[{'groupe': group_id, 'user': users}],
                 format='bool',
                 use_cache=False)
-            no_error &= resp
-        return no_error
 
-    def remove_users(self, group_id: int, user_list: [int]):
+        outcomes = {}
+
+        def settle(retries, users, done, error):
+            if done:
+                settled = {user: None for user in users}
+            elif len(users) > 1:
+                retries += [[user] for user in users]
+                return
+            else:
+                settled = {users[0]: error_message(error) if error else _('Refused by Kairnial')}
+            outcomes.update(settled)
+            if callback:
+                for user, message in settled.items():
+                    callback(user, message)
+
+        while batches:
+            retries = []
+            concurrent_outcomes(change, batches, callback=lambda *outcome: settle(retries, *outcome))
+            batches = retries
+        return {user: outcomes[user] for user in user_list}
+
+    def add_users(self, group_id: int, user_list: [int], callback=None) -> dict:
         """
         Add a list of users to a group
+        :param callback: optional callable(user ID, error message or None) called as soon as a user is done
+        :return: dict of user ID: error message or None on success
         """
-        no_error = True
-        for user in user_list:
-            resp = self.call(
-                action='removeUserFromGroup',
-                parameters=[{'groupe': group_id, 'user': [user, ]}],
-                format='bool',
-                use_cache=False)
-            no_error &= resp
-        return no_error
+        return self._change_membership(action='addUserToGroup', group_id=group_id, user_list=user_list,
+                                       callback=callback)
+
+    def remove_users(self, group_id: int, user_list: [int], callback=None) -> dict:
+        """
+        Remove a list of users from a group
+        :param callback: optional callable(user ID, error message or None) called as soon as a user is done
+        :return: dict of user ID: error message or None on success
+        """
+        return self._change_membership(action='removeUserFromGroup', group_id=group_id, user_list=user_list,
+                                       callback=callback)
 
-    def list_authorizations(self, group_id: str):
+    def list_authorizations(self, group_id: str, use_cache: bool = True):
         """
         Displays the list of rights attached to this group
+        :param group_id: UUID of the group
+        :param use_cache: serve the list from cache
         """
         return self.call(
             service='aclmanager',
             action='getGroupsAcls',
             parameters=[{'group_uuid': group_id}],
             format='json',
-            use_cache=True)
+            use_cache=use_cache)
+
+    @staticmethod
+    def granted_authorizations(group_acls: dict) -> set:
+        """
+        UUIDs of the authorizations granted in a getGroupsAcls response
+        """
+        granted = set()
+        for link in (group_acls or {}).get('acl_links') or []:
+            if isinstance(link, dict):
+                link = link.get('acl_id') or link.get('uuid')
+            if link:
+                granted.add(str(link))
+        return granted
+
+    def change_authorization(self, group_id: str, authorization_uuid: str, authorization_name: str,
+                             grant: bool = True) -> bool:
+        """
+        Grant or revoke one authorization on a group
+        :param group_id: UUID of the group
+        :param authorization_uuid: UUID of the authorization
+        :param authorization_name: type of the authorization
+        :param grant: True to grant, False to revoke
+        """
+        resp = self.call(
+            service='aclmanager',
+            action='addAclGrant' if grant else 'removeRigthToGroup',
+            parameters=[
+                {
+                    'item_type': 'group',
+                    'item_uuid': group_id,
+                    'acl_id': authorization_uuid,
+                    'acl_type': authorization_name
+                }],
+            format='json',
+            use_cache=False)
+        return bool(resp.get('success', False))
 
     def add_authorizations(self, group_id: str, authorizations: dict):
         """
@@ -78,42 +150,72 @@ class KairnialGroup(KairnialWSService):
         :param group_id: UUID of the group
         :param authorizations: dict with authorization uuid:type
         """
-        no_error = True
-        for authorization_uuid, authorization_name in authorizations.items():
-            resp = self.call(
-                service='aclmanager',
-                action='addAclGrant',
-                parameters=[
-                    {
-                        'item_type': 'group',
-                        'item_uuid': group_id,
-                        'acl_id': authorization_uuid,
-                        'acl_type': authorization_name
-                    }],
-                format='json',
-                use_cache=False)
-            no_error &= resp.get('success', False)
-        return no_error
+        return all(
+            done and not error for _item, done, error in concurrent_outcomes(
+                lambda item: self.change_authorization(group_id, *item, grant=True),
+                authorizations.items()
+            )
+        )
 
     def remove_authorizations(self, group_id: str, authorizations: dict):
         """
-        Add a list of authorizations to a group
+        Remove a list of authorizations from a group
         :param group_id: UUID of the group
         :param authorizations: dict with authorization uuid:type
         """
-        no_error = True
-        for authorization_uuid, authorization_name in authorizations.items():
-            resp = self.call(
-                service='aclmanager',
-                action='removeRigthToGroup',
-                parameters=[
-                    {
-                        'item_type': 'group',
-                        'item_uuid': group_id,
-                        'acl_id': authorization_uuid,
-                        'acl_type': authorization_name
-                    }],
-                format='json',
-                use_cache=False)
-            no_error &= resp.get('success', False)
-        return no_error
+        return all(
+            done and not error for _item, done, error in concurrent_outcomes(
+                lambda item: self.change_authorization(group_id, *item, grant=False),
+                authorizations.items()
+            )
+        )
+
+    def apply_authorizations(self, changes: [dict], callback=None) -> [dict]:
+        """
+        Apply a matrix of authorization changes on groups
+        Current authorizations of each group are read first, changes that would not
+        modify anything are skipped. Other changes are applied concurrently.
+        :param changes: list of dict with group (UUID), authorization (UUID), type and grant
+        :param callback: optional callable receiving each outcome as soon as it is known
+        :return: changes in the same order, with status (applied, unchanged, failed) and error
+        """
+        group_ids = list(dict.fromkeys(str(change['group']) for change in changes))
+        current = {
+            group_id: (self.granted_authorizations(group_acls), error)
+            for group_id, group_acls, error in concurrent_outcomes(
+                lambda group_id: self.list_authorizations(group_id=group_id, use_cache=False),
+                group_ids
+            )
+        }
+        outcomes = []
+        pending = []
+        for change in changes:
+            granted, error = current[str(change['group'])]
+            outcome = dict(change, status='unchanged', error=None)
+            outcomes.append(outcome)
+            if error:
+                outcome.update(status='failed', error=error_message(error))
+            elif (str(change['authorization']) in granted) != change['grant']:
+                pending.append(outcome)
+                continue
+            if callback:
+                callback(outcome)
+
+        def apply(outcome):
+            return self.change_authorization(
+                group_id=str(outcome['group']),
+                authorization_uuid=str(outcome['authorization']),
+                authorization_name=outcome['type'],
+                grant=outcome['grant']
+            )
+
+        def settle(outcome, done, error):
+            if done and not error:
+                outcome['status'] = 'applied'
+            else:
+                outcome.update(status='failed', error=error_message(error) if error else _('Refused by Kairnial'))
+            if callback:
+                callback(outcome)
+
+        concurrent_outcomes(apply, pending, callback=settle)
+        return outcomes
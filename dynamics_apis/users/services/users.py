@@ -1,8 +1,17 @@
 """
 Call to Kairnial Web Services
 """
+from django.conf import settings
+
+from dynamics_apis.common.concurrency import RateLimiter, concurrent_outcomes, error_message
 from dynamics_apis.common.services import KairnialWSService
 
+# Shared by all invitations of the process so that concurrent batches keep within the rate
+invite_limiter = RateLimiter(
+    per_minute=getattr(settings, 'KAIRNIAL_INVITE_RATE', 120),
+    burst=getattr(settings, 'KAIRNIAL_WS_MAX_WORKERS', 8)
+)
+
 
 class KairnialUser(KairnialWSService):
     """
@@ -56,23 +65,38 @@ class KairnialUser(KairnialWSService):
             use_cache=True
         )
 
-    def invite(self, users: []):
+    def invite(self, users: [], callback=None) -> [dict]:
         """
-        Invite now users
+        Invite now users, concurrently within KAIRNIAL_INVITE_RATE invitations per minute
         :param users: list of UserInviteSerializer validated_data
-        :return:
+        :param callback: optional callable receiving each outcome as soon as it is known
+        :return: list of outcomes with email, success, error and the inviteUser response
         """
-        invited_users = []
-        for user in users:
-            response = self.call(
+
+        def invite_user(user):
+            invite_limiter.acquire()
+            return self.call(
                 service='aclmanager',
                 action='inviteUser',
                 parameters=[user],
                 use_cache=False
             )
-            if response.get('success'):
-                invited_users.append(response)
-        return invited_users
+
+        def outcome(user, response, error):
+            return {
+                'email': user.get('email'),
+                'success': bool(response and response.get('success')),
+                'error': error_message(error) if error else None,
+                'invitation': response
+            }
+
+        return [
+            outcome(*result) for result in concurrent_outcomes(
+                invite_user,
+                users,
+                callback=(lambda *result: callback(outcome(*result))) if callback else None
+            )
+        ]
 
     def archive(self, pk: str):
         """
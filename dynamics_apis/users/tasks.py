@@ -0,0 +1,50 @@
+"""
+Background tasks for Kairnial users and groups
+"""
+from dynamics_apis.common.jobs import task, Job
+from dynamics_apis.users.models.groups import Group
+from dynamics_apis.users.models.users import User
+
+
+@task('users.invite', retry=False)
+def invite_users(job: Job, token: str, users: list):
+    """
+    Invite users on the project of the job, recording the outcome of each invitation
+    """
+    User.invite(
+        client_id=job.client_id,
+        token=token,
+        project_id=job.project_id,
+        users=users,
+        callback=job.advance
+    )
+
+
+@task('groups.membership')
+def change_group_membership(job: Job, token: str, pk: int, users: list, add: bool = True):
+    """
+    Add or remove users of a group, recording the outcome of each user
+    """
+    change = Group.add_users if add else Group.remove_users
+    change(
+        client_id=job.client_id,
+        token=token,
+        project_id=job.project_id,
+        pk=pk,
+        user_list=users,
+        callback=lambda user, error: job.advance({'user': user, 'error': error})
+    )
+
+
+@task('groups.authorizations')
+def apply_group_authorizations(job: Job, token: str, changes: list):
+    """
+    Apply a matrix of authorization changes, recording the outcome of each change
+    """
+    Group.apply_authorizations(
+        client_id=job.client_id,
+        token=token,
+        project_id=job.project_id,
+        changes=changes,
+        callback=job.advance
+    )
@@ -2,10 +2,18 @@ import json
 import random
 import string
 import uuid
+from unittest import mock
 
+from django.test import SimpleTestCase, override_settings
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory
+
+from dynamics_apis.common.services import KairnialWSServiceError
 from dynamics_apis.common.tests import CommonTest, KairnialClient
 from .serializers.groups import GroupSerializer
 from .serializers.users import UserUUIDSerializer, UserInviteResponseSerializer
+from .models.users import User
+from .services.groups import KairnialGroup
 
 
 class UserTest(CommonTest):
@@ -216,3 +224,99 @@ class GroupTest(CommonTest):
             }),
             content_type='application/json')
         self.assertEqual(resp.status_code, 201)
+
+
+@override_settings(KAIRNIAL_GROUP_MEMBERSHIP_BATCH_SIZE=2)
+class GroupMembershipTest(SimpleTestCase):
+    """
+    Test batched changes of group members
+    """
+
+    def test_100_refused_batches_are_retried_user_by_user(self):
+        batches = []
+
+        def call(action, parameters, **kwargs):
+            users = parameters[0]['user']
+            batches.append(users)
+            if 4 in users and len(users) == 1:
+                raise KairnialWSServiceError(message='unknown user', status=404)
+            return 3 not in users and 4 not in users
+
+        callback = mock.Mock()
+        group = KairnialGroup(client_id='c', token='t', project_id='p')
+        with mock.patch.object(KairnialGroup, 'call', side_effect=call):
+            outcomes = group.add_users(group_id=1, user_list=[1, 2, 3, 4, 1], callback=callback)
+        self.assertEqual(outcomes, {1: None, 2: None, 3: 'Refused by Kairnial', 4: 'unknown user'})
+        self.assertEqual(sorted(batches), [[1, 2], [3], [3, 4], [4]])
+        self.assertEqual(callback.call_count, 4)
+
+
+class GroupAuthorizationMatrixTest(SimpleTestCase):
+    """
+    Test application of authorization changes on groups
+    """
+
+    def test_100_only_changes_are_applied(self):
+        acls = {'g1': {'acl_links': [{'acl_id': 'a1'}]}, 'g2': {'acl_links': ['a1']}}
+
+        def list_authorizations(group_id, use_cache):
+            if group_id == 'g3':
+                raise KairnialWSServiceError(message='unknown group', status=404)
+            return acls[group_id]
+
+        def change_authorization(group_id, authorization_uuid, authorization_name, grant):
+            return group_id == 'g1'
+
+        changes = [
+            {'group': 'g1', 'authorization': 'a1', 'type': 't', 'grant': True},
+            {'group': 'g1', 'authorization': 'a1', 'type': 't', 'grant': False},
+            {'group': 'g2', 'authorization': 'a2', 'type': 't', 'grant': True},
+            {'group': 'g3', 'authorization': 'a1', 'type': 't', 'grant': True},
+        ]
+        group = KairnialGroup(client_id='c', token='t', project_id='p')
+        with mock.patch.object(KairnialGroup, 'list_authorizations', side_effect=list_authorizations), \
+                mock.patch.object(KairnialGroup, 'change_authorization', side_effect=change_authorization) as change:
+            outcomes = group.apply_authorizations(changes)
+        self.assertEqual([(o['status'], o['error']) for o in outcomes], [
+            ('unchanged', None), ('applied', None), ('failed', 'Refused by Kairnial'), ('failed', 'unknown group')
+        ])
+        self.assertEqual(change.call_count, 2)
+
+
+class UserInviteTest(SimpleTestCase):
+    """
+    Test switch of large invitations to background jobs
+    """
+    users = [{'email': 'one@example.com', 'language': 'en'}, {'email': 'two@example.com', 'language': 'fr'}]
+
+    def post(self, users: [dict]):
+        path = '/client/project/admin/users/'
+        request = APIRequestFactory().post(path, {'users': users}, format='json')
+        request.token = 'token'
+        request.resolver_match = match = resolve(path)
+        with mock.patch('rest_framework.views.APIView.check_permissions'), \
+                mock.patch('rest_framework.views.APIView.perform_authentication'):
+            return match.func(request, **match.kwargs)
+
+    def test_100_small_batches_are_invited_now(self):
+        outcomes = [{'success': True, 'invitation': {
+            'needsAdminConfirmation': False, 'alreadyInvited': False, 'emailSent': True,
+            'userHasBeenCreated': True, 'needToCreateUser': False,
+            'user': {'_unique_identifier': str(uuid.uuid4()), '_email': user['email'], '_firstName': 'First',
+                     '_lastName': 'Last', '_account_expires': False, '_archive': False}
+        }} for user in self.users]
+        with mock.patch.object(User, 'invite', return_value=outcomes) as invite:
+            response = self.post(self.users)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(invite.call_count, 1)
+        self.assertEqual([user['user']['email'] for user in response.data], ['one@example.com', 'two@example.com'])
+
+    @override_settings(KAIRNIAL_INVITE_SYNC_LIMIT=1)
+    def test_101_large_batches_are_invited_in_background(self):
+        with mock.patch.object(User, 'invite') as invite, \
+                mock.patch('dynamics_apis.common.jobs.get_queue') as get_queue:
+            response = self.post(self.users)
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(invite.called)
+        job_id, parameters = get_queue.return_value.push.call_args.args
+        self.assertEqual([user['email'] for user in parameters['users']], ['one@example.com', 'two@example.com'])
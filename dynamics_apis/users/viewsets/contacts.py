@@ -7,6 +7,7 @@ from django.utils.translation import gettext as _
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
@@ -14,10 +15,11 @@ from dynamics_apis.common.serializers import ErrorSerializer
 from dynamics_apis.users.models.contacts import Contact
 from dynamics_apis.users.serializers.users import ProjectMemberSerializer
 from dynamics_apis.users.serializers.contacts import ContactQuerySerializer, ContactSerializer, \
-    ContactCreationSerializer, ContactUpdateSerializer
+    ContactCreationSerializer, ContactUpdateSerializer, ContactSyncQuerySerializer, ContactSyncSerializer
 # Create your views here.
 from dynamics_apis.common.services import KairnialWSServiceError
-from dynamics_apis.common.viewsets import project_parameters
+from dynamics_apis.common.sync import InvalidSyncToken
+from dynamics_apis.common.viewsets import project_parameters, fields_parameters, requested_fields
 
 
 class ContactViewSet(ViewSet):
@@ -28,7 +30,7 @@ class ContactViewSet(ViewSet):
     @extend_schema(
         summary=_("List Kairnial contacts"),
         description=_("List Kairnial contacts or companies on the project"),
-        parameters=project_parameters + [
+        parameters=project_parameters + fields_parameters + [
             ContactQuerySerializer,  # serializer fields are converted to parameters
         ],
         responses={200: ContactSerializer, 500: ErrorSerializer},
@@ -47,7 +49,7 @@ class ContactViewSet(ViewSet):
                 project_id=project_id,
                 filters=filters
             )
-            serializer = ContactSerializer(contact_list, many=True)
+            serializer = ContactSerializer(contact_list, many=True, fields=requested_fields(request))
             return Response(serializer.data, content_type="application/json")
         except (KairnialWSServiceError, KeyError, AttributeError) as e:
             error = ErrorSerializer({
@@ -58,6 +60,50 @@ class ContactViewSet(ViewSet):
             return Response(error.data, content_type='application/json',
                             status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        summary=_("Synchronize Kairnial contacts"),
+        description=_("List contacts or companies created, updated or archived since a sync token. "
+                      "Without token, all contacts are returned, followed by a token for the next sync."),
+        parameters=project_parameters + [ContactSyncQuerySerializer],
+        responses={200: ContactSyncSerializer, 400: ErrorSerializer},
+        methods=["GET"]
+    )
+    @action(['GET'], detail=False, url_path='sync', url_name="contact_sync")
+    def sync(self, request, client_id: str, project_id: str):
+        """
+        Delta sync of contacts or companies
+        :param request: HTTPRequest
+        :param client_id: ID of the client
+        :param project_id: ID of the project
+        """
+        csqs = ContactSyncQuerySerializer(data=request.GET)
+        if not csqs.is_valid():
+            return Response(csqs.errors, content_type='application/json',
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            changes, sync_token, has_more = Contact.sync(
+                client_id=client_id,
+                token=request.token,
+                project_id=project_id,
+                contact_type=csqs.validated_data.get('type'),
+                sync_token=csqs.validated_data.get('sync_token'),
+                limit=csqs.validated_data.get('page_limit')
+            )
+        except (KairnialWSServiceError, InvalidSyncToken) as e:
+            error = ErrorSerializer({
+                'status': 400,
+                'code': getattr(e, 'status', 0),
+                'description': getattr(e, 'message', str(e))
+            })
+            return Response(error.data, content_type='application/json',
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = ContactSyncSerializer({
+            'changes': [{'change': change, 'contact': contact} for change, contact in changes],
+            'sync_token': sync_token,
+            'has_more': has_more
+        })
+        return Response(serializer.data, content_type='application/json', status=status.HTTP_200_OK)
+
     @extend_schema(
         summary=_("Create a Kairnial contact"),
         description=_("Create a new contact or company on the project"),
@@ -10,13 +10,16 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
-from dynamics_apis.common.serializers import ErrorSerializer
+from dynamics_apis.common import jobs
+from dynamics_apis.common.serializers import ErrorSerializer, JobSerializer
 from dynamics_apis.users.models.groups import Group
 from dynamics_apis.users.serializers.groups import GroupSerializer, GroupQuerySerializer, GroupCreationSerializer, \
-    GroupAddUserSerializer, RightSerializer, GroupAddAuthorizationSerializer
+    GroupAddUserSerializer, RightSerializer, GroupAddAuthorizationSerializer, GroupMembershipReportSerializer, \
+    GroupAuthorizationMatrixSerializer, GroupAuthorizationOutcomeSerializer
 # Create your views here.
 from dynamics_apis.common.services import KairnialWSServiceError
-from dynamics_apis.common.viewsets import project_parameters
+from dynamics_apis.common.viewsets import project_parameters, BulkResponse, JobResponse, async_parameters, \
+    run_in_background, not_modified, upstream_etag, with_validators
 
 
 add_authorization_example = OpenApiExample(
@@ -33,6 +36,17 @@ class GroupViewSet(ViewSet):
     A ViewSet for listing or retrieving groups.
     """
 
+    @staticmethod
+    def membership_response(outcomes: dict):
+        """
+        Report users added or removed and users in error
+        :param outcomes: dict of user ID: error message or None on success
+        """
+        succeeded = [user for user, error in outcomes.items() if error is None]
+        failed = [{'user': user, 'error': error} for user, error in outcomes.items() if error is not None]
+        serializer = GroupMembershipReportSerializer({'succeeded': succeeded, 'failed': failed})
+        return BulkResponse(serializer.data, succeeded=len(succeeded), failed=len(failed))
+
     @extend_schema(
         summary=_("List of Kairnial groups"),
         description=_("List Kairnial groups defined on the project"),
@@ -49,15 +63,21 @@ class GroupViewSet(ViewSet):
         :param client_id: ID of the client
         :param project_id: ID of the project
         """
+        gqs = GroupQuerySerializer(data=request.GET)
+        gqs.is_valid()
         try:
             group_list = Group.list(
                 client_id=client_id,
                 token=request.token,
                 project_id=project_id,
-                filters=request.GET
+                filters=gqs.validated_data
             )
+            etag = upstream_etag(request)
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
             serializer = GroupSerializer(group_list, many=True)
-            return Response(serializer.data, content_type="application/json")
+            return with_validators(request, Response(serializer.data, content_type="application/json"), etag)
         except (KairnialWSServiceError, KeyError) as e:
             error = ErrorSerializer({
                 'status': 400,
@@ -133,13 +153,14 @@ class GroupViewSet(ViewSet):
 
     @extend_schema(
         summary=_("Add users to a group"),
-        description=_("Add an existing project user to the group"),
+        description=_("Add existing project users to the group, with outcome per user"),
         parameters= project_parameters + [
             OpenApiParameter("id", OpenApiTypes.INT, OpenApiParameter.PATH,
                              description=_("Numeric ID of the group")),
-        ],
+        ] + async_parameters,
         request=GroupAddUserSerializer,
-        responses={201: OpenApiTypes.STR, 400: OpenApiTypes.STR, 406: OpenApiTypes.STR},
+        responses={201: GroupMembershipReportSerializer, 202: JobSerializer, 207: GroupMembershipReportSerializer,
+                   400: GroupMembershipReportSerializer},
         methods=["POST"]
     )
     @action(['POST'], detail=True, url_path='users/add', url_name="add_users_to_group")
@@ -151,73 +172,86 @@ class GroupViewSet(ViewSet):
         :param project_id: ID of the project
         :param pk: ID of the group
         """
-        try:
-            user_list = map(int, request.data.get('users'))
-            resp = Group.add_users(
-                client_id=client_id,
-                token=request.token,
-                project_id=project_id,
-                pk=pk,
-                user_list=user_list)
-            if not resp:
-                error = ErrorSerializer({
-                    'status': 400,
-                    'code': 0,
-                    'description': _("Not all users could be added to group")
-                })
-                return Response(error.data, content_type="application/json", status=status.HTTP_400_BAD_REQUEST)
-            return Response(_("Users added to group"), status=status.HTTP_201_CREATED)
-        except ValueError as e:
+        gaus = GroupAddUserSerializer(data=request.data)
+        if not gaus.is_valid():
             error = ErrorSerializer({
                 'status': 400,
-                'code': getattr(e, 'status', 0),
+                'code': 0,
                 'description': _("Invalid user IDs")
             })
             return Response(error.data, content_type="application/json", status=status.HTTP_400_BAD_REQUEST)
+        users = gaus.validated_data.get('users')
+        if run_in_background(request):
+            job = jobs.enqueue(
+                'groups.membership',
+                client_id=client_id,
+                project_id=project_id,
+                owner=getattr(request.user, 'uuid', None),
+                total=len(set(users)),
+                token=request.token,
+                pk=pk,
+                users=users,
+                add=True
+            )
+            return JobResponse(job)
+        outcomes = Group.add_users(
+            client_id=client_id,
+            token=request.token,
+            project_id=project_id,
+            pk=pk,
+            user_list=users)
+        return self.membership_response(outcomes)
 
     @extend_schema(
         summary=_("Remove users from a group"),
-        description=_("Remove a project user from the group"),
+        description=_("Remove project users from the group, with outcome per user"),
         parameters= project_parameters + [
             OpenApiParameter("id", OpenApiTypes.INT, OpenApiParameter.PATH,
                              description=_("Numeric ID of the group")),
-        ],
+        ] + async_parameters,
         request=GroupAddUserSerializer,
-        responses={201: OpenApiTypes.STR, 400: OpenApiTypes.STR, 406: OpenApiTypes.STR},
+        responses={201: GroupMembershipReportSerializer, 202: JobSerializer, 207: GroupMembershipReportSerializer,
+                   400: GroupMembershipReportSerializer},
         methods=["POST"]
     )
     @action(['POST'], detail=True, url_path='users/remove', url_name="remove_users_from_group")
     def remove_users(self, request,  client_id: str, project_id: str, pk):
         """
-        Remove a list of users to a group
+        Remove a list of users from a group
         :param request: HTTPRequest
         :param client_id: ID of the client
         :param project_id: ID of the project
         :param pk: ID of the group
         """
-        try:
-            user_list = map(int, request.data.get('users'))
-            resp = Group.remove_users(
-                client_id=client_id,
-                token=request.token,
-                project_id=project_id,
-                pk=pk,
-                user_list=user_list)
-            if not resp:
-                error = ErrorSerializer({
-                    'status': 400,
-                    'code': 0,
-                    'description': _("Not all users could be removed from group")
-                })
-                return Response(error.data, content_type="application/json", status=status.HTTP_400_BAD_REQUEST)
-            return Response(_("Users removed from group"), status=status.HTTP_201_CREATED)
-        except ValueError as e:
+        gaus = GroupAddUserSerializer(data=request.data)
+        if not gaus.is_valid():
             error = ErrorSerializer({
                 'status': 400,
-                'code': getattr(e, 'status', 0),
+                'code': 0,
                 'description': _("Invalid user IDs")
             })
             return Response(error.data, content_type="application/json", status=status.HTTP_400_BAD_REQUEST)
+        users = gaus.validated_data.get('users')
+        if run_in_background(request):
+            job = jobs.enqueue(
+                'groups.membership',
+                client_id=client_id,
+                project_id=project_id,
+                owner=getattr(request.user, 'uuid', None),
+                total=len(set(users)),
+                token=request.token,
+                pk=pk,
+                users=users,
+                add=False
+            )
+            return JobResponse(job)
+        outcomes = Group.remove_users(
+            client_id=client_id,
+            token=request.token,
+            project_id=project_id,
+            pk=pk,
+            user_list=users)
+        return self.membership_response(outcomes)
 
     @extend_schema(
         summary=_("List authorizations for group"),
@@ -256,6 +290,50 @@ class GroupViewSet(ViewSet):
             return Response(error.data, content_type='application/json',
                             status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        summary=_("Change authorizations of several groups"),
+        description=_("Grant or revoke a matrix of authorizations on groups. "
+                      "Changes that would not modify the current authorizations are skipped."),
+        parameters=project_parameters + async_parameters,
+        request=GroupAuthorizationMatrixSerializer,
+        responses={201: GroupAuthorizationOutcomeSerializer(many=True),
+                   202: JobSerializer,
+                   207: GroupAuthorizationOutcomeSerializer(many=True),
+                   400: GroupAuthorizationOutcomeSerializer(many=True)},
+        methods=["POST"]
+    )
+    @action(['POST'], detail=False, url_path='authorizations', url_name="change_group_authorizations")
+    def change_authorizations(self, request, client_id: str, project_id: str):
+        """
+        Apply a matrix of authorization changes on groups
+        :param request: HTTPRequest
+        :param client_id: ID of the client
+        :param project_id: ID of the project
+        """
+        gams = GroupAuthorizationMatrixSerializer(data=request.data)
+        if not gams.is_valid():
+            return Response(gams.errors, content_type='application/json', status=status.HTTP_400_BAD_REQUEST)
+        changes = gams.validated_data.get('changes')
+        if run_in_background(request):
+            job = jobs.enqueue(
+                'groups.authorizations',
+                client_id=client_id,
+                project_id=project_id,
+                owner=getattr(request.user, 'uuid', None),
+                total=len(changes),
+                token=request.token,
+                changes=changes
+            )
+            return JobResponse(job)
+        outcomes = Group.apply_authorizations(
+            client_id=client_id,
+            token=request.token,
+            project_id=project_id,
+            changes=changes)
+        serializer = GroupAuthorizationOutcomeSerializer(outcomes, many=True)
+        failed = len([outcome for outcome in outcomes if outcome['status'] == 'failed'])
+        return BulkResponse(serializer.data, succeeded=len(outcomes) - failed, failed=failed)
+
     @extend_schema(
         summary=_("Add authorization to a group"),
         description=_("Add a new authorizations to a group"),
@@ -11,8 +11,12 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
-from dynamics_apis.common.viewsets import project_parameters
-from dynamics_apis.common.serializers import ErrorSerializer
+from django.conf import settings
+
+from dynamics_apis.common import jobs
+from dynamics_apis.common.viewsets import project_parameters, JobResponse, run_in_background, not_modified, \
+    upstream_etag, with_validators
+from dynamics_apis.common.serializers import ErrorSerializer, JobSerializer
 from dynamics_apis.users.models.users import User, UserNotFound
 from dynamics_apis.users.serializers.users import UserSerializer, UserCreationSerializer, UserQuerySerializer, \
     ProjectMemberSerializer, ProjectMemberCountSerializer, UserGroupSerializer, UserInviteSerializer, \
@@ -52,8 +56,12 @@ class UserViewSet(ViewSet):
                 project_id=project_id,
                 filters=serializer.validated_data
             )
+            etag = upstream_etag(request)
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
             serializer = UserUUIDSerializer(user_list, many=True)
-            return Response(serializer.data, content_type="application/json")
+            return with_validators(request, Response(serializer.data, content_type="application/json"), etag)
         except (KairnialWSServiceError, KeyError, AttributeError) as e:
             error = ErrorSerializer({
                 'status': 400,
@@ -209,13 +217,16 @@ class UserViewSet(ViewSet):
         summary=_("Imvite new users"),
         description=_("Invite new users into project"),
         request=UserMultiInviteSerializer,
-        parameters=project_parameters,
-        responses={200: [UserInviteResponseSerializer], 400: ErrorSerializer},
+        parameters=project_parameters + [
+            OpenApiParameter("async", OpenApiTypes.BOOL, OpenApiParameter.QUERY, required=False,
+                             description=_("Invite users in background. Large batches always are")),
+        ],
+        responses={200: [UserInviteResponseSerializer], 202: JobSerializer, 400: ErrorSerializer},
         methods=["POST"]
     )
     def create(self, request, client_id, project_id):
         """
-
+        Invite users, in background for large batches
         :param request:
         :param client_id: Client ID token
         :param project_id: Project RGOC ID
@@ -225,13 +236,27 @@ class UserViewSet(ViewSet):
         if not user_list.is_valid():
             return Response(user_list.errors, content_type='application/json',
                             status=status.HTTP_400_BAD_REQUEST)
+        users = user_list.validated_data.get('users')
+        if run_in_background(request) \
+                or len(users) > getattr(settings, 'KAIRNIAL_INVITE_SYNC_LIMIT', 20):
+            job = jobs.enqueue(
+                'users.invite',
+                client_id=client_id,
+                project_id=project_id,
+                owner=getattr(request.user, 'uuid', None),
+                total=len(users),
+                token=request.token,
+                users=users
+            )
+            return JobResponse(job)
         try:
-            invites = User.invite(
+            outcomes = User.invite(
                 client_id=client_id,
                 token=request.token,
                 project_id=project_id,
-                users=user_list.validated_data.get('users')
+                users=users
             )
+            invites = [outcome['invitation'] for outcome in outcomes if outcome['success']]
             serializer = UserInviteResponseSerializer(invites, many=True)
             return Response(serializer.data, content_type="application/json")
         except (KairnialWSServiceError, KeyError, AttributeError) as e: